@@ -13,6 +13,7 @@ import os
 import requests
 import sys
 import yaml
+import tempfile
 from datetime import timedelta
 
 
@@ -137,6 +138,10 @@ REST_FRAMEWORK = {
     )
 }
 
+# 列表接口游标分页的默认/最大单页条数
+KEYSET_PAGE_SIZE = int(DEFAULT_CONF.get('KEYSET_PAGE_SIZE', 50))
+KEYSET_MAX_PAGE_SIZE = int(DEFAULT_CONF.get('KEYSET_MAX_PAGE_SIZE', 500))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=10080),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -194,6 +199,56 @@ DATABASES = {
     }
 }
 
+# Cache
+# 第三方平台令牌及响应缓存需在各uwsgi worker及管理命令之间共享，默认使用数据库缓存(部署时需执行createcachetable)，
+# 也可通过CACHE_BACKEND和CACHE_LOCATION配置memcached等共享后端；配置为进程内缓存时令牌各进程独立拉取，
+# 响应仅在本进程内失效，其他进程的写操作在RESPONSE_CACHE_LOCAL_TIMEOUT后生效
+
+CACHES = {
+    'default': {
+        'BACKEND': DEFAULT_CONF.get('CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': DEFAULT_CONF.get('CACHE_LOCATION', 'meetings_cache'),
+    }
+}
+
+RESPONSE_CACHE_TIMEOUT = int(DEFAULT_CONF.get('RESPONSE_CACHE_TIMEOUT', 300))
+# 缓存后端仅在进程内有效时，其他进程的写操作无法使本进程缓存的响应失效，响应按该时长(秒)过期
+RESPONSE_CACHE_LOCAL_TIMEOUT = int(DEFAULT_CONF.get('RESPONSE_CACHE_LOCAL_TIMEOUT', 10))
+# 每个进程缓存的响应数上限
+RESPONSE_CACHE_MAX_ENTRIES = int(DEFAULT_CONF.get('RESPONSE_CACHE_MAX_ENTRIES', 300))
+# 缓存命中/未命中等计数在进程内累计，按该间隔(秒)批量写入缓存
+STATS_FLUSH_INTERVAL = float(DEFAULT_CONF.get('STATS_FLUSH_INTERVAL', 30))
+# 第三方平台令牌在到期前多少秒开始后台刷新
+TOKEN_REFRESH_AHEAD = int(DEFAULT_CONF.get('TOKEN_REFRESH_AHEAD', 300))
+# Zoom令牌未携带有效期时使用的缓存时长
+ZOOM_TOKEN_TTL = int(DEFAULT_CONF.get('ZOOM_TOKEN_TTL', 3000))
+# WeLink代理鉴权token未返回validPeriod时使用的缓存时长
+WELINK_TOKEN_TTL = int(DEFAULT_CONF.get('WELINK_TOKEN_TTL', 3600))
+# 第三方平台HTTP请求的连接池大小、超时(秒)及幂等请求的重试策略，读超时需小于uwsgi的harakiri
+HTTP_POOL_SIZE = int(DEFAULT_CONF.get('HTTP_POOL_SIZE', 10))
+HTTP_CONNECT_TIMEOUT = float(DEFAULT_CONF.get('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(DEFAULT_CONF.get('HTTP_READ_TIMEOUT', 20))
+HTTP_MAX_RETRIES = int(DEFAULT_CONF.get('HTTP_MAX_RETRIES', 2))
+HTTP_RETRY_BACKOFF = float(DEFAULT_CONF.get('HTTP_RETRY_BACKOFF', 0.5))
+HTTP_RETRY_MAX_BACKOFF = float(DEFAULT_CONF.get('HTTP_RETRY_MAX_BACKOFF', 4))
+# 单次调用含重试的总时长上限(秒)，超时及退避按剩余时间截断，避免请求内的重试超过uwsgi的harakiri
+HTTP_DEADLINE = float(DEFAULT_CONF.get('HTTP_DEADLINE', 20))
+# 请求延迟统计在进程内累计，按该间隔(秒)批量写入缓存
+HTTP_STATS_FLUSH_INTERVAL = float(DEFAULT_CONF.get('HTTP_STATS_FLUSH_INTERVAL', 30))
+# 录像转存至OBS的分段大小(字节，不小于100KB)，每个下载连接在内存中缓存一个分段
+OBS_PART_SIZE = int(DEFAULT_CONF.get('OBS_PART_SIZE', 16 * 1024 * 1024))
+# 录像转存清单的存放目录，中断的转存据此续传
+TRANSFER_STATE_DIR = DEFAULT_CONF.get('TRANSFER_STATE_DIR', os.path.join(tempfile.gettempdir(), 'recording-transfers'))
+# 每个录像的并发下载连接数及下载进度的输出间隔(秒)
+DOWNLOAD_WORKERS = int(DEFAULT_CONF.get('DOWNLOAD_WORKERS', 4))
+DOWNLOAD_PROGRESS_INTERVAL = int(DEFAULT_CONF.get('DOWNLOAD_PROGRESS_INTERVAL', 30))
+# 进程内所有下载的总带宽上限(字节/秒，0为不限速)及在内存中缓存的分段总字节数上限
+DOWNLOAD_BANDWIDTH = int(DEFAULT_CONF.get('DOWNLOAD_BANDWIDTH', 0))
+DOWNLOAD_BUFFER_BUDGET = int(DEFAULT_CONF.get('DOWNLOAD_BUFFER_BUDGET', 256 * 1024 * 1024))
+# 同时处理的录像任务数及各平台的并发上限，避免触发第三方平台的限流
+RECORDING_WORKERS = int(DEFAULT_CONF.get('RECORDING_WORKERS', 4))
+RECORDING_PLATFORM_LIMITS = DEFAULT_CONF.get('RECORDING_PLATFORM_LIMITS', {'zoom': 2, 'welink': 2, 'tencent': 2})
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -315,9 +370,20 @@ LOGGING = {
 GMAIL_USERNAME = DEFAULT_CONF.get('GMAIL_USERNAME', '')
 GMAIL_PASSWORD = DEFAULT_CONF.get('GMAIL_PASSWORD', '')
 SMTP_SERVER_HOST = DEFAULT_CONF.get('SMTP_SERVER_HOST', '')
-SMTP_SERVER_PORT = 25
+SMTP_SERVER_PORT = int(DEFAULT_CONF.get('SMTP_SERVER_PORT', 25))
+# 本地调试时可关闭STARTTLS，使用不需要认证的SMTP替身服务
+SMTP_USE_TLS = DEFAULT_CONF.get('SMTP_USE_TLS', True)
 SMTP_SERVER_USER = DEFAULT_CONF.get('SMTP_SERVER_USER', '')
 SMTP_SERVER_PASS = DEFAULT_CONF.get('SMTP_SERVER_PASS', '')
+# 邮件发送worker每批领取的数量、最大尝试次数、重试基础间隔(秒)及SMTP连接空闲关闭时长(秒)
+MAIL_BATCH_SIZE = int(DEFAULT_CONF.get('MAIL_BATCH_SIZE', 20))
+MAIL_MAX_ATTEMPTS = int(DEFAULT_CONF.get('MAIL_MAX_ATTEMPTS', 5))
+MAIL_RETRY_BACKOFF = int(DEFAULT_CONF.get('MAIL_RETRY_BACKOFF', 60))
+MAIL_IDLE_TIMEOUT = int(DEFAULT_CONF.get('MAIL_IDLE_TIMEOUT', 60))
+# 并发发送微信订阅消息的线程数
+NOTIFY_WORKERS = int(DEFAULT_CONF.get('NOTIFY_WORKERS', 8))
+# 会议开始提醒的提前时长(分钟)，sendmessages执行间隔不应超过该时长
+REMINDER_WINDOW = int(DEFAULT_CONF.get('REMINDER_WINDOW', 10))
 ZOOM_AUTH_URL = DEFAULT_CONF.get('ZOOM_AUTH_URL')
 ZOOM_AUTH_HEADER = DEFAULT_CONF.get('ZOOM_AUTH_HEADER')
 ZOOM_AUTH_REDIRECT = DEFAULT_CONF.get('ZOOM_AUTH_REDIRECT')
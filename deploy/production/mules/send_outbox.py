@@ -0,0 +1,5 @@
+# uwsgi的mule进程由master在加载应用后fork产生，沿用master已加载的配置(uwsgi加载配置后会删除配置文件)，
+# 持续发送待发送邮件表中的邮件，进程退出后由master重新拉起
+from django.core.management import call_command
+
+call_command('send_outbox')
@@ -15,7 +15,7 @@ def main():
             "available on your PYTHONPATH environment variable? Did you "
             "forget to activate a virtual environment?"
         ) from exc
-    execute_from_command_line(sys.argv[:2])
+    execute_from_command_line(sys.argv)
 
 
 if __name__ == '__main__':
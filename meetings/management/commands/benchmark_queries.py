@@ -0,0 +1,69 @@
+import datetime
+import logging
+import time
+from django.core.management.base import BaseCommand
+from meetings.models import Meeting, Activity
+from meetings.utils import calendar_data
+
+logger = logging.getLogger('log')
+
+
+def calendar_queryset():
+    now = datetime.datetime.now()
+    return Meeting.objects.filter(is_delete=0,
+                                  date__gte=(now - datetime.timedelta(days=180)).strftime('%Y-%m-%d'),
+                                  date__lte=(now + datetime.timedelta(days=30)).strftime('%Y-%m-%d'))
+
+
+def sig_calendar_queryset():
+    group_name = Meeting.objects.filter(is_delete=0).values_list('group_name', flat=True).first() or ''
+    return calendar_queryset().filter(group_name=group_name)
+
+
+def conflict_queryset():
+    now = datetime.datetime.now()
+    return Meeting.objects.filter(is_delete=0, date=now.strftime('%Y-%m-%d'), end__gt='09:30', start__lt='11:30',
+                                  mplatform='zoom')
+
+
+def activities_queryset():
+    now = datetime.datetime.now()
+    return Activity.objects.filter(is_delete=0, status__in=[3, 4, 5],
+                                   date__gte=(now - datetime.timedelta(days=180)).strftime('%Y-%m-%d'),
+                                   date__lte=(now + datetime.timedelta(days=180)).strftime('%Y-%m-%d'))
+
+
+QUERIES = {
+    'meetings calendar': lambda: calendar_data.build_meetings_table(calendar_queryset()),
+    'sig calendar': lambda: calendar_data.build_meetings_table(sig_calendar_queryset()),
+    'activities calendar': lambda: calendar_data.build_activities_table(activities_queryset()),
+    'host conflict check': lambda: list(conflict_queryset().values('host_id')),
+}
+
+EXPLAINS = {
+    'meetings calendar': calendar_queryset,
+    'sig calendar': sig_calendar_queryset,
+    'activities calendar': activities_queryset,
+    'host conflict check': conflict_queryset,
+}
+
+
+class Command(BaseCommand):
+    help = 'Time the calendar and host conflict queries; run before and after migrating to compare indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        logger.info('meetings: {}, activities: {}'.format(Meeting.objects.count(), Activity.objects.count()))
+        for name, func in QUERIES.items():
+            costs = []
+            for _ in range(repeat):
+                t1 = time.time()
+                func()
+                costs.append(time.time() - t1)
+            costs.sort()
+            logger.info('{}: min {:.2f}ms, median {:.2f}ms, max {:.2f}ms'.format(
+                name, costs[0] * 1000, costs[len(costs) // 2] * 1000, costs[-1] * 1000))
+            logger.info('{} plan: {}'.format(name, EXPLAINS[name]().explain()))
@@ -0,0 +1,24 @@
+import logging
+from django.core.management.base import BaseCommand
+from meetings.utils import http_client, token_cache
+from meetings.utils.response_cache import get_stats
+
+logger = logging.getLogger('log')
+
+
+class Command(BaseCommand):
+    def handle(self, *args, **options):
+        stats = get_stats()
+        if not stats:
+            logger.info('no response cache statistics yet')
+        for endpoint, counters in stats.items():
+            total = counters['hit'] + counters['miss']
+            hit_rate = counters['hit'] / total if total else 0
+            logger.info('{}: hit {}, miss {}, hit rate {:.2%}'.format(endpoint, counters['hit'], counters['miss'],
+                                                                     hit_rate))
+        for name, counters in token_cache.get_stats().items():
+            logger.info('token {}: hit {}, miss {}, refresh {}, error {}'.format(
+                name, counters['hit'], counters['miss'], counters['refresh'], counters['error']))
+        for endpoint, histogram in http_client.get_stats().items():
+            logger.info('latency {}: {}'.format(endpoint, ', '.join(
+                '{} {}'.format(label, count) for label, count in histogram.items())))
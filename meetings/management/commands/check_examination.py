@@ -4,6 +4,7 @@ from bilibili_api.user import get_videos_g
 from django.conf import settings
 from django.core.management.base import BaseCommand
 from meetings.models import Record
+from meetings.utils.response_cache import bump_version, MEETINGS
 from obs import ObsClient
 
 logger = logging.getLogger('log')
@@ -49,4 +50,5 @@ class Command(BaseCommand):
                 else:
                     bili_url = 'https://www.bilibili.com/{}'.format(metadata_dict['bvid'])
                     Record.objects.filter(mid=mid, platform='bilibili').update(url=bili_url)
+                    bump_version(MEETINGS)
                     logger.info('meeting {}: B站已过审，刷新播放地址'.format(mid))
@@ -1,4 +1,3 @@
-import requests
 import lxml
 import time
 import logging
@@ -10,6 +9,7 @@ from meetings.models import Group
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from django.db import connection
+from meetings.utils import http_client
 
 
 class Command(BaseCommand):
@@ -32,7 +32,7 @@ class Command(BaseCommand):
         headers = {
             'Authorization': settings.DEFAULT_CONF.get('GENEGROUP_AUTH', '')
         }
-        r = requests.get('https://www.openeuler.org/api/mail/list', headers=headers)
+        r = http_client.get('https://www.openeuler.org/api/mail/list', headers=headers)
         if r.status_code == 401:
             self.logger.error('401 Unauthorized. Do check GENEGROUP_AUTH!')
             sys.exit(1)
@@ -93,7 +93,7 @@ class Command(BaseCommand):
 
         for sig in sigs_list:
             # 获取邮件列表
-            r = requests.get(sig[1])
+            r = http_client.get(sig[1])
             html = HTML(r.text)
             assert isinstance(html, lxml.etree._Element)
             try:
@@ -154,7 +154,7 @@ class Command(BaseCommand):
                 params = {
                     'access_token': access_token
                 }
-                r = requests.get('https://gitee.com/api/v5/users/{}'.format(maintainer), params=params)
+                r = http_client.get('https://gitee.com/api/v5/users/{}'.format(maintainer), params=params)
                 owner = {}
                 if r.status_code == 200:
                     owner['gitee_id'] = maintainer
@@ -1,19 +1,17 @@
 import datetime
+import functools
+import json
 import logging
 import os
-import requests
+import shutil
 import tempfile
-import wget
 from django.db.models import Q
 from django.conf import settings
-from obs import ObsClient
 from django.core.management.base import BaseCommand
 from meetings.models import Meeting, Video, Record
-from multiprocessing.dummy import Pool as ThreadPool
 from meetings.utils.html_template import cover_content
-from meetings.utils.welink_apis import getParticipants, listRecordings, downloadHWCloudRecording, getDetailDownloadUrl
-from meetings.utils.tencent_apis import get_records, get_video_download
-from meetings.utils.zoom_apis import getOauthToken
+from meetings.utils.response_cache import bump_version, MEETINGS
+from meetings.utils import downloader, drivers, obs_index, obs_transfer, recording_jobs, recording_scheduler
 
 logger = logging.getLogger('log')
 
@@ -30,81 +28,47 @@ class Command(BaseCommand):
         logger.info('meeting_ids: {}'.format(list(meeting_ids)))
         logger.info('mids of past_meetings: {}'.format(list(past_meetings.values_list('mid', flat=True))))
         logger.info('recent_mids: {}'.format(recent_mids))
-        pool = ThreadPool()
-        pool.map(run, recent_mids)
-        pool.close()
-        pool.join()
+        recent_meetings = list(past_meetings.filter(mid__in=recent_mids))
+        recording_jobs.fail_stale_jobs()
+        recording_jobs.ensure_jobs(recent_meetings)
+        jobs = recording_jobs.runnable_jobs(recent_meetings)
+        logger.info('recording jobs: {}'.format(['{}:{}'.format(job.meeting.mid, recording_jobs.STAGES[job.stage])
+                                                 for job in jobs]))
+        # 本次执行中查询到的下载地址，按任务id及文件名索引
+        sources = {}
+        # 先查询所有新任务的录像，获取录像大小后再按大小从大到小派发转存
+        lookups = [job for job in jobs if job.stage == recording_jobs.LOOKUP]
+        recording_scheduler.run(lookups, functools.partial(run, sources=sources, until=recording_jobs.TRANSFER))
+        # 重新加载任务以获取查询到的录像大小，仍处于查询阶段的任务本次不再重试
+        jobs = [job for job in recording_jobs.runnable_jobs(recent_meetings) if job.stage != recording_jobs.LOOKUP]
+        recording_scheduler.run(jobs, functools.partial(run, sources=sources))
         logger.info('All done')
 
 
-def get_recordings(mid):
-    """
-    查询一个host下昨日至今日(默认)的所有录像
-    :param mid: 会议ID
-    :return: the json-encoded content of a response or none
-    """
-    host_id = Meeting.objects.get(mid=mid).host_id
-    url = 'https://api.zoom.us/v2/users/{}/recordings'.format(host_id)
-    token = getOauthToken()
-    headers = {
-        'authorization': 'Bearer {}'.format(token)
-    }
-    params = {
-        'from': (datetime.datetime.now() - datetime.timedelta(days=7)).strftime("%Y-%m-%d"),
-        'page_size': 50
-    }
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code != 200:
-        logger.error('get recordings: {} {}'.format(response.status_code, response.json()['message']))
-        return
-    mids = [x['id'] for x in response.json()['meetings']]
-    if mids.count(int(mid)) == 0:
-        logger.info('meeting {}: no recordings yet'.format(mid))
-        return
-    if mids.count(int(mid)) == 1:
-        record = list(filter(lambda x: x if x['id'] == int(mid) else None, response.json()['meetings']))[0]
-        return record
-    if mids.count(int(mid)) > 1:
-        records = list(filter(lambda x: x if x['id'] == int(mid) else None, response.json()['meetings']))
-        max_size = max([x['total_size'] for x in records])
-        record = list(filter(lambda x: x if x['total_size'] == max_size else None, response.json()['meetings']))[0]
-        return record
-
-
-def get_participants(mid):
+def get_participants(meeting):
     """
     查询一个会议的所有参会者
-    :param mid: 会议ID
-    :return: the json-encoded content of a response or none
+    :param meeting: Meeting的实例
+    :return: 参会者列表 or none
     """
-    url = 'https://api.zoom.us/v2/past_meetings/{}/participants?page_size=300'.format(mid)
-    token = getOauthToken()
-    headers = {
-        'authorization': 'Bearer {}'.format(token)
-    }
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        logger.error('mid: {}, get participants {} {}:'.format(mid, response.status_code, response.json()['message']))
+    status, res = drivers.get_driver(meeting.mplatform).participants(meeting)
+    if status != 200:
+        logger.error('mid: {}, get participants {} {}'.format(meeting.mid, status, res))
         return
-    return response.json()['participants']
+    return res['participants']
 
 
-def download_recordings(zoom_download_url, mid):
-    """
-    下载录像视频
-    :param zoom_download_url: zoom提供的下载地址
-    :param mid: 会议ID
-    :return: 下载的文件名
-    """
-    tmpdir = tempfile.gettempdir()
-    target_name = mid + '.mp4'
-    # 判断/tmp/下有无target_name,如果存在则删掉再下载
-    if target_name in os.listdir(tmpdir):
-        os.remove(os.path.join(tmpdir, target_name))
-    r = requests.get(url=zoom_download_url, allow_redirects=False)
-    url = r.headers['location']
-    filename = wget.download(url, out=os.path.join(tmpdir, target_name))
-    return filename
+def need_upload(mid, object_key, total_size):
+    """通过对象索引判断录像是否需要上传或替换"""
+    size = obs_index.get_object_index().get_size(object_key)
+    if size is None:
+        logger.info('meeting {}: OBS存储服务中无此对象，开始下载视频'.format(mid))
+        return True
+    if size >= total_size:
+        logger.info('meeting {}: OBS存储服务中已存在该对象且无需替换'.format(mid))
+        return False
+    logger.info('meeting {}: OBS存储服务中该对象需要替换，开始下载视频'.format(mid))
+    return True
 
 
 def generate_cover(mid, topic, group_name, date, filename, start_time, end_time):
@@ -115,10 +79,10 @@ def generate_cover(mid, topic, group_name, date, filename, start_time, end_time)
     content = cover_content(topic, group_name, date, start_time, end_time)
     f.write(content)
     f.close()
-    os.system("cp meetings/images/cover.png {}".format(os.path.dirname(filename)))
+    # 封面背景图须与html位于同一目录
+    shutil.copy('meetings/images/cover.png', os.path.dirname(filename))
     os.system("wkhtmltoimage --enable-local-file-access {} {}".format(html_path, image_path))
     logger.info("meeting {}: 生成封面".format(mid))
-    os.remove(os.path.join(os.path.dirname(filename), 'cover.png'))
 
 
 def upload_cover(filename, obs_client, bucketName, cover_path):
@@ -129,529 +93,259 @@ def upload_cover(filename, obs_client, bucketName, cover_path):
     return res
 
 
-def download_upload_recordings(start, end, zoom_download_url, mid, total_size, video, endpoint, object_key,
-                               group_name,
-                               obs_client):
+def remove_cover_files(mid, workdir):
+    """删除生成封面时使用的临时目录"""
+    shutil.rmtree(workdir, ignore_errors=True)
+    logger.info('meeting {}: 移除临时目录{}'.format(mid, workdir))
+
+
+def to_utc_string(date, time):
+    """将会议的日期及时间拼接为录像元数据使用的时间格式"""
+    return date + 'T' + time + ':00Z'
+
+
+def build_object_key(group_name, start, mid, name):
+    month = datetime.datetime.strptime(start.replace('T', ' ').replace('Z', ''), "%Y-%m-%d %H:%M:%S").\
+        strftime("%b").lower()
+    return 'openeuler/{}/{}/{}/{}'.format(group_name, month, mid, name)
+
+
+def build_file(meeting, video, name, size, start, end, cover_times, resolve):
     """
-    下载、上传录像及后续操作
-    :param start: 录像开始时间
-    :param end: 录像结束时间
-    :param zoom_download_url: zoom录像下载地址
-    :param mid: 会议ID
-    :param total_size: 文件大小
-    :param video: Video的实例
-    :param endpoint: OBS终端节点
-    :param object_key: 文件在OBS上的位置
-    :param group_name: sig组名
-    :param obs_client: ObsClient的实例
-    :return:
+    录像文件信息，resolve用于获取下载地址及请求头，仅在本次执行中有效，不随任务保存
+    :param cover_times: 封面上展示的(日期, 开始时间, 结束时间)
     """
-    # 下载录像
-    filename = download_recordings(zoom_download_url, str(mid))
-    print()
-    logger.info('meeting {}: 从OBS下载视频，本地保存为{}'.format(mid, filename))
-    try:
-        # 若下载录像的大小和total_size相等，则继续
-        download_file_size = os.path.getsize(filename)
-        logger.info('meeting {}: 下载的文件大小为{}'.format(mid, download_file_size))
-        if download_file_size == total_size:
-            topic = video.topic
-            agenda = video.agenda
-            community = video.community
-            bucketName = settings.DEFAULT_CONF.get('OBS_BUCKETNAME', '')
-            if not bucketName:
-                logger.error('mid: {}, bucketName required'.format(mid))
-                return
-            download_url = 'https://{}.{}/{}?response-content-disposition=attachment'.format(bucketName,
-                                                                                             endpoint,
-                                                                                             object_key)
-            attenders = get_participants(mid)
-            # 生成metadata
-            metadata = {
-                "meeting_id": mid,
-                "meeting_topic": topic,
-                "community": community,
-                "sig": group_name,
-                "agenda": agenda,
-                "record_start": start,
-                "record_end": end,
-                "download_url": download_url,
-                "total_size": download_file_size,
-                "attenders": []
-            }
-            # 上传视频
-            try:
-                # 断点续传上传文件
-                res = obs_client.uploadFile(bucketName=bucketName, objectKey=object_key, uploadFile=filename,
-                                            taskNum=10, enableCheckpoint=True, metadata=metadata)
-                try:
-                    if res['status'] == 200:
-                        logger.info('meeting {}: OBS视频上传成功'.format(mid, filename))
-                        # 生成封面
-                        date = (datetime.datetime.strptime(start.replace('T', ' ').replace('Z', ''),
-                                                           "%Y-%m-%d %H:%M:%S") + datetime.timedelta(
-                            hours=8)).strftime('%Y-%m-%d')
-                        start_time = (datetime.datetime.strptime(start.replace('T', ' ').replace('Z', ''),
-                                                                 "%Y-%m-%d %H:%M:%S") + datetime.timedelta(
-                            hours=8)).strftime('%H:%M')
-                        end_time = (datetime.datetime.strptime(end.replace('T', ' ').replace('Z', ''),
-                                                               "%Y-%m-%d %H:%M:%S") + datetime.timedelta(
-                            hours=8)).strftime('%H:%M')
-                        generate_cover(mid, topic, group_name, date, filename, start_time, end_time)
-                        # 上传封面
-                        cover_path = res['body']['key'].replace('.mp4', '.png')
-                        res2 = upload_cover(filename, obs_client, bucketName, cover_path)
-                        if res2['status'] == 200:
-                            logger.info('meeting {}: OBS封面上传成功'.format(mid))
-                            try:
-                                Video.objects.filter(mid=mid).update(start=start,
-                                                                     end=end,
-                                                                     total_size=total_size,
-                                                                     attenders=attenders,
-                                                                     download_url=download_url)
-                                url = download_url.split('?')[0]
-                                if Record.objects.filter(mid=mid, platform='obs'):
-                                    Record.objects.filter(mid=mid, platform='obs').update(
-                                        url=url, thumbnail=url.replace('.mp4', '.png'))
-                                else:
-                                    Record.objects.create(mid=mid, platform='obs', url=url,
-                                                          thumbnail=url.replace('.mp4', '.png'))
-                                logger.info('meeting {}: 更新数据库'.format(mid))
-                                # 删除临时文件
-                                os.remove(filename)
-                                logger.info('meeting {}: 移除临时文件{}'.format(mid, filename))
-                                os.remove(filename.replace('.mp4', '.html'))
-                                logger.info(
-                                    'meeting {}: 移除临时文件{}'.format(mid, filename.replace('.mp4', '.html')))
-                                os.remove(filename.replace('.mp4', '.png'))
-                                logger.info(
-                                    'meeting {}: 移除临时文件{}'.format(mid, filename.replace('.mp4', '.png')))
-                                return topic, filename
-                            except Exception as e4:
-                                logger.error('meeting {}: fail to update database! {}'.format(mid, e4))
-                except KeyError as e3:
-                    logger.error('meeting {}: fail to upload file! {}'.format(mid, e3))
-            except Exception as e2:
-                logger.error('meeting {}: upload file error! {}'.format(mid, e2))
-        else:
-            # 否则，删除刚下载的文件
-            os.remove(filename)
-    except FileNotFoundError as e1:
-        logger.error(e1)
+    object_key = build_object_key(video.group_name, start, meeting.mid, name)
+    logger.info('meeting {}: object_key is {}'.format(meeting.mid, object_key))
+    date, start_time, end_time = cover_times
+    return {
+        'name': name,
+        'object_key': object_key,
+        'size': size,
+        'start': start,
+        'end': end,
+        'cover_date': date,
+        'cover_start': start_time,
+        'cover_end': end_time,
+        'resolve': resolve
+    }
 
 
-def handle_zoom_recordings(mid):
-    video = Video.objects.get(mid=mid)
+def list_zoom_files(meeting, video):
+    mid = meeting.mid
+    driver = drivers.get_driver(meeting.mplatform)
     # 查询会议的录像信息
-    recordings = get_recordings(mid)
-    if recordings:
-        recordings_list = list(
-            filter(lambda x: x if x['file_extension'] == 'MP4' else None, recordings['recording_files']))
-        if len(recordings_list) == 0:
-            logger.info('meeting {}: 正在录制中'.format(mid))
-            return
-        if len(recordings_list) > 1:
-            max_size = max([x['file_size'] for x in recordings_list])
-            for recording in recordings_list:
-                if recording['file_size'] != max_size:
-                    recordings_list.remove(recording)
-        total_size = recordings_list[0]['file_size']
-        logger.info('meeting {}: 录像文件的总大小为{}'.format(mid, total_size))
-        # 如果文件过小，则视为无效录像
-        if total_size < 1024 * 1024 * 10:
-            logger.info('meeting {}: 文件过小，不予操作'.format(mid))
-        else:
-            # 连接obs服务，实例化ObsClient
-            access_key_id = settings.DEFAULT_CONF.get('ACCESS_KEY_ID', '')
-            secret_access_key = settings.DEFAULT_CONF.get('SECRET_ACCESS_KEY', '')
-            endpoint = settings.DEFAULT_CONF.get('OBS_ENDPOINT', '')
-            bucketName = settings.DEFAULT_CONF.get('OBS_BUCKETNAME', '')
-            if not (access_key_id and secret_access_key and endpoint and bucketName):
-                logger.error('losing required arguments for ObsClient')
-                return
-            try:
-                obs_client = ObsClient(access_key_id=access_key_id,
-                                       secret_access_key=secret_access_key,
-                                       server='https://{}'.format(endpoint))
-                objs = []
-                mark = None
-                while True:
-                    obs_objs = obs_client.listObjects(bucketName, marker=mark, max_keys=1000)
-                    if obs_objs.status < 300:
-                        index = 1
-                        for content in obs_objs.body.contents:
-                            objs.append(content)
-                            index += 1
-                        if obs_objs.body.is_truncated:
-                            mark = obs_objs.body.next_marker
-                        else:
-                            break
-                # 预备文件上传路径
-                start = recordings_list[0]['recording_start']
-                month = datetime.datetime.strptime(start.replace('T', ' ').replace('Z', ''),
-                                                   "%Y-%m-%d %H:%M:%S").strftime("%b").lower()
-                group_name = video.group_name
-                video_name = mid + '.mp4'
-                object_key = 'openeuler/{}/{}/{}/{}'.format(group_name, month, mid, video_name)
-                logger.info('meeting {}: object_key is {}'.format(mid, object_key))
-                # 收集录像信息待用
-                end = recordings_list[0]['recording_end']
-                zoom_download_url = recordings_list[0]['download_url']
-                if not objs:
-                    logger.info('meeting {}: OBS无存储对象，开始下载视频'.format(mid))
-                    download_upload_recordings(start, end, zoom_download_url, mid, total_size, video,
-                                               endpoint, object_key,
-                                               group_name, obs_client)
-                else:
-                    key_size_map = {x['key']: x['size'] for x in objs}
-                    if object_key not in key_size_map.keys():
-                        logger.info('meeting {}: OBS存储服务中无此对象，开始下载视频'.format(mid))
-                        download_upload_recordings(start, end, zoom_download_url, mid, total_size, video,
-                                                   endpoint, object_key,
-                                                   group_name, obs_client)
-                    elif object_key in key_size_map.keys() and key_size_map[object_key] >= total_size:
-                        logger.info('meeting {}: OBS存储服务中已存在该对象且无需替换'.format(mid))
-                    else:
-                        logger.info('meeting {}: OBS存储服务中该对象需要替换，开始下载视频'.format(mid))
-                        download_upload_recordings(start, end, zoom_download_url, mid, total_size, video,
-                                                   endpoint,
-                                                   object_key, group_name, obs_client)
-            except Exception as e:
-                logger.error(e)
-
-
-def get_welink_meeting_participants(mid):
-    _, participants = getParticipants(mid)
-    if 'participants' in participants.keys():
-        return participants['participants']
-    else:
-        return participants
-
-
-def get_available_recordings(mid, host_id, start_time, end_time):
-    status, recordings = listRecordings(host_id)
-    if status != 200:
-        logger.info('Fail to get welink recordings')
+    recordings = driver.list_recordings(meeting)
+    if not recordings:
         return []
-    available_recordings = []
-    if recordings['count'] == 0:
+    recordings_list = list(
+        filter(lambda x: x if x['file_extension'] == 'MP4' else None, recordings['recording_files']))
+    if len(recordings_list) == 0:
+        logger.info('meeting {}: 正在录制中'.format(mid))
         return []
-    recordings_data = recordings['data']
-    start_order_set = set()
-    for recording in recordings_data:
-        confID = recording['confID']
-        startTime = (datetime.datetime.strptime(recording['startTime'], '%Y-%m-%d %H:%M') +
-                     datetime.timedelta(hours=8)).strftime('%Y-%m-%d %H:%M')
-        rcdTime = recording['rcdTime']
-        if confID != mid:
-            continue
-        endTime = (datetime.datetime.strptime(startTime, '%Y-%m-%d %H:%M') + datetime.timedelta(seconds=rcdTime)). \
-            strftime('%Y-%m-%d %H:%M')
-        if endTime < start_time or startTime > end_time:
-            continue
-        start_order_set.add(startTime)
-    for st in sorted(list(start_order_set)):
-        for recording in recordings_data:
-            confID = recording['confID']
-            startTime = (datetime.datetime.strptime(recording['startTime'], '%Y-%m-%d %H:%M') +
-                         datetime.timedelta(hours=8)).strftime('%Y-%m-%d %H:%M')
-            rcdTime = recording['rcdTime']
-            if confID != mid:
-                continue
-            endTime = (datetime.datetime.strptime(startTime, '%Y-%m-%d %H:%M') + datetime.timedelta(seconds=rcdTime)). \
-                strftime('%Y-%m-%d %H:%M')
-            if endTime < start_time or startTime > end_time:
-                continue
-            if startTime == st:
-                available_recordings.append(recording)
-    return available_recordings
-
-
-def download_upload_welink_recordings(start, end, mid, filename, object_key, endpoint, group_name, obs_client):
-    download_file_size = os.path.getsize(filename)
-    video = Video.objects.get(mid=mid)
-    topic = video.topic
-    if '-' in filename:
-        order_number = int(filename.split('-')[-1].split('.')[0])
-        topic = (video.topic + '-{}'.format(order_number))
-    agenda = video.agenda
-    community = video.community
-    bucketName = settings.DEFAULT_CONF.get('OBS_BUCKETNAME', '')
-    if not bucketName:
-        logger.error('mid: {}, bucketName required'.format(mid))
-        return
-    download_url = 'https://{}.{}/{}?response-content-disposition=attachment'.format(bucketName, endpoint, object_key)
-    attenders = get_welink_meeting_participants(mid)
-    metadata = {
-        "meeting_id": mid,
-        "meeting_topic": topic,
-        "community": community,
-        "sig": group_name,
-        "agenda": agenda,
-        "record_start": start,
-        "record_end": end,
-        "download_url": download_url,
-        "total_size": download_file_size,
-        "attenders": []
-    }
-    try:
-        # 断点续传上传文件
-        res = obs_client.uploadFile(bucketName=bucketName, objectKey=object_key, uploadFile=filename,
-                                    taskNum=10, enableCheckpoint=True, metadata=metadata)
-        try:
-            if res['status'] == 200:
-                logger.info('meeting {}: OBS视频上传成功'.format(mid, filename))
-                # 生成封面
-                meeting = Meeting.objects.get(mid=mid)
-                date = meeting.date
-                start = meeting.start
-                end = meeting.end
-                generate_cover(mid, topic, group_name, date, filename, start, end)
-                # 上传封面
-                cover_path = res['body']['key'].replace('.mp4', '.png')
-                res2 = upload_cover(filename, obs_client, bucketName, cover_path)
-                if res2['status'] == 200:
-                    logger.info('meeting {}: OBS封面上传成功'.format(mid))
-                    try:
-                        if '-' not in filename or '-1' in filename:
-                            Video.objects.filter(mid=mid).update(start=start,
-                                                                 end=end,
-                                                                 total_size=download_file_size,
-                                                                 attenders=attenders,
-                                                                 download_url=download_url)
-                            url = download_url.split('?')[0]
-                            if Record.objects.filter(mid=mid, platform='obs'):
-                                Record.objects.filter(mid=mid, platform='obs').update(
-                                    url=url, thumbnail=url.replace('.mp4', '.png'))
-                            else:
-                                Record.objects.create(mid=mid, platform='obs', url=url,
-                                                      thumbnail=url.replace('.mp4', '.png'))
-                        logger.info('meeting {}: 更新数据库'.format(mid))
-                        # 删除临时文件
-                        os.remove(filename)
-                        logger.info('meeting {}: 移除临时文件{}'.format(mid, filename))
-                        os.remove(filename.replace('.mp4', '.html'))
-                        logger.info(
-                            'meeting {}: 移除临时文件{}'.format(mid, filename.replace('.mp4', '.html')))
-                        os.remove(filename.replace('.mp4', '.png'))
-                        logger.info(
-                            'meeting {}: 移除临时文件{}'.format(mid, filename.replace('.mp4', '.png')))
-                        return topic, filename
-                    except Exception as e4:
-                        logger.error('meeting {}: fail to update database! {}'.format(mid, e4))
-        except KeyError as e3:
-            logger.error('meeting {}: fail to upload file! {}'.format(mid, e3))
-    except Exception as e2:
-        logger.error('meeting {}: upload file error! {}'.format(mid, e2))
-
-
-def after_download_recording(target_filename, start, end, mid, target_name):
-    if os.path.exists(target_filename):
-        total_size = os.path.getsize(target_filename)
-        # 连接obs服务，实例化ObsClient
-        access_key_id = settings.DEFAULT_CONF.get('ACCESS_KEY_ID', '')
-        secret_access_key = settings.DEFAULT_CONF.get('SECRET_ACCESS_KEY', '')
-        endpoint = settings.DEFAULT_CONF.get('OBS_ENDPOINT', '')
-        bucketName = settings.DEFAULT_CONF.get('OBS_BUCKETNAME', '')
-        if not (access_key_id and secret_access_key and endpoint and bucketName):
-            logger.error('losing required arguments for ObsClient')
-            return
-        try:
-            obs_client = ObsClient(access_key_id=access_key_id,
-                                   secret_access_key=secret_access_key,
-                                   server='https://%s' % endpoint)
-            objs = []
-            mark = None
-            while True:
-                obs_objs = obs_client.listObjects(bucketName, marker=mark, max_keys=1000)
-                if obs_objs.status < 300:
-                    index = 1
-                    for content in obs_objs.body.contents:
-                        objs.append(content)
-                        index += 1
-                    if obs_objs.body.is_truncated:
-                        mark = obs_objs.body.next_marker
-                    else:
-                        break
-            # 预备文件上传路径
-            date = Meeting.objects.get(mid=mid).date
-            start_time = date + 'T' + start + ':00Z'
-            end_time = date + 'T' + end + ':00Z'
-            month = datetime.datetime.strptime(start_time.replace('T', ' ').replace('Z', ''),
-                                               "%Y-%m-%d %H:%M:%S").strftime("%b").lower()
-            video = Video.objects.get(mid=mid)
-            group_name = video.group_name
-            object_key = 'openeuler/{}/{}/{}/{}'.format(group_name, month, mid, target_name)
-            logger.info('meeting {}: object_key is {}'.format(mid, object_key))
-            # 收集录像信息待用
-            if not objs:
-                logger.info('meeting {}: OBS无存储对象，开始下载视频'.format(mid))
-                download_upload_welink_recordings(start_time, end_time, mid, target_filename,
-                                                  object_key, endpoint, group_name, obs_client)
-            else:
-                key_size_map = {x['key']: x['size'] for x in objs}
-                if object_key not in key_size_map.keys():
-                    logger.info('meeting {}: OBS存储服务中无此对象，开始下载视频'.format(mid))
-                    download_upload_welink_recordings(start_time, end_time, mid, target_filename,
-                                                      object_key, endpoint, group_name, obs_client)
-                elif object_key in key_size_map.keys() and key_size_map[object_key] >= total_size:
-                    logger.info('meeting {}: OBS存储服务中已存在该对象且无需替换'.format(mid))
-                else:
-                    logger.info('meeting {}: OBS存储服务中该对象需要替换，开始下载视频'.format(mid))
-                    download_upload_welink_recordings(start_time, end_time, mid, target_filename,
-                                                      object_key, endpoint, group_name, obs_client)
-        except Exception as e:
-            logger.error(e)
-
-
-def handle_welink_recordings(mid):
-    meeting = Meeting.objects.get(mid=mid)
-    date = meeting.date
-    start = meeting.start
-    end = meeting.end
-    start_time = date + ' ' + start
-    end_time = date + ' ' + end
-    host_id = meeting.host_id
-    available_recordings = get_available_recordings(mid, host_id, start_time, end_time)
+    recording = max(recordings_list, key=lambda x: x['file_size'])
+    total_size = recording['file_size']
+    logger.info('meeting {}: 录像文件的总大小为{}'.format(mid, total_size))
+    # 如果文件过小，则视为无效录像
+    if total_size < 1024 * 1024 * 10:
+        logger.info('meeting {}: 文件过小，不予操作'.format(mid))
+        return []
+    start = recording['recording_start']
+    end = recording['recording_end']
+    # zoom的录像时间为UTC时间，封面展示东八区时间
+    cover_times = [(datetime.datetime.strptime(x.replace('T', ' ').replace('Z', ''), "%Y-%m-%d %H:%M:%S") +
+                    datetime.timedelta(hours=8)) for x in (start, end)]
+    cover_times = (cover_times[0].strftime('%Y-%m-%d'), cover_times[0].strftime('%H:%M'),
+                   cover_times[1].strftime('%H:%M'))
+    return [build_file(meeting, video, mid + '.mp4', total_size, start, end, cover_times,
+                       lambda: (driver.download_url(meeting, recording), {}))]
+
+
+def list_welink_files(meeting, video):
+    mid = meeting.mid
+    driver = drivers.get_driver(meeting.mplatform)
+    available_recordings = driver.list_recordings(meeting)
     if not available_recordings:
         logger.info('meeting {}: 无可用录像'.format(mid))
-    else:
-        waiting_download_recordings = []
-        for available_recording in available_recordings:
-            confUUID = available_recording['confUUID']
-            status, res = getDetailDownloadUrl(confUUID, host_id)
-            record_urls = res['recordUrls'][0]['urls']
-            for record_url in record_urls:
-                if record_url['fileType'] == 'Hd':
-                    waiting_download_recordings.append(record_url)
-        tmpdir = tempfile.gettempdir()
+        return []
+    waiting_download_recordings = []
+    for available_recording in available_recordings:
+        waiting_download_recordings.extend(driver.download_url(meeting, available_recording))
+    start = to_utc_string(meeting.date, meeting.start)
+    end = to_utc_string(meeting.date, meeting.end)
+    cover_times = (meeting.date, meeting.start, meeting.end)
+    files = []
+    for index, recording in enumerate(waiting_download_recordings):
         if len(waiting_download_recordings) == 1:
             target_name = mid + '.mp4'
-            target_filename = os.path.join(tmpdir, target_name)
-            token = waiting_download_recordings[0]['token']
-            download_url = waiting_download_recordings[0]['url']
-            downloadHWCloudRecording(token, target_filename, download_url)
-            after_download_recording(target_filename, start, end, mid, target_name)
-            return
-        for index, waiting_download_recording in enumerate(waiting_download_recordings):
-            marked_number = index + 1
-            target_name = mid + '-{}.mp4'.format(marked_number)
-            target_filename = os.path.join(tmpdir, target_name)
-            token = waiting_download_recording['token']
-            download_url = waiting_download_recording['url']
-            downloadHWCloudRecording(token, target_filename, download_url)
-            after_download_recording(target_filename, start, end, mid, target_name)
-
-
-def handle_tencent_recordings(mid):
-    # 参数准备
-    meeting = Meeting.objects.get(mid=mid)
-    video = Video.objects.get(mid=mid)
-    mmid = meeting.mmid
-    date = meeting.date
-    start = meeting.start
-    start_time = ' '.join([date, start])
-    start_timestamp = int(datetime.datetime.timestamp(datetime.datetime.strptime(start_time, '%Y-%m-%d %H:%M')))
-    # 获取账户级会议录制列表
-    records = get_records()
-    if not records:
-        return
-    # 遍历录制列表，匹配录制文件
-    match_record = {}
-    for record in records:
-        if record.get('meeting_id') != mmid:
-            continue
-        if record.get('state') != 3:
-            continue
-        media_start_time = record.get('media_start_time')
-        if abs(media_start_time // 1000 - start_timestamp) > 1800:
-            continue
-        record_file = record.get('record_files')[0]
-        if record_file.get('record_size') < 1024 * 1024 * 10:
-            continue
-        if not match_record:
-            match_record['record_file_id'] = record_file.get('record_file_id')
-            match_record['record_size'] = record_file.get('record_size')
-            match_record['userid'] = record.get('userid')
         else:
-            if record_file.get('record_size') > match_record.get('record_size'):
-                match_record['record_file_id'] = record_file.get('record_file_id')
-                match_record['record_size'] = record_file.get('record_size')
-                match_record['userid'] = record.get('userid')
+            target_name = mid + '-{}.mp4'.format(index + 1)
+        headers = {'Authorization': recording['token']}
+        total_size, _ = downloader.probe(recording['url'], headers)
+        files.append(build_file(meeting, video, target_name, total_size, start, end, cover_times,
+                                lambda recording=recording, headers=headers: (recording['url'], headers)))
+    return files
+
+
+def list_tencent_files(meeting, video):
+    mid = meeting.mid
+    driver = drivers.get_driver(meeting.mplatform)
+    # 匹配录制文件
+    match_record = driver.list_recordings(meeting)
     if not match_record:
         logger.info('Find no recordings about Tencent meeting which id is {}'.format(mid))
-        return
-    total_size = match_record['record_size']
-    # 获取录像下载链接
-    download_url = get_video_download(match_record.get('record_file_id'), match_record.get('userid'))
-    if not download_url:
-        return
-    # 连接obs服务，实例化ObsClient
-    access_key_id = settings.DEFAULT_CONF.get('ACCESS_KEY_ID', '')
-    secret_access_key = settings.DEFAULT_CONF.get('SECRET_ACCESS_KEY', '')
+        return []
+    start = to_utc_string(meeting.date, meeting.start)
+    end = to_utc_string(meeting.date, meeting.end)
+    cover_times = (meeting.date, meeting.start, meeting.end)
+    return [build_file(meeting, video, mid + '.mp4', match_record['record_size'], start, end, cover_times,
+                       lambda: (driver.download_url(meeting, match_record), {}))]
+
+
+def file_topic(video, name):
+    """多段录像的标题带上序号"""
+    if '-' in name:
+        order_number = int(name.split('-')[-1].split('.')[0])
+        return video.topic + '-{}'.format(order_number)
+    return video.topic
+
+
+def obs_download_url(object_key):
+    bucketName = settings.DEFAULT_CONF.get('OBS_BUCKETNAME', '')
     endpoint = settings.DEFAULT_CONF.get('OBS_ENDPOINT', '')
+    return 'https://{}.{}/{}?response-content-disposition=attachment'.format(bucketName, endpoint, object_key)
+
+
+def lookup_stage(job, meeting, video, sources):
+    """查询平台上的录像文件，尚无可用录像时返回False"""
+    files = LISTERS[meeting.mplatform](meeting, video)
+    if not files:
+        return False
+    sources.update((file['name'], file.pop('resolve')) for file in files)
+    recording_jobs.save(job, files=json.dumps(files), total_size=sum(file['size'] for file in files))
+    return True
+
+
+def transfer_stage(job, meeting, video, sources):
+    """转存OBS中缺失或不完整的录像文件，已转存的文件不会重复下载"""
+    mid = meeting.mid
+    for file in recording_jobs.load_files(job):
+        if not need_upload(mid, file['object_key'], file['size']):
+            continue
+        if file['name'] not in sources:
+            # 续做的任务需重新查询录像以获取有效的下载地址
+            sources.update((x['name'], x['resolve']) for x in LISTERS[meeting.mplatform](meeting, video))
+        if file['name'] not in sources:
+            raise RuntimeError('recording {} is no longer available'.format(file['name']))
+        url, headers = sources[file['name']]()
+        if not url:
+            raise RuntimeError('fail to get download url of {}'.format(file['name']))
+        metadata = {
+            "meeting_id": mid,
+            "meeting_topic": file_topic(video, file['name']),
+            "community": video.community,
+            "sig": video.group_name,
+            "agenda": video.agenda,
+            "record_start": file['start'],
+            "record_end": file['end'],
+            "download_url": obs_download_url(file['object_key']),
+            "total_size": file['size'],
+            "attenders": []
+        }
+        # 流式转存视频，文件大小及分段校验在转存过程中完成
+        obs_transfer.transfer(url, file['object_key'], file['size'], headers=headers, metadata=metadata)
+        logger.info('meeting {}: OBS视频上传成功'.format(mid))
+        recording_jobs.save(job, bytes_transferred=job.bytes_transferred + file['size'])
+    return True
+
+
+def cover_stage(job, meeting, video, sources):
+    """生成并上传封面"""
+    mid = meeting.mid
+    obs_client = obs_index.get_obs_client()
+    if not obs_client:
+        raise RuntimeError('losing required arguments for ObsClient')
     bucketName = settings.DEFAULT_CONF.get('OBS_BUCKETNAME', '')
-    if not (access_key_id and secret_access_key and endpoint and bucketName):
-        logger.error('losing required arguments for ObsClient')
-        return
-    obs_client = ObsClient(access_key_id=access_key_id,
-                           secret_access_key=secret_access_key,
-                           server='https://%s' % endpoint)
-    objs = []
-    mark = None
-    while True:
-        obs_objs = obs_client.listObjects(bucketName, marker=mark, max_keys=1000)
-        if obs_objs.status < 300:
-            index = 1
-            for content in obs_objs.body.contents:
-                objs.append(content)
-                index += 1
-            if obs_objs.body.is_truncated:
-                mark = obs_objs.body.next_marker
-            else:
-                break
-    # 预备文件上传路径
-    start = date + 'T' + start + ':00Z'
-    month = datetime.datetime.strptime(start.replace('T', ' ').replace('Z', ''),
-                                       "%Y-%m-%d %H:%M:%S").strftime("%b").lower()
-    group_name = video.group_name
-    video_name = mid + '.mp4'
-    object_key = 'openeuler/{}/{}/{}/{}'.format(group_name, month, mid, video_name)
-    logger.info('meeting {}: object_key is {}'.format(mid, object_key))
-    # 收集录像信息待用
-    end = date + 'T' + meeting.end + ':00Z'
-    if not objs:
-        logger.info('meeting {}: OBS无存储对象，开始下载视频'.format(mid))
-        download_upload_recordings(start, end, download_url, mid, total_size, video,
-                                   endpoint, object_key,
-                                   group_name, obs_client)
+    for file in recording_jobs.load_files(job):
+        # 每个文件使用独立的临时目录，并发执行的任务不会覆盖或删除彼此的封面文件
+        workdir = tempfile.mkdtemp()
+        filename = os.path.join(workdir, file['name'])
+        try:
+            generate_cover(mid, file_topic(video, file['name']), video.group_name, file['cover_date'], filename,
+                           file['cover_start'], file['cover_end'])
+            res = upload_cover(filename, obs_client, bucketName, file['object_key'].replace('.mp4', '.png'))
+            if res['status'] != 200:
+                raise RuntimeError('fail to upload cover of {}: {}'.format(file['name'], res['status']))
+            logger.info('meeting {}: OBS封面上传成功'.format(mid))
+        finally:
+            remove_cover_files(mid, workdir)
+    return True
+
+
+def db_stage(job, meeting, video, sources):
+    """以第一段录像更新Video及Record"""
+    mid = meeting.mid
+    file = recording_jobs.load_files(job)[0]
+    download_url = obs_download_url(file['object_key'])
+    attenders = get_participants(meeting)
+    Video.objects.filter(mid=mid).update(start=file['start'],
+                                         end=file['end'],
+                                         total_size=file['size'],
+                                         attenders=attenders,
+                                         download_url=download_url)
+    url = download_url.split('?')[0]
+    if Record.objects.filter(mid=mid, platform='obs'):
+        Record.objects.filter(mid=mid, platform='obs').update(url=url, thumbnail=url.replace('.mp4', '.png'))
     else:
-        key_size_map = {x['key']: x['size'] for x in objs}
-        if object_key not in key_size_map.keys():
-            logger.info('meeting {}: OBS存储服务中无此对象，开始下载视频'.format(mid))
-            download_upload_recordings(start, end, download_url, mid, total_size, video,
-                                       endpoint, object_key,
-                                       group_name, obs_client)
-        elif object_key in key_size_map.keys() and key_size_map[object_key] >= total_size:
-            logger.info('meeting {}: OBS存储服务中已存在该对象且无需替换'.format(mid))
-        else:
-            logger.info('meeting {}: OBS存储服务中该对象需要替换，开始下载视频'.format(mid))
-            download_upload_recordings(start, end, download_url, mid, total_size, video,
-                                       endpoint,
-                                       object_key, group_name, obs_client)
+        Record.objects.create(mid=mid, platform='obs', url=url, thumbnail=url.replace('.mp4', '.png'))
+    bump_version(MEETINGS)
+    logger.info('meeting {}: 更新数据库'.format(mid))
+    return True
 
 
-def run(mid):
+def run(job, sources=None, until=recording_jobs.DONE):
     """
-    查询Video根据total_size判断是否需要执行后续操作（下载、上传、保存数据）
-    :param mid: 会议ID
+    从任务的当前阶段开始依次执行，某一阶段失败时记录失败并停止，下次执行时从该阶段重试
+    :param job: RecordingJob的实例
+    :param sources: 查询到的下载地址，按任务id及文件名索引，在同一次执行的多轮调度间共享
+    :param until: 执行到该阶段前停止
     :return:
     """
-    logger.info('meeting {}: 开始处理'.format(mid))
-    platform = Meeting.objects.get(mid=mid).mplatform
-    if platform == 'zoom':
-        handle_zoom_recordings(mid)
-    elif platform == 'welink':
-        handle_welink_recordings(mid)
-    elif platform == 'tencent':
-        handle_tencent_recordings(mid)
+    if not recording_jobs.claim(job):
+        return
+    meeting = job.meeting
+    logger.info('meeting {}: 开始处理，当前阶段{}'.format(meeting.mid, recording_jobs.STAGES[job.stage]))
+    try:
+        video = Video.objects.get(mid=meeting.mid)
+    except Exception as e:
+        recording_jobs.fail(job, e)
+        return
+    # 本次执行中查询到的下载地址，按文件名索引
+    sources = {} if sources is None else sources.setdefault(job.id, {})
+    while job.stage < until:
+        try:
+            finished = STAGE_HANDLERS[job.stage](job, meeting, video, sources)
+        except Exception as e:
+            recording_jobs.fail(job, e)
+            return
+        if not finished:
+            recording_jobs.release(job)
+            return
+        recording_jobs.save(job, stage=job.stage + 1)
+    recording_jobs.release(job)
+    if job.stage == recording_jobs.DONE:
+        logger.info('meeting {}: 处理完成'.format(meeting.mid))
+
+
+LISTERS = {
+    'zoom': list_zoom_files,
+    'welink': list_welink_files,
+    'tencent': list_tencent_files
+}
+
+STAGE_HANDLERS = {
+    recording_jobs.LOOKUP: lookup_stage,
+    recording_jobs.TRANSFER: transfer_stage,
+    recording_jobs.COVER: cover_stage,
+    recording_jobs.DB: db_stage
+}
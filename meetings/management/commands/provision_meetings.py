@@ -0,0 +1,85 @@
+import datetime
+import json
+import logging
+import time
+from django.core.management import BaseCommand
+from django.db import OperationalError, close_old_connections, transaction
+from meetings.models import MeetingJob
+from meetings.utils import provision
+
+logger = logging.getLogger('log')
+
+# 创建中的任务超过该时长仍未结束，视为worker异常退出；第三方平台可能已预定会议，不再重试以免重复预定
+RUNNING_TIMEOUT = datetime.timedelta(minutes=10)
+# 排队超过该时长仍未领取的任务视为worker未运行，不再创建
+PENDING_TIMEOUT = datetime.timedelta(minutes=30)
+
+
+def claim_job():
+    """领取一个排队中的任务，多个worker并发时跳过已被锁定的行"""
+    with transaction.atomic():
+        job = MeetingJob.objects.select_for_update(skip_locked=True).filter(status=provision.PENDING).\
+            order_by('id').first()
+        if not job:
+            return None
+        MeetingJob.objects.filter(id=job.id).update(status=provision.RUNNING, update_time=datetime.datetime.now())
+    return job
+
+
+def run_job(job):
+    logger.info('start meeting job {}'.format(job.id))
+    params = json.loads(job.params)
+    # 任务可能排队较久，领取时重新校验开始时间，避免预定已开始的会议
+    start_time = ' '.join([params['date'], params['start']])
+    if start_time < datetime.datetime.now().strftime('%Y-%m-%d %H:%M'):
+        MeetingJob.objects.filter(id=job.id).update(status=provision.FAILED, code=1005, message='会议开始时间已过')
+        logger.warning('meeting job {} failed: start time {} has passed'.format(job.id, start_time))
+        return
+    try:
+        meeting = provision.provision_meeting(params)
+    except provision.ProvisionError as e:
+        MeetingJob.objects.filter(id=job.id).update(status=provision.FAILED, code=e.code, message=e.message)
+        logger.warning('meeting job {} failed: {} {}'.format(job.id, e.code, e.message))
+    except Exception as e:
+        MeetingJob.objects.filter(id=job.id).update(status=provision.FAILED, code=500, message=str(e)[:255])
+        logger.error('meeting job {} error: {}'.format(job.id, e))
+    else:
+        MeetingJob.objects.filter(id=job.id).update(status=provision.SUCCEEDED, code=201, message='创建成功',
+                                                    meeting=meeting)
+        logger.info('meeting job {} succeeded, meeting id is {}'.format(job.id, meeting.id))
+
+
+def fail_stale_jobs():
+    now = datetime.datetime.now()
+    count = MeetingJob.objects.filter(status=provision.RUNNING, update_time__lt=now - RUNNING_TIMEOUT).\
+        update(status=provision.FAILED, code=500, message='任务超时')
+    count += MeetingJob.objects.filter(status=provision.PENDING, create_time__lt=now - PENDING_TIMEOUT).\
+        update(status=provision.FAILED, code=500, message='任务排队超时')
+    if count:
+        logger.warning('{} stale meeting jobs marked as failed'.format(count))
+
+
+class Command(BaseCommand):
+    help = 'Provision meetings submitted asynchronously through MeetingsView'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='exit when the queue is empty')
+        parser.add_argument('--interval', type=float, default=1, help='seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                fail_stale_jobs()
+                job = claim_job()
+            except OperationalError as e:
+                # 数据库重启或连接超时后关闭失效的连接，下一轮重新连接
+                logger.error('fail to claim meeting job: {}'.format(e))
+                close_old_connections()
+                time.sleep(options['interval'])
+                continue
+            if job:
+                run_job(job)
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
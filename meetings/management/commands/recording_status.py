@@ -0,0 +1,30 @@
+import datetime
+import logging
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+from meetings.models import RecordingJob
+from meetings.utils import recording_jobs
+
+logger = logging.getLogger('log')
+
+
+class Command(BaseCommand):
+    help = 'Show recording job statistics and list stuck jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stuck-hours', type=float, default=24,
+                            help='hours a job may stay in one stage before it is reported as stuck')
+
+    def handle(self, *args, **options):
+        rows = RecordingJob.objects.values('stage', 'status').\
+            annotate(count=Count('id'), transferred=Sum('bytes_transferred')).order_by('stage', 'status')
+        if not rows:
+            logger.info('no recording jobs yet')
+        for row in rows:
+            logger.info('stage {}, {}: {} jobs, {} bytes transferred'.format(
+                recording_jobs.STAGES[row['stage']], recording_jobs.STATUS[row['status']], row['count'],
+                row['transferred'] or 0))
+        for job in recording_jobs.stuck_jobs(datetime.timedelta(hours=options['stuck_hours'])):
+            logger.warning('stuck meeting {}: stage {}, {}, attempts {}, since {}, {}/{} bytes, error: {}'.format(
+                job.meeting.mid, recording_jobs.STAGES[job.stage], recording_jobs.STATUS[job.status], job.attempts,
+                job.stage_time, job.bytes_transferred, job.total_size, job.last_error))
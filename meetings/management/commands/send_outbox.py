@@ -0,0 +1,80 @@
+import datetime
+import logging
+import time
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+from meetings.models import MailOutbox
+from meetings.utils import mailer
+
+logger = logging.getLogger('log')
+
+# 发送中的邮件超过该时长未更新，视为worker异常退出，重新放回队列
+SENDING_TIMEOUT = datetime.timedelta(minutes=10)
+
+
+def claim_batch():
+    """领取一批到期的待发送邮件，多个worker并发时跳过已被锁定的行"""
+    now = datetime.datetime.now()
+    with transaction.atomic():
+        ids = list(MailOutbox.objects.select_for_update(skip_locked=True).
+                   filter(status=mailer.PENDING, next_try_time__lte=now).order_by('id').
+                   values_list('id', flat=True)[:settings.MAIL_BATCH_SIZE])
+        MailOutbox.objects.filter(id__in=ids).update(status=mailer.SENDING, update_time=now)
+    return list(MailOutbox.objects.filter(id__in=ids).order_by('id'))
+
+
+def requeue_stale():
+    expire_time = datetime.datetime.now() - SENDING_TIMEOUT
+    count = MailOutbox.objects.filter(status=mailer.SENDING, update_time__lt=expire_time).update(
+        status=mailer.PENDING)
+    if count:
+        logger.warning('{} stale mails requeued'.format(count))
+
+
+def send(connection, mail):
+    attempts = mail.attempts + 1
+    try:
+        refused = connection.send(mail.from_addr, mail.to_addrs.split(','), mail.message)
+    except Exception as e:
+        connection.close()
+        if mailer.is_transient(e) and attempts < settings.MAIL_MAX_ATTEMPTS:
+            next_try_time = datetime.datetime.now() + datetime.timedelta(
+                seconds=settings.MAIL_RETRY_BACKOFF * 2 ** (attempts - 1))
+            MailOutbox.objects.filter(id=mail.id).update(status=mailer.PENDING, attempts=attempts,
+                                                         last_error=str(e)[:255], next_try_time=next_try_time)
+            logger.warning('mail {} will retry at {}: {}'.format(mail.id, next_try_time, e))
+        else:
+            MailOutbox.objects.filter(id=mail.id).update(status=mailer.FAILED, attempts=attempts,
+                                                         last_error=str(e)[:255])
+            logger.error('mail {} failed: {}'.format(mail.id, e))
+        return
+    MailOutbox.objects.filter(id=mail.id).update(status=mailer.SENT, attempts=attempts)
+    if refused:
+        logger.warning('mail {}: refused addrs {}'.format(mail.id, refused))
+    logger.info('mail {} sent: {}'.format(mail.id, mail.to_addrs))
+
+
+class Command(BaseCommand):
+    help = 'Send queued mails over a persistent SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='exit when the outbox is empty')
+        parser.add_argument('--interval', type=float, default=2, help='seconds to sleep when the outbox is empty')
+
+    def handle(self, *args, **options):
+        connection = mailer.SMTPConnection()
+        try:
+            while True:
+                requeue_stale()
+                batch = claim_batch()
+                for mail in batch:
+                    send(connection, mail)
+                if batch:
+                    continue
+                if options['once']:
+                    break
+                connection.close_if_idle()
+                time.sleep(options['interval'])
+        finally:
+            connection.close()
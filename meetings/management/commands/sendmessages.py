@@ -1,67 +1,58 @@
 import datetime
-import json
 import logging
-import requests
+from django.conf import settings
 from django.core.management import BaseCommand
-from meetings.models import Collect, Meeting, User
-from meetings.utils import wx_apis
+from django.db.models import Q
+from meetings.models import Collect, Meeting, ReminderLog
+from meetings.utils import notify, wx_apis
 
 logger = logging.getLogger('log')
 
 
+def window_meetings(now):
+    """查询在(now, now + REMINDER_WINDOW]内开始的会议，窗口跨天时分别按两天的日期查询"""
+    end = now + datetime.timedelta(minutes=settings.REMINDER_WINDOW)
+    t1 = now.strftime('%H:%M')
+    t2 = end.strftime('%H:%M')
+    if now.date() == end.date():
+        condition = Q(date=now.strftime('%Y-%m-%d'), start__gt=t1, start__lte=t2)
+    else:
+        condition = Q(date=now.strftime('%Y-%m-%d'), start__gt=t1) | Q(date=end.strftime('%Y-%m-%d'), start__lte=t2)
+    return Meeting.objects.filter(condition, is_delete=0)
+
+
+def get_receivers(meetings):
+    """
+    一次查询获取所有会议的创建人及收藏者，由UNION在数据库中去重
+    :return: [(meeting_id, mid, topic, date, start, openid, nickname), ...]
+    """
+    creators = meetings.values_list('id', 'mid', 'topic', 'date', 'start', 'user__openid', 'user__nickname')
+    collectors = Collect.objects.filter(meeting__in=meetings).values_list(
+        'meeting_id', 'meeting__mid', 'meeting__topic', 'meeting__date', 'meeting__start', 'user__openid',
+        'user__nickname')
+    return [row for row in creators.union(collectors) if row[5]]
+
+
 def send_subscribe_msg():
     logger.info('start to search meetings...')
-    # 获取当前日期
-    date = datetime.datetime.now().strftime('%Y-%m-%d')
-    t1 = datetime.datetime.now().strftime('%H:%M')
-    t2 = (datetime.datetime.now() + datetime.timedelta(minutes=10)).strftime('%H:%M')
-    # 查询当日在t1到t2时段存在的会议
-    meetings = Meeting.objects.filter(is_delete=0, date=date, start__gt=t1, start__lte=t2)
-    # 若存在符合条件的会议,遍历meetings对每个会议的创建人与收藏者发送订阅消息
-    if meetings:
+    receivers = get_receivers(window_meetings(datetime.datetime.now()))
+    if not receivers:
         logger.info('no meeting found, skip meeting notify.')
         return
-    # 获取access_token
-    access_token = wx_apis.get_token()
-    for meeting in meetings:
-        topic = meeting.topic
-        start_time = meeting.start
-        meeting_id = meeting.id
-        time = date + ' ' + start_time
-        mid = meeting.mid
-        creater_id = meeting.user_id
-        creater_openid = User.objects.get(id=creater_id).openid
-        send_to_list = [creater_openid]
-        # 查询该会议的收藏
-        collections = Collect.objects.filter(meeting_id=meeting.id)
-        # 若存在collections,遍历collections将openid添加入send_to_list
-        if collections:
-            for collection in collections:
-                user_id = collection.user_id
-                openid = User.objects.get(id=user_id).openid
-                send_to_list.append(openid)
-            # 发送列表去重
-            send_to_list = list(set(send_to_list))
-        else:
-            logger.info('the meeting {} had not been added to Favorites'.format(mid))
-        for openid in send_to_list:
-            # 获取模板
-            content = wx_apis.get_start_template(openid, meeting_id, topic, time)
-            # 发送订阅消息
-            url = 'https://api.weixin.qq.com/cgi-bin/message/subscribe/send?access_token={}'.format(
-                access_token)
-            r = requests.post(url, json.dumps(content))
-            if r.status_code != 200:
-                logger.error('status code: {}'.format(r.status_code))
-                logger.error('content: {}'.format(r.json()))
-            else:
-                nickname = User.objects.get(openid=openid).nickname
-                if r.json()['errcode'] != 0:
-                    logger.warning('Error Code: {}'.format(r.json()['errcode']))
-                    logger.warning('Error Msg: {}'.format(r.json()['errmsg']))
-                    logger.warning('receiver: {}'.format(nickname))
-                else:
-                    logger.info('meeting {} subscription message sent to {}.'.format(mid, nickname))
+    # 跳过已发送过提醒的接收人，窗口重叠或重复执行时不会重复提醒
+    sent = set(ReminderLog.objects.filter(meeting_id__in={row[0] for row in receivers}).
+               values_list('meeting_id', 'openid'))
+    receivers = [row for row in receivers if (row[0], row[5]) not in sent]
+    if not receivers:
+        logger.info('all reminders have been sent.')
+        return
+    messages = [(nickname, wx_apis.get_start_template(openid, meeting_id, topic, date + ' ' + start))
+                for meeting_id, mid, topic, date, start, openid, nickname in receivers]
+    results = notify.dispatch(messages, wait=True)
+    # 仅记录发送成功的提醒，失败的提醒在下次执行时若仍在窗口内则重试
+    ReminderLog.objects.bulk_create([ReminderLog(meeting_id=row[0], openid=row[5])
+                                     for row, ok in zip(receivers, results) if ok], ignore_conflicts=True)
+    logger.info('{} of {} reminders sent.'.format(sum(results), len(results)))
 
 
 class Command(BaseCommand):
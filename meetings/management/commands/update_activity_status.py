@@ -1,6 +1,7 @@
 import datetime
 import logging
 from meetings.models import Activity
+from meetings.utils.response_cache import bump_version, ACTIVITIES
 from django.core.management import BaseCommand
 
 logger = logging.getLogger('log')
@@ -12,7 +13,7 @@ def update_activity_status():
     today = datetime.date.today().strftime('%Y-%m-%d')
     for activity in activities:
         if activity.date == today and activity.status == 3:
-            Activity.objects.filter(id=activity.id).update(status=4)
+            Activity.objects.filter(id=activity.id).update(status=4, update_time=datetime.datetime.now())
             logger.info(
                 '\nid: {0}\ndate: {1}\ntitle: {2}\nenterprise: {3}\nsponsor: {4}'.format(activity.id,
                                                                                          activity.date,
@@ -21,7 +22,7 @@ def update_activity_status():
                                                                                          activity.user.gitee_name))
             logger.info('update activity status from publishing to going.')
         if activity.date < today and activity.status == 4:
-            Activity.objects.filter(id=activity.id).update(status=5)
+            Activity.objects.filter(id=activity.id).update(status=5, update_time=datetime.datetime.now())
             logger.info(
                 '\nid: {0}\ndate: {1}\ntitle: {2}\nenterprise: {3}\nsponsor: {4}'.format(activity.id,
                                                                                          activity.date,
@@ -29,6 +30,7 @@ def update_activity_status():
                                                                                          activity.user.enterprise,
                                                                                          activity.user.gitee_name))
             logger.info('update activity status from going to completed.')
+    bump_version(ACTIVITIES)
     logger.info('All done. Waiting for next task...')
 
 
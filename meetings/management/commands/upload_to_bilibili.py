@@ -7,8 +7,8 @@ import traceback
 from bilibili_api import video, Verify
 from django.conf import settings
 from django.core.management import BaseCommand
-from obs import ObsClient
 from meetings.models import Record
+from meetings.utils import obs_index
 
 logger = logging.getLogger('log')
 
@@ -16,38 +16,17 @@ logger = logging.getLogger('log')
 class Command(BaseCommand):
     def handle(self, *args, **options):
         # 从OBS查询对象
-        access_key_id = settings.DEFAULT_CONF.get('ACCESS_KEY_ID', '')
-        secret_access_key = settings.DEFAULT_CONF.get('SECRET_ACCESS_KEY', '')
-        endpoint = settings.DEFAULT_CONF.get('OBS_ENDPOINT', '')
-        bucketName = settings.DEFAULT_CONF.get('OBS_BUCKETNAME', '')
-        if not access_key_id or not secret_access_key or not endpoint or not bucketName:
-            logger.error('losing required arguments for ObsClient')
+        index = obs_index.get_object_index()
+        if not index:
             sys.exit(1)
-        obs_client = ObsClient(access_key_id=access_key_id,
-                               secret_access_key=secret_access_key,
-                               server='https://%s' % endpoint)
-        objs = []
-        mark = None
-        while True:
-            obs_objs = obs_client.listObjects(bucketName, marker=mark, max_keys=1000)
-            if obs_objs.status < 300:
-                index = 1
-                for content in obs_objs.body.contents:
-                    objs.append(content)
-                    index += 1
-                if obs_objs.body.is_truncated:
-                    mark = obs_objs.body.next_marker
-                else:
-                    break
+        obs_client = index.obs_client
+        bucketName = index.bucket
+        object_keys = index.keys(suffix='.mp4')
         # 遍历
-        if len(objs) == 0:
+        if len(object_keys) == 0:
             logger.info('OBS中无对象')
             return
-        for obj in objs:
-            # 获取对象的地址
-            object_key = obj['key']
-            if not object_key.endswith('.mp4'):
-                continue
+        for object_key in object_keys:
             # 获取对象的metadata
             metadata = obs_client.getObjectMetadata(bucketName, object_key)
             metadata_dict = {x: y for x, y in metadata['header']}
@@ -68,7 +68,7 @@ class Meeting(models.Model):
     etherpad = models.CharField(verbose_name='etherpad', max_length=255, null=True, blank=True)
     emaillist = models.TextField(verbose_name='邮件列表', null=True, blank=True)
     host_id = models.EmailField(verbose_name='host_id', null=True, blank=True)
-    mid = models.CharField(verbose_name='会议id', max_length=20)
+    mid = models.CharField(verbose_name='会议id', max_length=20, db_index=True)
     mmid = models.CharField(verbose_name='腾讯会议id', max_length=20, null=True, blank=True)
     timezone = models.CharField(verbose_name='时区', max_length=50, null=True, blank=True)
     password = models.CharField(verbose_name='密码', max_length=128, null=True, blank=True)
@@ -80,6 +80,32 @@ class Meeting(models.Model):
     group = models.ForeignKey(Group, on_delete=models.DO_NOTHING)
     mplatform = models.CharField(verbose_name='第三方会议平台', max_length=20, null=True, blank=True, default='zoom')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_delete', 'date', 'start']),
+            models.Index(fields=['is_delete', 'mplatform', 'date']),
+            models.Index(fields=['group_name', 'date']),
+        ]
+
+
+class HostLock(models.Model):
+    """host分配锁表"""
+    platform = models.CharField(verbose_name='第三方会议平台', max_length=20, unique=True)
+
+
+class HostReservation(models.Model):
+    """host预留表"""
+    platform = models.CharField(verbose_name='第三方会议平台', max_length=20)
+    host_id = models.CharField(verbose_name='host_id', max_length=128)
+    start_at = models.DateTimeField(verbose_name='预留开始时间(UTC)')
+    end_at = models.DateTimeField(verbose_name='预留结束时间(UTC)')
+    create_time = models.DateTimeField(verbose_name='创建时间', auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['platform', 'start_at']),
+        ]
+
 
 class Collect(models.Model):
     """用户收藏会议表"""
@@ -108,6 +134,11 @@ class Record(models.Model):
     url = models.CharField(verbose_name='播放地址', max_length=128, null=True, blank=True)
     thumbnail = models.CharField(verbose_name='缩略图', max_length=128, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['mid', 'platform']),
+        ]
+
 
 class Activity(models.Model):
     """活动表"""
@@ -130,6 +161,7 @@ class Activity(models.Model):
     wx_code = models.TextField(verbose_name='微信二维码', null=True, blank=True)
     is_delete = models.SmallIntegerField(verbose_name='是否删除', choices=((0, '未删除'), (1, '已删除')), default=0)
     create_time = models.DateTimeField(verbose_name='创建时间', auto_now_add=True)
+    update_time = models.DateTimeField(verbose_name='修改时间', auto_now=True, null=True, blank=True)
     start = models.CharField(verbose_name='开始时间', max_length=10, null=True, blank=True)
     end = models.CharField(verbose_name='结束时间', max_length=10, null=True, blank=True)
     start_url = models.TextField(verbose_name='主持人入口', null=True, blank=True)
@@ -139,6 +171,11 @@ class Activity(models.Model):
     replay_url = models.CharField(verbose_name='回放地址', max_length=255, null=True, blank=True)
     register_url = models.CharField(verbose_name='报名链接', max_length=255, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_delete', 'status', 'date']),
+        ]
+
 
 class Feedback(models.Model):
     """意见反馈表"""
@@ -165,3 +202,72 @@ class ActivitySign(models.Model):
     """用户活动签到表"""
     activity = models.ForeignKey(Activity, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+
+
+class MeetingJob(models.Model):
+    """异步创建会议任务表"""
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING)
+    params = models.TextField(verbose_name='创建参数')
+    status = models.SmallIntegerField(verbose_name='状态', choices=((0, '排队中'), (1, '创建中'), (2, '成功'), (3, '失败')),
+                                      default=0)
+    code = models.IntegerField(verbose_name='结果码', null=True, blank=True)
+    message = models.CharField(verbose_name='结果信息', max_length=255, null=True, blank=True)
+    meeting = models.ForeignKey(Meeting, on_delete=models.DO_NOTHING, null=True, blank=True)
+    create_time = models.DateTimeField(verbose_name='创建时间', auto_now_add=True)
+    update_time = models.DateTimeField(verbose_name='修改时间', auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+
+
+class MailOutbox(models.Model):
+    """待发送邮件表"""
+    from_addr = models.CharField(verbose_name='发件人', max_length=255)
+    to_addrs = models.TextField(verbose_name='收件人')
+    message = models.TextField(verbose_name='邮件内容')
+    status = models.SmallIntegerField(verbose_name='状态', choices=((0, '待发送'), (1, '发送中'), (2, '已发送'), (3, '失败')),
+                                      default=0)
+    attempts = models.IntegerField(verbose_name='发送次数', default=0)
+    last_error = models.CharField(verbose_name='最近一次错误', max_length=255, null=True, blank=True)
+    next_try_time = models.DateTimeField(verbose_name='下次发送时间')
+    create_time = models.DateTimeField(verbose_name='创建时间', auto_now_add=True)
+    update_time = models.DateTimeField(verbose_name='修改时间', auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_try_time']),
+        ]
+
+
+class ReminderLog(models.Model):
+    """会议开始提醒发送记录表"""
+    meeting = models.ForeignKey(Meeting, on_delete=models.CASCADE)
+    openid = models.CharField(verbose_name='openid', max_length=32)
+    create_time = models.DateTimeField(verbose_name='发送时间', auto_now_add=True)
+
+    class Meta:
+        unique_together = ('meeting', 'openid')
+
+
+class RecordingJob(models.Model):
+    """会议录像处理任务表，按阶段记录进度，失败后从失败的阶段重试"""
+    meeting = models.OneToOneField(Meeting, on_delete=models.DO_NOTHING)
+    stage = models.SmallIntegerField(verbose_name='阶段', choices=(
+        (0, '查询录像'), (1, '转存录像'), (2, '生成封面'), (3, '更新数据库'), (4, '完成')), default=0)
+    status = models.SmallIntegerField(verbose_name='状态', choices=((0, '待处理'), (1, '处理中'), (2, '失败')),
+                                      default=0)
+    attempts = models.IntegerField(verbose_name='当前阶段失败次数', default=0)
+    files = models.TextField(verbose_name='录像文件', null=True, blank=True)
+    total_size = models.BigIntegerField(verbose_name='录像总大小', null=True, blank=True)
+    bytes_transferred = models.BigIntegerField(verbose_name='已转存字节数', default=0)
+    last_error = models.CharField(verbose_name='最近一次错误', max_length=255, null=True, blank=True)
+    stage_time = models.DateTimeField(verbose_name='进入当前阶段的时间', null=True, blank=True)
+    create_time = models.DateTimeField(verbose_name='创建时间', auto_now_add=True)
+    update_time = models.DateTimeField(verbose_name='修改时间', auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['stage', 'status']),
+        ]
@@ -0,0 +1,109 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from django.conf import settings
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    基于排序键的游标分页
+    视图通过keyset_ordering指定排序字段，最后一个字段需唯一(如id)以保证游标稳定；
+    可为NULL的字段按升序时排在最前、降序时排在最后；
+    请求携带all=true时不分页，兼容尚未迁移的客户端
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    legacy_query_param = 'all'
+    page_size = settings.KEYSET_PAGE_SIZE
+    max_page_size = settings.KEYSET_MAX_PAGE_SIZE
+    ordering = ('-id',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.legacy_query_param) in ('1', 'true', 'True'):
+            return None
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.get_ordering())
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        results = results[:page_size]
+        self.next_position = self.get_position(results[-1]) if self.has_next else None
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_position(self, instance):
+        return [getattr(instance, field.lstrip('-')) for field in self.ordering]
+
+    def get_ordering(self):
+        """固定NULL的排序位置，使各数据库的排序与游标条件一致"""
+        return [F(field[1:]).desc(nulls_last=True) if field.startswith('-') else F(field).asc(nulls_first=True)
+                for field in self.ordering]
+
+    def get_position_filter(self, position):
+        """构造(f1, f2, ...) 严格位于 position 之后的查询条件，NULL以__isnull单独处理"""
+        condition = Q()
+        same = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            descending = field.startswith('-')
+            if value is None:
+                # 升序时NULL最小，之后为所有非NULL值；降序时NULL最大，该字段上不存在之后的值
+                after = None if descending else Q(**{'{}__isnull'.format(name): False})
+                equal = Q(**{'{}__isnull'.format(name): True})
+            else:
+                after = Q(**{'{}__{}'.format(name, 'lt' if descending else 'gt'): value})
+                if descending:
+                    after |= Q(**{'{}__isnull'.format(name): True})
+                equal = Q(**{name: value})
+            if after is not None:
+                condition |= same & after
+            same &= equal
+        # 没有位于游标之后的记录
+        return condition or Q(pk__in=[])
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, position):
+        encoded = base64.urlsafe_b64encode(json.dumps(position, default=str).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
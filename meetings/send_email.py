@@ -1,18 +1,14 @@
 import datetime
 import icalendar
 import logging
-import os
 import pytz
 import re
-import smtplib
 import uuid
-from django.conf import settings
+from meetings.utils import mailer, mail_templates
 from email import encoders
 from email.mime.base import MIMEBase
 from email.mime.application import MIMEApplication
 from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.image import MIMEImage
 from meetings.models import Meeting
 
 logger = logging.getLogger('log')
@@ -51,50 +47,23 @@ def sendmail(meeting, record=None, enclosure_paths=None):
     msg = MIMEMultipart()
 
     # 添加邮件主体
-    body_of_email = None
-    if not summary and not record:
-        print(platform)
-        with open('templates/template_without_summary_without_recordings.txt', 'r', encoding='utf-8') as fp:
-            body = fp.read()
-            body_of_email = body.replace('{{sig_name}}', '{0}').replace('{{start_time}}', '{1}').\
-                replace('{{join_url}}', '{2}').replace('{{topic}}', '{3}').\
-                replace('{{platform}}', '{4}').replace('{{etherpad}}', '{5}').\
-                format(sig_name, start_time, join_url, topic, platform, etherpad)
-    if summary and not record:
-        print(platform)
-        with open('templates/template_with_summary_without_recordings.txt', 'r', encoding='utf-8') as fp:
-            body = fp.read()
-            body_of_email = body.replace('{{sig_name}}', '{0}').replace('{{start_time}}', '{1}').\
-                replace('{{join_url}}', '{2}').replace('{{topic}}', '{3}').\
-                replace('{{summary}}', '{4}').replace('{{platform}}', '{5}').\
-                replace('{{etherpad}}', '{6}').\
-                format(sig_name, start_time, join_url, topic, summary, platform, etherpad)
-    if not summary and record:
-        with open('templates/template_without_summary_with_recordings.txt', 'r', encoding='utf-8') as fp:
-            body = fp.read()
-            body_of_email = body.replace('{{sig_name}}', '{0}').replace('{{start_time}}', '{1}').\
-                replace('{{join_url}}', '{2}').replace('{{topic}}', '{3}').replace('{{platform}}', '{4}').\
-                replace('{{etherpad}}', '{5}').\
-                format(sig_name, start_time, join_url, topic, platform, etherpad)
-    if summary and record:
-        with open('templates/template_with_summary_with_recordings.txt', 'r', encoding='utf-8') as fp:
-            body = fp.read()
-            body_of_email = body.replace('{{sig_name}}', '{0}').replace( '{{start_time}}', '{1}').\
-                replace('{{join_url}}', '{2}').replace('{{topic}}', '{3}').\
-                replace('{{summary}}', '{4}').replace('{{platform}}', '{5}').\
-                replace('{{etherpad}}', '{6}').\
-                format(sig_name, start_time, join_url, topic, summary, platform, etherpad)
-    content = MIMEText(body_of_email, 'plain', 'utf-8')
+    template_name = 'template_{}_summary_{}_recordings'.format('with' if summary else 'without',
+                                                              'with' if record else 'without')
+    context = {
+        'sig_name': sig_name,
+        'start_time': start_time,
+        'join_url': join_url,
+        'topic': topic,
+        'summary': summary,
+        'platform': platform,
+        'etherpad': etherpad
+    }
+    body_of_email, content = mail_templates.render_body(template_name, context)
     msg.attach(content)
 
     # 添加图片
-    for file in os.listdir('templates/images'):
-        if os.path.join('images', file) in body_of_email:
-            f = open(os.path.join('templates', 'images', file), 'rb')
-            msgImage = MIMEImage(f.read())
-            f.close()
-            msgImage.add_header('Content-ID', '<{}>'.format(os.path.join('images', file)))
-            msg.attach(msgImage)
+    for image in mail_templates.image_parts(body_of_email):
+        msg.attach(image)
 
     # 添加邮件附件
     paths = enclosure_paths
@@ -145,17 +114,7 @@ def sendmail(meeting, record=None, enclosure_paths=None):
     msg['From'] = 'openEuler conference<public@openeuler.org>'
     msg['To'] = toaddrs_string
 
-    # 登录服务器发送邮件
-    try:
-        gmail_username = settings.GMAIL_USERNAME
-        server = smtplib.SMTP(settings.SMTP_SERVER_HOST, settings.SMTP_SERVER_PORT)
-        server.ehlo()
-        server.starttls()
-        server.login(settings.SMTP_SERVER_USER, settings.SMTP_SERVER_PASS)
-        server.sendmail(gmail_username, toaddrs_list, msg.as_string())
-        logger.info('email string: {}'.format(toaddrs))
-        logger.info('error addrs: {}'.format(error_addrs))
-        logger.info('email sent: {}'.format(toaddrs_string))
-        server.quit()
-    except smtplib.SMTPException as e:
-        logger.error(e)
+    # 写入发件箱，由send_outbox命令发送
+    mailer.enqueue(msg, toaddrs_list)
+    logger.info('email string: {}'.format(toaddrs))
+    logger.info('error addrs: {}'.format(error_addrs))
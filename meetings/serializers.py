@@ -1,11 +1,13 @@
 import logging
 from django.contrib.auth.hashers import make_password
+from django.db.models import Exists, OuterRef, Subquery
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
 from rest_framework_simplejwt.tokens import RefreshToken
 from meetings.models import Collect, Group, User, Meeting, GroupUser, Record, Activity, ActivityCollect, \
     ActivityRegister, Feedback, ActivitySign
 from meetings.utils import wx_apis
+from meetings.utils.registrants import iter_registrants
 
 logger = logging.getLogger('log')
 
@@ -101,7 +103,19 @@ class MeetingListSerializer(ModelSerializer):
         fields = ['id', 'collection_id', 'user_id', 'group_id', 'topic', 'sponsor', 'group_name', 'date', 'start',
                   'end', 'agenda', 'etherpad', 'mid', 'join_url', 'video_url', 'mplatform']
 
+    @staticmethod
+    def annotate_queryset(queryset, user):
+        """为整页会议一次性标注收藏id和B站播放地址，避免逐条查询"""
+        user_id = user.pk if user is not None else None
+        collections = Collect.objects.filter(meeting_id=OuterRef('pk'), user_id=user_id).order_by('id')
+        records = Record.objects.filter(mid=OuterRef('mid'), platform='bilibili').order_by('id')
+        return queryset.annotate(collect_id=Subquery(collections.values('id')[:1]),
+                                 bilibili_url=Subquery(records.values('url')[:1]),
+                                 has_bilibili_record=Exists(records))
+
     def get_collection_id(self, obj):
+        if hasattr(obj, 'collect_id'):
+            return obj.collect_id
         user = None
         request = self.context.get("request")
         if request and hasattr(request, "user"):
@@ -112,9 +126,10 @@ class MeetingListSerializer(ModelSerializer):
             return
 
     def get_video_url(self, obj):
-        video_url = Record.objects.filter(mid=obj.mid, platform='bilibili').values()[0]['url'] if Record.objects.filter(
-            mid=obj.mid, platform='bilibili') else ''
-        return video_url
+        if hasattr(obj, 'has_bilibili_record'):
+            return obj.bilibili_url if obj.has_bilibili_record else ''
+        record = Record.objects.filter(mid=obj.mid, platform='bilibili').values('url').first()
+        return record['url'] if record else ''
 
 
 class LoginSerializer(serializers.ModelSerializer):
@@ -265,6 +280,9 @@ class ActivitiesSerializer(ModelSerializer):
                   'enterprise', 'start', 'end', 'join_url', 'replay_url', 'register_url']
 
     def get_collection_id(self, obj):
+        collections = self.context.get('activity_collections')
+        if collections is not None:
+            return collections.get(obj.id)
         user = None
         request = self.context.get("request")
         if request and hasattr(request, "user"):
@@ -327,23 +345,10 @@ class ActivitySignSerializer(ModelSerializer):
 
 class ActivityRegistrantsSerializer(ModelSerializer):
     registrants = serializers.SerializerMethodField()
+
     class Meta:
-        model = User
+        model = Activity
         fields = ['registrants']
 
     def get_registrants(self, obj):
-        user_ids = ActivityRegister.objects.filter(activity_id=obj.id).values_list('user_id', flat=True)
-        users = User.objects.filter(id__in=user_ids)
-        registrants = [
-            {
-                'id': x.id,
-                'name': x.name,
-                'telephone': x.telephone,
-                'email': x.email,
-                'company': x.company,
-                'profession': x.profession,
-                'sign': True if ActivitySign.objects.filter(activity_id=obj.id, user_id=x.id) else False
-            }
-            for x in users
-        ]
-        return registrants
+        return list(iter_registrants(obj.id))
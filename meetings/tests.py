@@ -0,0 +1,990 @@
+import base64
+import datetime
+from email.mime.text import MIMEText
+import hashlib
+import json
+import os
+import re
+import shutil
+import socketserver
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+from meetings.management.commands import handle_recordings, provision_meetings
+from meetings.models import Group, HostReservation, MailOutbox, Meeting, MeetingJob, Record, RecordingJob, User, \
+    Video
+from meetings.pagination import KeysetPagination
+from meetings.views import MeetingDelView, MeetingsDataView, MeetingsView, ParticipantsView
+from meetings.utils import downloader, drivers, host_scheduler, http_client, mailer, notify, obs_index, obs_transfer, \
+    provision, recording_jobs, recording_scheduler, response_cache, token_cache, welink_apis
+
+
+class KeysetView:
+    keyset_ordering = ('nickname', 'id')
+
+
+class KeysetPaginationTest(TestCase):
+    """游标分页按排序键逐页读取，NULL排序键不影响翻页"""
+
+    def setUp(self):
+        for index, nickname in enumerate([None, 'b', None, 'a', 'b', 'c', None]):
+            User.objects.create(openid='openid-{}'.format(index), nickname=nickname)
+
+    def read_pages(self, ordering, page_size=2):
+        view = KeysetView()
+        view.keyset_ordering = ordering
+        params = {'page_size': page_size}
+        ids = []
+        while True:
+            paginator = KeysetPagination()
+            request = Request(APIRequestFactory().get('/users/', params))
+            page = paginator.paginate_queryset(User.objects.all(), request, view)
+            ids.extend(user.id for user in page)
+            if not paginator.has_next:
+                return ids
+            params['cursor'] = parse_qs(urlparse(paginator.get_next_link()).query)['cursor'][0]
+
+    def expected(self, descending):
+        users = list(User.objects.all())
+        nulls = sorted(user.id for user in users if user.nickname is None)
+        values = sorted((user for user in users if user.nickname is not None),
+                        key=lambda user: (user.nickname, user.id))
+        if descending:
+            values = sorted(values, key=lambda user: (user.nickname, -user.id), reverse=True)
+            return [user.id for user in values] + nulls
+        return nulls + [user.id for user in values]
+
+    def test_ascending_with_nulls(self):
+        self.assertEqual(self.read_pages(('nickname', 'id')), self.expected(descending=False))
+
+    def test_descending_with_nulls(self):
+        self.assertEqual(self.read_pages(('-nickname', 'id')), self.expected(descending=True))
+
+    def test_every_page_size(self):
+        for page_size in range(1, 8):
+            self.assertEqual(self.read_pages(('nickname', 'id'), page_size), self.expected(descending=False))
+
+
+STUB_HOSTS = {'stub-host-1': 'host1@example.com', 'stub-host-2': 'host2@example.com'}
+
+
+class StubDriver(drivers.Driver):
+    """在平台上预定会议的替身，延迟返回以放大并发创建的竞争窗口"""
+
+    def create(self, date, start, end, topic, host, record):
+        time.sleep(0.05)
+        host_id = {account: host_id for host_id, account in STUB_HOSTS.items()}[host]
+        return 201, {'mid': uuid.uuid4().hex[:20], 'join_url': 'https://example.com/j', 'host_id': host_id}
+
+
+@override_settings(MEETING_HOSTS={'stub': STUB_HOSTS})
+class ProvisionConcurrencyTest(TransactionTestCase):
+    """多个线程同时创建同一时段的会议，每个host最多分配一次"""
+
+    def setUp(self):
+        drivers.register('stub')(StubDriver)
+        self.user = User.objects.create(openid='sponsor')
+        self.group = Group.objects.create(group_name='sig-stub')
+        self.date = (datetime.date.today() + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+
+    def tearDown(self):
+        drivers._drivers.pop('stub', None)
+
+    def provision(self, results):
+        params = {
+            'platform': 'stub',
+            'date': self.date,
+            'start': '10:00',
+            'end': '11:00',
+            'topic': 'concurrency',
+            'record': '',
+            'community': 'openeuler',
+            'sponsor': 'sponsor',
+            'group_name': self.group.group_name,
+            'etherpad': '',
+            'emaillist': '',
+            'agenda': '',
+            'user_id': self.user.id,
+            'group_id': self.group.id
+        }
+        try:
+            results.append(provision.provision_meeting(params).host_id)
+        except provision.ProvisionError as e:
+            results.append(e.code)
+        finally:
+            connection.close()
+
+    def test_no_double_booking(self):
+        results = []
+        threads = [threading.Thread(target=self.provision, args=(results,)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(str(result) for result in results), ['1000'] * 4 + sorted(STUB_HOSTS))
+        host_ids = list(Meeting.objects.filter(mplatform='stub').values_list('host_id', flat=True))
+        self.assertEqual(sorted(host_ids), sorted(STUB_HOSTS))
+        self.assertFalse(HostReservation.objects.exists())
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """按Range请求返回部分内容，记录每个请求的Range，truncate中的Range首次请求时只返回一半内容"""
+
+    def do_GET(self):
+        content = self.server.content
+        requested = self.headers.get('Range')
+        self.server.requests.append(requested)
+        match = re.match(r'bytes=(\d+)-(\d+)', requested or '')
+        if match and self.server.ranged:
+            start, end = int(match.group(1)), min(int(match.group(2)), len(content) - 1)
+            body = content[start:end + 1]
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end, len(content)))
+        else:
+            body = content
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if requested in self.server.truncate:
+            self.server.truncate.discard(requested)
+            body = body[:len(body) // 2]
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RecordingServerMixin:
+    """在本地启动提供录像下载的HTTP服务"""
+
+    def start_server(self, content, ranged=True):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+        server.content = content
+        server.ranged = ranged
+        server.requests = []
+        server.truncate = set()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = 'http://127.0.0.1:{}/recording.mp4'.format(server.server_address[1])
+        return server, url
+
+
+def part_ranges(content, part_size):
+    return ['bytes={}-{}'.format(start, min(start + part_size, len(content)) - 1)
+            for start in range(0, len(content), part_size)]
+
+
+class FakeObsClient:
+    """OBS的替身，在内存中保存对象及分段上传；failing_parts中的分段上传失败，corrupt_parts中的分段返回错误的etag"""
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.failing_parts = set()
+        self.corrupt_parts = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def response(status=200, **body):
+        return SimpleNamespace(status=status, body=SimpleNamespace(**body), header=[],
+                               errorCode=None if status < 300 else 'Error',
+                               errorMessage=None if status < 300 else 'status {}'.format(status))
+
+    def initiateMultipartUpload(self, bucket, key, metadata=None):
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self.uploads[upload_id] = {'key': key, 'parts': {}, 'metadata': metadata}
+        return self.response(uploadId=upload_id)
+
+    def listParts(self, bucket, key, upload_id):
+        with self._lock:
+            upload = self.uploads.get(upload_id)
+            if not upload:
+                return self.response(404)
+            parts = [SimpleNamespace(partNumber=number, etag='"{}"'.format(hashlib.md5(data).hexdigest()))
+                     for number, data in upload['parts'].items()]
+        return self.response(parts=parts)
+
+    def abortMultipartUpload(self, bucket, key, upload_id):
+        with self._lock:
+            self.uploads.pop(upload_id, None)
+        return self.response(204)
+
+    def uploadPart(self, bucket, key, part_number, upload_id, object=None, md5=None):
+        if part_number in self.failing_parts:
+            return self.response(500)
+        digest = hashlib.md5(object).digest()
+        if md5 != base64.b64encode(digest).decode('ascii'):
+            return self.response(400)
+        with self._lock:
+            self.uploads[upload_id]['parts'][part_number] = object
+        etag = hashlib.md5(b'corrupt').hexdigest() if part_number in self.corrupt_parts else digest.hex()
+        return self.response(etag='"{}"'.format(etag))
+
+    def completeMultipartUpload(self, bucket, key, upload_id, request):
+        with self._lock:
+            upload = self.uploads.pop(upload_id)
+            self.objects[key] = b''.join(upload['parts'][part.partNum] for part in request.parts)
+        return self.response()
+
+    def getObjectMetadata(self, bucket, key):
+        if key not in self.objects:
+            return self.response(404)
+        return self.response(contentLength=len(self.objects[key]))
+
+
+class FakeObsMixin:
+    """以FakeObsClient替代录像存储桶，分段上传的清单写入临时目录"""
+
+    def setUp(self):
+        super().setUp()
+        self.obs_client = FakeObsClient()
+        self.object_index = obs_index.ObjectIndex(self.obs_client, 'bucket')
+        patcher = mock.patch.object(obs_index, 'get_object_index', return_value=self.object_index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        state_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, state_dir, True)
+        settings_override = override_settings(TRANSFER_STATE_DIR=state_dir, OBS_PART_SIZE=1000)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+@override_settings(DOWNLOAD_WORKERS=1, HTTP_MAX_RETRIES=0)
+class TransferTest(FakeObsMixin, RecordingServerMixin, TransactionTestCase):
+    """录像转存：中断后按清单续传，分段校验失败及大小不一致时放弃"""
+
+    object_key = 'openeuler/sig-stub/oct/1/1.mp4'
+
+    def setUp(self):
+        super().setUp()
+        self.content = os.urandom(4500)
+        self.server, self.url = self.start_server(self.content)
+
+    def test_transfer(self):
+        self.assertEqual(obs_transfer.transfer(self.url, self.object_key, len(self.content)), len(self.content))
+        self.assertEqual(self.obs_client.objects[self.object_key], self.content)
+        self.assertEqual(self.object_index.get_size(self.object_key), len(self.content))
+        self.assertEqual(os.listdir(obs_transfer.settings.TRANSFER_STATE_DIR), [])
+
+    def test_resume_from_manifest(self):
+        self.obs_client.failing_parts = {3}
+        with self.assertRaises(obs_transfer.TransferError):
+            obs_transfer.transfer(self.url, self.object_key, len(self.content))
+        sink = obs_transfer.MultipartSink(self.object_key, len(self.content))
+        with open(sink.manifest_path) as f:
+            done = sorted(int(number) for number in json.load(f)['parts'])
+        self.assertEqual(done[:2], [1, 2])
+        self.assertNotIn(3, done)
+
+        self.obs_client.failing_parts = set()
+        self.server.requests = []
+        obs_transfer.transfer(self.url, self.object_key, len(self.content))
+        # 续传时只下载尚未上传的分段
+        missing = [part for number, part in enumerate(part_ranges(self.content, 1000), 1) if number not in done]
+        self.assertEqual(self.server.requests, ['bytes=0-0'] + missing)
+        self.assertEqual(self.obs_client.objects[self.object_key], self.content)
+        self.assertEqual(self.obs_client.uploads, {})
+        self.assertFalse(os.path.exists(sink.manifest_path))
+
+    def test_checksum_mismatch(self):
+        self.obs_client.corrupt_parts = {2}
+        with self.assertRaisesRegex(obs_transfer.TransferError, 'checksum mismatch of part 2'):
+            obs_transfer.transfer(self.url, self.object_key, len(self.content))
+        self.assertNotIn(self.object_key, self.obs_client.objects)
+        sink = obs_transfer.MultipartSink(self.object_key, len(self.content))
+        with open(sink.manifest_path) as f:
+            parts = json.load(f)['parts']
+        self.assertIn('1', parts)
+        self.assertNotIn('2', parts)
+
+    def test_size_mismatch(self):
+        with self.assertRaisesRegex(obs_transfer.TransferError, 'download url has 4500 bytes'):
+            obs_transfer.transfer(self.url, self.object_key, len(self.content) + 1)
+        self.assertEqual(self.server.requests, ['bytes=0-0'])
+        self.assertEqual(self.obs_client.uploads, {})
+
+    def test_manifest_of_other_size_starts_over(self):
+        self.obs_client.failing_parts = {2}
+        with self.assertRaises(obs_transfer.TransferError):
+            obs_transfer.transfer(self.url, self.object_key, len(self.content))
+        self.obs_client.failing_parts = set()
+        self.server.content = self.content = os.urandom(3500)
+        self.server.requests = []
+        obs_transfer.transfer(self.url, self.object_key, len(self.content))
+        self.assertEqual(self.server.requests, ['bytes=0-0'] + part_ranges(self.content, 1000))
+        self.assertEqual(self.obs_client.objects[self.object_key], self.content)
+        self.assertEqual(self.obs_client.uploads, {})
+
+
+class MemorySink:
+    """在内存中按分段保存下载内容的写入端"""
+
+    def __init__(self, total_size, part_size, parts=None):
+        self.total_size = total_size
+        self.part_size = part_size
+        self.parts = dict(parts or {})
+        self._lock = threading.Lock()
+
+    def part_range(self, part_number):
+        start = (part_number - 1) * self.part_size
+        return start, min(start + self.part_size, self.total_size) - 1
+
+    def missing_parts(self):
+        count = (self.total_size + self.part_size - 1) // self.part_size
+        with self._lock:
+            return [number for number in range(1, count + 1) if number not in self.parts]
+
+    def write_part(self, part_number, data):
+        with self._lock:
+            self.parts[part_number] = data
+
+    def content(self):
+        return b''.join(data for _, data in sorted(self.parts.items()))
+
+
+@override_settings(HTTP_MAX_RETRIES=2)
+class DownloaderTest(RecordingServerMixin, TransactionTestCase):
+    """分段下载：只下载缺失的分段，分段中断后重试"""
+
+    def setUp(self):
+        self.content = os.urandom(4500)
+        self.server, self.url = self.start_server(self.content)
+        self.ranges = part_ranges(self.content, 1000)
+
+    def existing_parts(self, *numbers):
+        return {number: self.content[(number - 1) * 1000:number * 1000] for number in numbers}
+
+    def test_probe(self):
+        self.assertEqual(downloader.probe(self.url), (len(self.content), True))
+        self.server.ranged = False
+        self.assertEqual(downloader.probe(self.url), (len(self.content), False))
+
+    def test_resume_ranged_download(self):
+        sink = MemorySink(len(self.content), 1000, self.existing_parts(1, 3))
+        self.server.truncate = {self.ranges[1]}
+        downloader.download(self.url, sink, total_size=len(self.content), workers=2)
+        self.assertEqual(sink.content(), self.content)
+        # 已写入的分段不再请求，被截断的分段重试一次
+        self.assertEqual(sorted(self.server.requests), sorted([self.ranges[1]] * 2 + self.ranges[3:]))
+
+    def test_resume_stream_download(self):
+        self.server.ranged = False
+        sink = MemorySink(len(self.content), 1000, self.existing_parts(1, 2))
+        downloader.download(self.url, sink, total_size=len(self.content), ranged=False)
+        self.assertEqual(sink.content(), self.content)
+        self.assertEqual(self.server.requests, [None])
+
+    @override_settings(HTTP_MAX_RETRIES=0)
+    def test_interrupted_download_keeps_written_parts(self):
+        sink = MemorySink(len(self.content), 1000)
+        self.server.truncate = {self.ranges[2]}
+        with self.assertRaises(OSError):
+            downloader.download(self.url, sink, total_size=len(self.content), workers=1)
+        self.assertIn(1, sink.parts)
+        self.assertNotIn(3, sink.parts)
+        self.server.requests = []
+        downloader.download(self.url, sink, total_size=len(self.content), workers=1)
+        self.assertEqual(sink.content(), self.content)
+        self.assertIn(self.ranges[2], self.server.requests)
+        self.assertNotIn(self.ranges[0], self.server.requests)
+
+
+@override_settings(DOWNLOAD_WORKERS=1, HTTP_MAX_RETRIES=0)
+class RecordingJobTest(FakeObsMixin, RecordingServerMixin, TransactionTestCase):
+    """录像任务按阶段执行，失败后从失败的阶段续做，已完成的阶段不再重复"""
+
+    def setUp(self):
+        super().setUp()
+        self.content = os.urandom(2500)
+        self.server, self.url = self.start_server(self.content)
+        user = User.objects.create(openid='sponsor')
+        group = Group.objects.create(group_name='sig-stub')
+        self.meeting = Meeting.objects.create(mid='123456789', topic='stub', group_name='sig-stub', sponsor='sponsor',
+                                              date='2026-10-18', start='10:00', end='11:00', user=user, group=group,
+                                              mplatform='stub')
+        Video.objects.create(mid=self.meeting.mid, topic='stub', group_name='sig-stub')
+        self.listed = 0
+        self.cover_status = [500, 200]
+        for patcher in (mock.patch.dict(handle_recordings.LISTERS, {'stub': self.list_files}),
+                        mock.patch.object(obs_index, 'get_obs_client', return_value=self.obs_client),
+                        mock.patch.object(handle_recordings, 'generate_cover'),
+                        mock.patch.object(handle_recordings, 'upload_cover', side_effect=self.upload_cover),
+                        mock.patch.object(handle_recordings, 'get_participants', return_value=[])):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def list_files(self, meeting, video):
+        self.listed += 1
+        return [handle_recordings.build_file(meeting, video, meeting.mid + '.mp4', len(self.content),
+                                             '2026-10-18T02:00:00Z', '2026-10-18T03:00:00Z',
+                                             ('2026-10-18', '10:00', '11:00'), lambda: (self.url, {}))]
+
+    def upload_cover(self, filename, obs_client, bucketName, cover_path):
+        return {'status': self.cover_status.pop(0)}
+
+    def get_job(self):
+        return RecordingJob.objects.select_related('meeting').get(meeting=self.meeting)
+
+    def test_resume_from_failed_stage(self):
+        recording_jobs.ensure_jobs([self.meeting])
+        handle_recordings.run(self.get_job())
+        job = self.get_job()
+        self.assertEqual((job.stage, job.status, job.attempts), (recording_jobs.COVER, recording_jobs.FAILED, 1))
+        self.assertEqual(job.total_size, len(self.content))
+        self.assertEqual(job.bytes_transferred, len(self.content))
+        self.assertIn('fail to upload cover', job.last_error)
+
+        self.server.requests = []
+        self.assertEqual([job.meeting_id for job in recording_jobs.runnable_jobs([])], [self.meeting.id])
+        handle_recordings.run(self.get_job())
+        job = self.get_job()
+        self.assertEqual((job.stage, job.status, job.attempts), (recording_jobs.DONE, recording_jobs.PENDING, 0))
+        # 续做时不再查询及转存录像
+        self.assertEqual(self.listed, 1)
+        self.assertEqual(self.server.requests, [])
+        object_key = json.loads(job.files)[0]['object_key']
+        self.assertEqual(self.obs_client.objects[object_key], self.content)
+        self.assertEqual(Video.objects.get(mid=self.meeting.mid).total_size, len(self.content))
+        self.assertTrue(Record.objects.filter(mid=self.meeting.mid, platform='obs').exists())
+        self.assertEqual(recording_jobs.runnable_jobs([self.meeting]), [])
+
+    def test_transfer_skips_uploaded_object(self):
+        recording_jobs.ensure_jobs([self.meeting])
+        job = self.get_job()
+        recording_jobs.save(job, stage=recording_jobs.TRANSFER, files=json.dumps([
+            {key: value for key, value in file.items() if key != 'resolve'}
+            for file in self.list_files(self.meeting, Video.objects.get(mid=self.meeting.mid))]))
+        object_key = json.loads(job.files)[0]['object_key']
+        self.obs_client.objects[object_key] = self.content
+        self.cover_status = [200]
+        handle_recordings.run(self.get_job())
+        self.assertEqual(self.get_job().stage, recording_jobs.DONE)
+        self.assertEqual(self.server.requests, [])
+
+
+class RecordingSchedulerTest(SimpleTestCase):
+    """录像任务按大小派发，同一平台同时执行的任务数不超过平台上限"""
+
+    def make_jobs(self, platforms):
+        return [SimpleNamespace(id=index, total_size=index, meeting=SimpleNamespace(mid=str(index), mplatform=platform))
+                for index, platform in enumerate(platforms, 1)]
+
+    def run_jobs(self, jobs, workers):
+        lock = threading.Lock()
+        active = {}
+        peaks = {}
+        order = []
+
+        def func(job):
+            platform = job.meeting.mplatform
+            with lock:
+                order.append(job.id)
+                active[platform] = active.get(platform, 0) + 1
+                peaks[platform] = max(peaks.get(platform, 0), active[platform])
+                peaks['all'] = max(peaks.get('all', 0), sum(active.values()))
+            time.sleep(0.02)
+            with lock:
+                active[platform] -= 1
+
+        recording_scheduler.run(jobs, func, workers)
+        return order, peaks
+
+    @override_settings(RECORDING_PLATFORM_LIMITS={'zoom': 2, 'welink': 1})
+    def test_platform_limits(self):
+        jobs = self.make_jobs(['zoom'] * 6 + ['welink'] * 4 + ['tencent'] * 2)
+        order, peaks = self.run_jobs(jobs, workers=4)
+        self.assertEqual(sorted(order), [job.id for job in jobs])
+        self.assertEqual(peaks['zoom'], 2)
+        self.assertEqual(peaks['welink'], 1)
+        # 未配置的平台按1个处理
+        self.assertEqual(peaks['tencent'], 1)
+        self.assertLessEqual(peaks['all'], 4)
+
+    @override_settings(RECORDING_PLATFORM_LIMITS={'zoom': 0})
+    def test_zero_limit_still_runs(self):
+        jobs = self.make_jobs(['zoom'] * 3)
+        order, peaks = self.run_jobs(jobs, workers=2)
+        self.assertEqual(sorted(order), [1, 2, 3])
+        self.assertEqual(peaks['zoom'], 1)
+
+    @override_settings(RECORDING_PLATFORM_LIMITS={'zoom': 1})
+    def test_largest_first(self):
+        jobs = self.make_jobs(['zoom'] * 4)
+        jobs[0].total_size = None
+        order, _ = self.run_jobs(jobs, workers=1)
+        self.assertEqual(order, [4, 3, 2, 1])
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """最小的SMTP服务，server.replies中按命令预置的响应依次返回，用完后返回成功"""
+
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode('ascii'))
+
+    def next_reply(self, command, default):
+        replies = self.server.replies.get(command)
+        return replies.pop(0) if replies else default
+
+    def handle(self):
+        self.reply('220 localhost ESMTP')
+        for line in self.rfile:
+            command = line.decode('ascii').strip().split(' ')[0].upper()
+            self.server.commands.append(command)
+            if command in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif command in ('MAIL', 'RCPT'):
+                self.reply(self.next_reply(command, '250 OK'))
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for data_line in self.rfile:
+                    if data_line in (b'.\r\n', b'.\n'):
+                        break
+                    data.append(data_line)
+                reply = self.next_reply(command, '250 OK')
+                if reply.startswith('250'):
+                    self.server.messages.append(b''.join(data).decode('utf-8'))
+                self.reply(reply)
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+@override_settings(SMTP_SERVER_HOST='127.0.0.1', SMTP_USE_TLS=False, SMTP_SERVER_USER='',
+                   GMAIL_USERNAME='noreply@example.com', MAIL_RETRY_BACKOFF=0, MAIL_MAX_ATTEMPTS=3)
+class SendOutboxTest(TestCase):
+    """send_outbox在本地SMTP服务上发送发件箱中的邮件，4xx响应后重试"""
+
+    def setUp(self):
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPHandler)
+        server.daemon_threads = True
+        server.replies = {}
+        server.commands = []
+        server.messages = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+        settings_override = override_settings(SMTP_SERVER_PORT=server.server_address[1])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def enqueue(self, subject):
+        msg = MIMEText('body of {}'.format(subject), 'plain', 'utf-8')
+        msg['Subject'] = subject
+        return mailer.enqueue(msg, ['a@example.com', 'b@example.com'])
+
+    def drain(self):
+        call_command('send_outbox', once=True)
+
+    def test_send(self):
+        mails = [self.enqueue('first'), self.enqueue('second')]
+        self.drain()
+        self.assertEqual(set(MailOutbox.objects.values_list('status', flat=True)), {mailer.SENT})
+        self.assertEqual(len(self.server.messages), len(mails))
+        # 同一批邮件复用一个连接
+        self.assertEqual(self.server.commands.count('EHLO'), 1)
+
+    def test_retry_after_transient_data_reply(self):
+        mail = self.enqueue('retry')
+        self.server.replies['DATA'] = ['451 Requested action aborted: try again later']
+        self.drain()
+        mail = MailOutbox.objects.get(id=mail.id)
+        self.assertEqual((mail.status, mail.attempts), (mailer.SENT, 2))
+        self.assertIn('451', mail.last_error)
+        self.assertEqual(len(self.server.messages), 1)
+        self.assertEqual(self.server.commands.count('DATA'), 2)
+
+    def test_retry_after_transient_recipient_reply(self):
+        mail = self.enqueue('retry')
+        self.server.replies['RCPT'] = ['450 Mailbox busy', '450 Mailbox busy']
+        self.drain()
+        mail = MailOutbox.objects.get(id=mail.id)
+        self.assertEqual((mail.status, mail.attempts), (mailer.SENT, 2))
+        self.assertEqual(len(self.server.messages), 1)
+
+    def test_permanent_reply_fails(self):
+        mail = self.enqueue('rejected')
+        self.server.replies['DATA'] = ['554 Transaction failed']
+        self.drain()
+        mail = MailOutbox.objects.get(id=mail.id)
+        self.assertEqual((mail.status, mail.attempts), (mailer.FAILED, 1))
+        self.assertEqual(self.server.messages, [])
+
+    def test_gives_up_after_max_attempts(self):
+        mail = self.enqueue('busy')
+        self.server.replies['DATA'] = ['421 Service not available'] * 3
+        self.drain()
+        mail = MailOutbox.objects.get(id=mail.id)
+        self.assertEqual((mail.status, mail.attempts), (mailer.FAILED, 3))
+
+
+class UnavailableHandler(BaseHTTPRequestHandler):
+    """每个请求延迟后返回503"""
+
+    def do_GET(self):
+        self.server.count += 1
+        time.sleep(self.server.delay)
+        self.send_response(503)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class HttpClientTest(SimpleTestCase):
+    """请求重试不超过单次调用的时长上限，延迟统计批量写入缓存"""
+
+    def setUp(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), UnavailableHandler)
+        server.count = 0
+        server.delay = 0.2
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+        self.url = 'http://127.0.0.1:{}/unavailable'.format(server.server_address[1])
+        http_client.flush_latency()
+        cache.clear()
+
+    @override_settings(HTTP_MAX_RETRIES=10, HTTP_RETRY_BACKOFF=0.1, HTTP_RETRY_MAX_BACKOFF=0.1)
+    def test_retries_stop_at_deadline(self):
+        self.server.delay = 0.05
+        t1 = time.time()
+        response = http_client.get(self.url, deadline=0.5)
+        self.assertEqual(response.status_code, 503)
+        # 不设上限时11次尝试约需1.5s
+        self.assertLess(time.time() - t1, 0.7)
+        self.assertLess(self.server.count, 11)
+
+    @override_settings(HTTP_MAX_RETRIES=0)
+    def test_timeout_capped_by_deadline(self):
+        self.server.delay = 2
+        t1 = time.time()
+        with self.assertRaises(http_client.requests.Timeout):
+            http_client.get(self.url, deadline=0.3)
+        self.assertLess(time.time() - t1, 1)
+
+    @override_settings(HTTP_STATS_FLUSH_INTERVAL=3600)
+    def test_latency_flushed_in_batches(self):
+        for _ in range(5):
+            http_client.record_latency('GET example.com/a', 0.01)
+        http_client.record_latency('GET example.com/b', 30)
+        self.assertEqual(http_client.get_stats(), {})
+        http_client.flush_latency()
+        stats = http_client.get_stats()
+        self.assertEqual(stats['GET example.com/a']['<=0.05s'], 5)
+        self.assertEqual(stats['GET example.com/b']['>10s'], 1)
+        http_client.record_latency('GET example.com/a', 0.01)
+        http_client.flush_latency()
+        self.assertEqual(http_client.get_stats()['GET example.com/a']['<=0.05s'], 6)
+
+
+class UnknownPlatformTest(TestCase):
+    """平台为空或未注册的会议：删除时仍软删除，查询参会者时返回400"""
+
+    def setUp(self):
+        self.user = User.objects.create(openid='maintainer', level=2)
+        group = Group.objects.create(group_name='sig-stub')
+        self.meetings = [Meeting.objects.create(mid=mid, topic='stub', group_name='sig-stub', sponsor='sponsor',
+                                                date='2026-10-18', start='10:00', end='11:00', emaillist='',
+                                                user=self.user, group=group, mplatform=platform)
+                         for mid, platform in (('1001', None), ('1002', 'retired'))]
+
+    def test_delete(self):
+        for meeting in self.meetings:
+            request = APIRequestFactory().delete('/meeting/{}/'.format(meeting.mid))
+            force_authenticate(request, user=self.user)
+            response = MeetingDelView.as_view()(request, mid=meeting.mid)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(Meeting.objects.get(id=meeting.id).is_delete, 1)
+
+    def test_participants(self):
+        with mock.patch.dict(settings.DEFAULT_CONF, {'QUERY_TOKEN': 'query'}):
+            for meeting in self.meetings:
+                request = APIRequestFactory().get('/participants/{}/'.format(meeting.mid), {'token': 'query'})
+                response = ParticipantsView.as_view()(request, mid=meeting.mid)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(json.loads(response.content)['msg'], 'Unsupported platform')
+
+
+@override_settings(MEETING_HOSTS={'stub': STUB_HOSTS})
+class MeetingsViewTest(TestCase):
+    """创建会议接口：失败时保持原有的返回字段，异步创建时提交即检查host"""
+
+    def setUp(self):
+        drivers.register('stub')(StubDriver)
+        self.addCleanup(drivers._drivers.pop, 'stub', None)
+        self.user = User.objects.create(openid='maintainer', level=2)
+        self.group = Group.objects.create(group_name='sig-stub')
+        self.date = (datetime.date.today() + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+
+    def post(self, **extra):
+        data = {'platform': 'stub', 'date': self.date, 'start': '10:00', 'end': '11:00', 'topic': 'stub',
+                'sponsor': 'sponsor', 'group_name': self.group.group_name, 'group_id': self.group.id, 'etherpad': ''}
+        data.update(extra)
+        request = APIRequestFactory().post('/meetings/', data, format='json')
+        force_authenticate(request, user=self.user)
+        return json.loads(MeetingsView.as_view()(request).content)
+
+    def book(self, host_id):
+        Meeting.objects.create(mid=host_id, topic='booked', group_name='sig-stub', sponsor='sponsor', date=self.date,
+                               start='10:00', end='11:00', host_id=host_id, user=self.user, group=self.group,
+                               mplatform='stub')
+
+    def test_bad_request_keeps_msg_key(self):
+        with mock.patch.object(StubDriver, 'create', return_value=(500, {})):
+            resp = self.post()
+        self.assertEqual(resp['code'], 400)
+        self.assertEqual(resp['msg'], 'Bad Request')
+        self.assertNotIn('message', resp)
+
+    def test_no_free_host(self):
+        for host_id in STUB_HOSTS:
+            self.book(host_id)
+        resp = self.post()
+        self.assertEqual((resp['code'], resp['message']), (1000, provision.NO_HOST_MESSAGE))
+
+    def test_async_checks_free_host(self):
+        for host_id in STUB_HOSTS:
+            self.book(host_id)
+        resp = self.post(**{'async': True})
+        self.assertEqual((resp['code'], resp['message']), (1000, provision.NO_HOST_MESSAGE))
+        self.assertFalse(MeetingJob.objects.exists())
+
+    def test_async_submitted(self):
+        self.book('stub-host-1')
+        resp = self.post(**{'async': True})
+        self.assertEqual(resp['code'], 202)
+        self.assertTrue(MeetingJob.objects.filter(id=resp['job_id']).exists())
+
+
+@override_settings(STATS_FLUSH_INTERVAL=3600)
+class ResponseCacheTest(TestCase):
+    """响应缓存：命中时仅读取版本号，写操作递增版本号后重新查询"""
+
+    def setUp(self):
+        cache.clear()
+        response_cache.responses.clear()
+        self.user = User.objects.create(openid='sponsor')
+        self.group = Group.objects.create(group_name='sig-stub')
+        self.create_meeting('1001')
+
+    def create_meeting(self, mid):
+        Meeting.objects.create(mid=mid, topic='stub', group_name='sig-stub', sponsor='sponsor',
+                               date=datetime.date.today().strftime('%Y-%m-%d'), start='10:00', end='11:00',
+                               emaillist='', user=self.user, group=self.group, mplatform='zoom')
+
+    def get(self):
+        response = MeetingsDataView.as_view()(APIRequestFactory().get('/meetingsdata/'))
+        self.assertEqual(response.status_code, 200)
+        return json.dumps(response.data, default=str)
+
+    def test_queries_per_hit(self):
+        self.get()
+        with self.assertNumQueries(1):
+            self.get()
+
+    def test_bump_version_invalidates(self):
+        first = self.get()
+        self.create_meeting('1002')
+        self.assertEqual(self.get(), first)
+        response_cache.bump_version(response_cache.MEETINGS)
+        second = self.get()
+        self.assertNotEqual(second, first)
+        self.assertIn('1002', second)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                       RESPONSE_CACHE_LOCAL_TIMEOUT=1)
+    def test_local_backend_expires(self):
+        first = self.get()
+        self.create_meeting('1002')
+        self.assertEqual(self.get(), first)
+        time.sleep(1.1)
+        self.assertIn('1002', self.get())
+
+
+@override_settings(STATS_FLUSH_INTERVAL=3600)
+class TokenCacheTest(TestCase):
+    """令牌缓存：进程内命中不访问共享缓存，多线程及多个实例同时未命中时只拉取一次"""
+
+    def setUp(self):
+        cache.clear()
+        self.fetched = []
+
+    def fetch(self, key):
+        self.fetched.append(key)
+        time.sleep(0.3)
+        return 'token-{}'.format(len(self.fetched)), 3600
+
+    def test_warm_hit_without_queries(self):
+        tokens = token_cache.TokenCache('stub', self.fetch)
+        self.assertEqual(tokens.get(), 'token-1')
+        with self.assertNumQueries(0):
+            self.assertEqual(tokens.get(), 'token-1')
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_single_flight(self):
+        # 同名的两个实例共享缓存，模拟两个进程
+        instances = [token_cache.TokenCache('stub', self.fetch) for _ in range(2)]
+        results = []
+        threads = [threading.Thread(target=lambda tokens=tokens: results.append(tokens.get()))
+                   for tokens in instances * 4]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.fetched, [''])
+        self.assertEqual(results, ['token-1'] * 8)
+
+
+class NotifyTest(SimpleTestCase):
+    """线程池发送订阅消息前后关闭失效的数据库连接"""
+
+    def test_close_old_connections(self):
+        response = mock.Mock(status_code=200, json=mock.Mock(return_value={'errcode': 0}))
+        with mock.patch.object(notify, 'close_old_connections') as close, \
+                mock.patch.object(notify.wx_apis, 'send_subscription', return_value=response):
+            self.assertEqual(notify.dispatch([('a', {}), ('b', {})], wait=True), [True, True])
+        self.assertEqual(close.call_count, 4)
+
+
+class ProvisionMeetingsCommandTest(TestCase):
+    """异步创建任务：排队超时及开始时间已过的任务不再创建，领取任务时的数据库错误不会使worker退出"""
+
+    def setUp(self):
+        self.user = User.objects.create(openid='maintainer', level=2)
+
+    def submit(self, date, start='10:00'):
+        params = {'platform': 'stub', 'date': date, 'start': start, 'end': '23:59'}
+        return MeetingJob.objects.create(user=self.user, params=json.dumps(params))
+
+    def test_expire_pending(self):
+        job = self.submit('2099-01-01')
+        MeetingJob.objects.filter(id=job.id).update(
+            create_time=datetime.datetime.now() - provision_meetings.PENDING_TIMEOUT - datetime.timedelta(minutes=1))
+        with mock.patch.object(provision, 'provision_meeting') as provision_meeting:
+            call_command('provision_meetings', once=True)
+        provision_meeting.assert_not_called()
+        self.assertEqual(MeetingJob.objects.get(id=job.id).status, provision.FAILED)
+
+    def test_start_time_passed(self):
+        job = self.submit((datetime.date.today() - datetime.timedelta(days=1)).strftime('%Y-%m-%d'))
+        with mock.patch.object(provision, 'provision_meeting') as provision_meeting:
+            call_command('provision_meetings', once=True)
+        provision_meeting.assert_not_called()
+        job = MeetingJob.objects.get(id=job.id)
+        self.assertEqual((job.status, job.code), (provision.FAILED, 1005))
+
+    def test_survive_operational_error(self):
+        with mock.patch.object(provision_meetings, 'claim_job', side_effect=[OperationalError('gone away'), None]) \
+                as claim_job, mock.patch.object(provision_meetings, 'close_old_connections') as close:
+            call_command('provision_meetings', once=True, interval=0)
+        self.assertEqual(claim_job.call_count, 2)
+        close.assert_called_once_with()
+
+
+class CoverStageTest(SimpleTestCase):
+    """并发执行的录像任务在各自的临时目录中生成封面"""
+
+    def render(self, command):
+        html_path, image_path = command.split()[-2:]
+        time.sleep(0.1)
+        # 替代wkhtmltoimage，背景图缺失时不生成封面
+        if os.path.exists(os.path.join(os.path.dirname(html_path), 'cover.png')):
+            with open(image_path, 'wb') as f:
+                f.write(b'png')
+        return 0
+
+    def upload_cover(self, filename, obs_client, bucketName, cover_path):
+        self.workdirs.append(os.path.dirname(filename))
+        return {'status': 200 if os.path.exists(filename.replace('.mp4', '.png')) else 500}
+
+    def cover_stage(self, errors):
+        meeting = SimpleNamespace(mid='123456789')
+        video = SimpleNamespace(topic='stub', group_name='sig-stub')
+        try:
+            handle_recordings.cover_stage(None, meeting, video, {})
+        except Exception as e:
+            errors.append(e)
+
+    def test_concurrent_jobs(self):
+        self.workdirs = []
+        errors = []
+        file = {'name': '123456789.mp4', 'object_key': 'openeuler/sig-stub/oct/123456789/123456789.mp4',
+                'cover_date': '2026-10-18', 'cover_start': '10:00', 'cover_end': '11:00'}
+        with mock.patch.object(obs_index, 'get_obs_client', return_value=object()), \
+                mock.patch.object(recording_jobs, 'load_files', return_value=[file]), \
+                mock.patch.object(handle_recordings.os, 'system', side_effect=self.render), \
+                mock.patch.object(handle_recordings, 'upload_cover', side_effect=self.upload_cover):
+            threads = [threading.Thread(target=self.cover_stage, args=(errors,)) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(set(self.workdirs)), 3)
+        self.assertFalse(any(os.path.exists(workdir) for workdir in self.workdirs))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class WelinkTokenTest(SimpleTestCase):
+    """WeLink拒绝代理鉴权token时清除缓存并以新token重试一次"""
+
+    def setUp(self):
+        cache.clear()
+        welink_apis.token_cache._local.clear()
+
+    def test_retry_with_new_token(self):
+        responses = [mock.Mock(status_code=401), mock.Mock(status_code=200)]
+        fetch = mock.Mock(side_effect=[('revoked', 3600), ('renewed', 3600)])
+        with mock.patch.object(welink_apis.token_cache, 'fetch', fetch), \
+                mock.patch.object(welink_apis.http_client, 'request', side_effect=responses) as request:
+            self.assertEqual(welink_apis.cancelMeeting('1001', 'host-1'), 200)
+        self.assertEqual([call[1]['headers']['X-Access-Token'] for call in request.call_args_list],
+                         ['revoked', 'renewed'])
+        self.assertEqual(welink_apis.createProxyToken('host-1'), 'renewed')
+
+
+class HostSchedulerTest(TestCase):
+    """host在所有时段(含前后缓冲)均空闲时才可分配，会议不支持跨天"""
+
+    def setUp(self):
+        self.user = User.objects.create(openid='sponsor')
+        self.group = Group.objects.create(group_name='sig-stub')
+        self.dates = [(datetime.date.today() + datetime.timedelta(days=days)).strftime('%Y-%m-%d') for days in (1, 8)]
+
+    def book(self, host_id, date, start, end):
+        Meeting.objects.create(mid=uuid.uuid4().hex[:20], topic='booked', group_name='sig-stub', sponsor='sponsor',
+                               date=date, start=start, end=end, host_id=host_id, user=self.user, group=self.group,
+                               mplatform='stub')
+
+    def test_reject_cross_day(self):
+        with self.assertRaises(ValueError):
+            host_scheduler.to_interval(self.dates[0], '23:00', '01:00')
+
+    def test_multiple_slots(self):
+        self.book('stub-host-1', self.dates[1], '10:00', '11:00')
+        self.book('stub-host-2', self.dates[0], '11:20', '12:00')
+        slots = [host_scheduler.to_interval(date, '10:00', '11:00') for date in self.dates]
+        self.assertEqual(host_scheduler.find_free_hosts('stub', sorted(STUB_HOSTS), slots[:1]), ['stub-host-1'])
+        self.assertEqual(host_scheduler.find_free_hosts('stub', sorted(STUB_HOSTS), slots[1:]), ['stub-host-2'])
+        self.assertEqual(host_scheduler.find_free_hosts('stub', sorted(STUB_HOSTS), slots), [])
@@ -8,7 +8,7 @@ from meetings.views import LoginView, GroupView, GroupsView, MeetingView, Meetin
     ActivityUpdateView, ActivityDraftView, ActivitiesDraftView, SponsorActivityDraftView, DraftUpdateView, \
     DraftPublishView, SponsorActivitiesPublishingView, ActivityCollectView, ActivityCollectDelView, \
     MyActivityCollectionsView, FeedbackView, CountActivitiesView, MyCountsView, MeetingsRecentlyView, \
-    ActivitiesDataView, AgreePrivacyPolicyView, AuthView
+    ActivitiesDataView, AgreePrivacyPolicyView, AuthView, ActivityRegistrantsView, MeetingJobView
 
 urlpatterns = [
     path('login/', LoginView.as_view()),  # 登陆
@@ -16,6 +16,7 @@ urlpatterns = [
     path('sigs/', SigsView.as_view()),  # 查询所有SIG组的名称、首页、邮件列表、IRC频道及成员的nickname、gitee_name、avatar
     path('groups/<int:pk>/', GroupView.as_view()),  # 查询单个SIG组详情
     path('meetings/', MeetingsView.as_view()),  # 新建会议
+    path('meetingjob/<int:pk>/', MeetingJobView.as_view()),  # 查询异步创建会议任务的状态
     path('meetings_weekly/', MeetingsWeeklyView.as_view()),  # 查询前后一周会议详情
     path('meetings_daily/', MeetingsDailyView.as_view()),   # 查询当日会议详情
     path('meetings_recently/', MeetingsRecentlyView.as_view()),  # 查询近期的会议
@@ -61,6 +62,7 @@ urlpatterns = [
     path('collectactivity/', ActivityCollectView().as_view()),  # 收藏活动
     path('collectactivitydel/<int:pk>/', ActivityCollectDelView.as_view()),  # 取消收藏活动
     path('collectactivities/', MyActivityCollectionsView.as_view()),  # 我收藏的活动列表
+    path('activityregistrants/<int:pk>/', ActivityRegistrantsView.as_view()),  # 活动报名者列表及导出
     path('feedback/', FeedbackView.as_view()),  # 意见反馈
     path('countactivities/', CountActivitiesView.as_view()),  # 各类活动计数
     path('mycounts/', MyCountsView.as_view()),  # 我的各类计数
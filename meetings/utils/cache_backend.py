@@ -0,0 +1,12 @@
+from django.conf import settings
+
+# 仅在当前进程内有效的缓存后端，uwsgi的各worker及管理命令之间无法共享其中的数据
+LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def is_shared(alias='default'):
+    """缓存后端是否可在多个进程间共享"""
+    return settings.CACHES[alias]['BACKEND'] not in LOCAL_BACKENDS
@@ -0,0 +1,107 @@
+import itertools
+import json
+import threading
+from meetings.models import Record
+
+MEETING_FIELDS = ('id', 'group_name', 'date', 'start', 'end', 'topic', 'sponsor', 'agenda', 'join_url', 'mid',
+                  'etherpad', 'mplatform')
+ACTIVITY_FIELDS = ('id', 'title', 'date', 'activity_type', 'address', 'detail_address', 'longitude', 'latitude',
+                   'synopsis', 'sign_url', 'replay_url', 'register_url', 'poster', 'wx_code', 'schedules',
+                   'update_time')
+SCHEDULES_CACHE_SIZE = 2048
+
+_schedules_cache = {}
+_schedules_lock = threading.Lock()
+
+
+def group_by_date(rows, build_item, date_key='date'):
+    """
+    按日期聚合日历数据，rows需已按日期排序，单次遍历完成分组
+    :param rows: 已按date_key排序的行(dict)
+    :param build_item: 将单行转换为timeData元素的函数
+    :param date_key: 日期字段名
+    :return: [(date, [item, ...]), ...]
+    """
+    return [(date, [build_item(row) for row in group])
+            for date, group in itertools.groupby(rows, key=lambda row: row[date_key])]
+
+
+def get_video_urls(mids):
+    """查询指定会议的B站播放地址"""
+    records = Record.objects.filter(mid__in=set(mids), platform='bilibili').exclude(url__isnull=True).\
+        exclude(url='').order_by('id').values_list('mid', 'url')
+    return {mid: url for mid, url in records}
+
+
+def build_meetings_table(queryset):
+    """
+    生成网页会议日历数据
+    :param queryset: 会议的queryset，在窗口内按日期、开始时间排序
+    :return: tableData
+    """
+    meetings = list(queryset.order_by('date', 'start').values(*MEETING_FIELDS))
+    record_dict = get_video_urls([meeting['mid'] for meeting in meetings])
+
+    def build_item(meeting):
+        return {
+            'id': meeting['id'],
+            'group_name': meeting['group_name'],
+            'startTime': meeting['start'],
+            'endTime': meeting['end'],
+            'duration_time': meeting['start'] + '-' + meeting['end'],
+            'name': meeting['topic'],
+            'creator': meeting['sponsor'],
+            'detail': meeting['agenda'],
+            'join_url': meeting['join_url'],
+            'meeting_id': meeting['mid'],
+            'etherpad': meeting['etherpad'],
+            'platform': meeting['mplatform'],
+            'video_url': record_dict.get(meeting['mid'], '')
+        }
+
+    return [{'date': date, 'timeData': time_data} for date, time_data in group_by_date(meetings, build_item)]
+
+
+def parse_schedules(activity_id, update_time, schedules):
+    """解析活动日程，按活动id及修改时间缓存解析结果"""
+    key = (activity_id, update_time)
+    with _schedules_lock:
+        if key in _schedules_cache:
+            return _schedules_cache[key]
+    parsed = json.loads(schedules) if schedules else None
+    with _schedules_lock:
+        if len(_schedules_cache) >= SCHEDULES_CACHE_SIZE:
+            _schedules_cache.clear()
+        _schedules_cache[key] = parsed
+    return parsed
+
+
+def build_activities_table(queryset):
+    """
+    生成活动日历数据
+    :param queryset: 活动的queryset
+    :return: tableData
+    """
+    activities = queryset.order_by('date', 'id').values(*ACTIVITY_FIELDS)
+
+    def build_item(activity):
+        return {
+            'id': activity['id'],
+            'title': activity['title'],
+            'start_date': activity['date'],
+            'end_date': activity['date'],
+            'activity_type': activity['activity_type'],
+            'address': activity['address'],
+            'detail_address': activity['detail_address'],
+            'longitude': activity['longitude'],
+            'latitude': activity['latitude'],
+            'synopsis': activity['synopsis'],
+            'sign_url': activity['sign_url'],
+            'replay_url': activity['replay_url'],
+            'register_url': activity['register_url'],
+            'poster': activity['poster'],
+            'wx_code': activity['wx_code'],
+            'schedules': parse_schedules(activity['id'], activity['update_time'], activity['schedules'])
+        }
+
+    return [{'start_date': date, 'timeData': time_data} for date, time_data in group_by_date(activities, build_item)]
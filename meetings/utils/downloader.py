@@ -0,0 +1,230 @@
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from django.conf import settings
+from meetings.utils import http_client
+
+logger = logging.getLogger('log')
+
+CHUNK_SIZE = 1024 * 1024
+CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+
+class DownloadError(Exception):
+    """下载失败，已写入的分段由写入端保留，下次下载时跳过"""
+
+
+class TokenBucket:
+    """令牌桶限速，进程内所有下载共享，rate为0时不限速"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, size):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                # 单次读取超过桶容量时允许透支，由后续读取等待补足
+                if self.tokens >= min(size, self.capacity):
+                    self.tokens -= size
+                    return
+                delay = (min(size, self.capacity) - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+class ByteBudget:
+    """限制进程内所有下载在内存中缓存的分段总字节数"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, size):
+        with self._cond:
+            # 单个分段超过预算时仅在没有其他分段占用时执行，避免永久等待
+            self._cond.wait_for(lambda: self.used == 0 or self.used + size <= self.limit)
+            self.used += size
+
+    def release(self, size):
+        with self._cond:
+            self.used -= size
+            self._cond.notify_all()
+
+
+bandwidth = TokenBucket(settings.DOWNLOAD_BANDWIDTH)
+buffer_budget = ByteBudget(settings.DOWNLOAD_BUFFER_BUDGET)
+
+
+class Progress:
+    """统计下载的字节数，按间隔输出吞吐量"""
+
+    def __init__(self, name, total_size):
+        self.name = name
+        self.total_size = total_size
+        self.received = 0
+        self.start_time = time.time()
+        self._last_report = self.start_time
+        self._lock = threading.Lock()
+
+    def add(self, size):
+        with self._lock:
+            self.received += size
+            now = time.time()
+            if now - self._last_report < settings.DOWNLOAD_PROGRESS_INTERVAL:
+                return
+            self._last_report = now
+            received = self.received
+        logger.info('{}: {}/{} bytes received, {:.2f} MB/s'.format(self.name, received, self.total_size,
+                                                                   self.rate(now)))
+
+    def rate(self, now=None):
+        """平均吞吐量(MB/s)"""
+        cost = max((now or time.time()) - self.start_time, 1e-6)
+        return self.received / cost / 1024 / 1024
+
+    def finish(self):
+        cost = time.time() - self.start_time
+        logger.info('{}: {} bytes received in {:.1f}s, {:.2f} MB/s'.format(self.name, self.received, cost,
+                                                                          self.rate()))
+
+
+def probe(url, headers=None):
+    """
+    请求首字节获取文件大小，兼容不支持HEAD的下载地址
+    :return: (文件大小, 是否支持Range请求)
+    """
+    headers = dict(headers or {}, Range='bytes=0-0')
+    r = http_client.get(url, headers=headers, stream=True)
+    try:
+        if r.status_code == 206:
+            match = CONTENT_RANGE.match(r.headers.get('Content-Range', ''))
+            if match and match.group(3) != '*':
+                return int(match.group(3)), True
+        elif r.status_code == 200 and r.headers.get('Content-Length'):
+            return int(r.headers['Content-Length']), False
+        raise DownloadError('fail to get size of {}: {}'.format(http_client.normalize_endpoint('GET', url),
+                                                                r.status_code))
+    finally:
+        r.close()
+
+
+def _fetch_part(url, headers, sink, part_number, progress):
+    """以一个Range请求读取一个分段并写入，分段在写入前占用内存预算"""
+    start, end = sink.part_range(part_number)
+    buffer_budget.acquire(end - start + 1)
+    try:
+        _read_part(url, headers, sink, part_number, progress)
+    finally:
+        buffer_budget.release(end - start + 1)
+
+
+def _read_part(url, headers, sink, part_number, progress):
+    start, end = sink.part_range(part_number)
+    r = http_client.get(url, headers=dict(headers, Range='bytes={}-{}'.format(start, end)), stream=True)
+    try:
+        if r.status_code != 206:
+            raise DownloadError('part {} returned {}'.format(part_number, r.status_code))
+        match = CONTENT_RANGE.match(r.headers.get('Content-Range', ''))
+        if not match or int(match.group(1)) != start:
+            raise DownloadError('unexpected Content-Range: {}'.format(r.headers.get('Content-Range')))
+        data = bytearray()
+        for chunk in r.iter_content(CHUNK_SIZE):
+            bandwidth.consume(len(chunk))
+            data.extend(chunk)
+            progress.add(len(chunk))
+        if len(data) != end - start + 1:
+            raise DownloadError('part {} has {} bytes, expected {}'.format(part_number, len(data), end - start + 1))
+    finally:
+        r.close()
+    sink.write_part(part_number, bytes(data))
+
+
+def _stream(url, headers, sink, progress):
+    """下载地址不支持Range时单连接从头读取，跳过已写入的分段"""
+    part_size = sink.part_range(1)[1] + 1
+    buffer_budget.acquire(part_size)
+    try:
+        _read_stream(url, headers, sink, progress)
+    finally:
+        buffer_budget.release(part_size)
+
+
+def _read_stream(url, headers, sink, progress):
+    missing = set(sink.missing_parts())
+    r = http_client.get(url, headers=headers, stream=True)
+    try:
+        if r.status_code != 200:
+            raise DownloadError('download returned {}'.format(r.status_code))
+        number = 1
+        buffer = bytearray()
+        for chunk in r.iter_content(CHUNK_SIZE):
+            bandwidth.consume(len(chunk))
+            buffer.extend(chunk)
+            progress.add(len(chunk))
+            while missing:
+                start, end = sink.part_range(number)
+                if len(buffer) < end - start + 1:
+                    break
+                if number in missing:
+                    sink.write_part(number, bytes(buffer[:end - start + 1]))
+                    missing.discard(number)
+                del buffer[:end - start + 1]
+                number += 1
+            if not missing:
+                break
+        if missing:
+            raise DownloadError('stream ended before part {}'.format(min(missing)))
+    finally:
+        r.close()
+
+
+def download(url, sink, headers=None, total_size=None, ranged=True, workers=None):
+    """
+    按分段并发下载文件并写入sink，中断后再次调用只下载尚未写入的分段
+    :param url: 下载地址
+    :param sink: 写入端，需提供part_range(n)、missing_parts()及线程安全的write_part(n, data)
+    :param headers: 额外请求头，如鉴权信息
+    :param total_size: 文件大小，仅用于输出进度
+    :param ranged: 下载地址是否支持Range请求，不支持时退化为单连接顺序读取
+    :param workers: 并发连接数，默认DOWNLOAD_WORKERS
+    :return: Progress的实例
+    """
+    headers = headers or {}
+    workers = workers or settings.DOWNLOAD_WORKERS
+    progress = Progress(getattr(sink, 'object_key', url), total_size)
+    attempt = 0
+    while True:
+        missing = sink.missing_parts()
+        if not missing:
+            break
+        try:
+            if ranged:
+                with ThreadPoolExecutor(max_workers=min(workers, len(missing))) as pool:
+                    futures = [pool.submit(_fetch_part, url, headers, sink, number, progress) for number in missing]
+                    done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+                    errors = [future.exception() for future in done if future.exception()]
+                    if errors:
+                        for future in futures:
+                            future.cancel()
+                        raise errors[0]
+            else:
+                _stream(url, headers, sink, progress)
+        except (DownloadError, OSError) as e:
+            # 网络中断或分段校验失败时重试缺失的分段，仍失败时由写入端保留进度待下次续传
+            if attempt >= settings.HTTP_MAX_RETRIES:
+                raise
+            attempt += 1
+            logger.warning('{}: {}, retry {}'.format(progress.name, e, attempt))
+    progress.finish()
+    return progress
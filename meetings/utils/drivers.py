@@ -1,41 +1,146 @@
-from meetings.models import Meeting
-from meetings.utils import zoom_apis, welink_apis, tencent_apis
-
-
-def createMeeting(platform, date, start, end, topic, host, record):
-    status, content = (None, None)
-    if platform == 'zoom':
-        status, content = zoom_apis.createMeeting(date, start, end, topic, host, record)
-    elif platform == 'welink':
-        status, content = welink_apis.createMeeting(date, start, end, topic, host, record)
-    elif platform == 'tencent':
-        status, content = tencent_apis.createMeeting(date, start, end, topic, host, record)
-    return status, content
-
-
-def cancelMeeting(mid):
-    meeting = Meeting.objects.get(mid=mid)
-    mplatform = meeting.mplatform
-    host_id = meeting.host_id
-    status = None
-    if mplatform == 'zoom':
-        status = zoom_apis.cancelMeeting(mid)
-    elif mplatform == 'welink':
-        status = welink_apis.cancelMeeting(mid, host_id)
-    elif mplatform == 'tencent':
-        status = tencent_apis.cancelMeeting(mid)
-    return status
-
-
-def getParticipants(mid):
-    meeting = Meeting.objects.get(mid=mid)
-    mplatform = meeting.mplatform
-    status, res = (None, None)
-    if mplatform == 'zoom':
-        status, res = zoom_apis.getParticipants(mid)
-    elif mplatform == 'welink':
-        status, res = welink_apis.getParticipants(mid)
-    elif mplatform == 'tencent':
-        status, res = tencent_apis.getParticipants(mid)
-    return status, res
+import datetime
+import logging
+from meetings.utils import zoom_apis, welink_apis, tencent_apis, http_client
 
+logger = logging.getLogger('log')
+
+_drivers = {}
+
+
+def register(platform):
+    """注册会议平台驱动，新增平台只需实现Driver并以平台名注册"""
+    def decorator(cls):
+        cls.platform = platform
+        _drivers[platform] = cls()
+        return cls
+    return decorator
+
+
+def get_driver(platform):
+    """获取平台驱动，平台未注册时抛出KeyError"""
+    return _drivers[platform]
+
+
+def find_driver(platform):
+    """获取平台驱动，平台为空或未注册时返回None"""
+    return _drivers.get(platform)
+
+
+def platforms():
+    return list(_drivers.keys())
+
+
+class Driver:
+    """会议平台驱动接口，除create外的操作均接收已加载的Meeting实例，不再重复查询数据库"""
+    platform = None
+
+    def create(self, date, start, end, topic, host, record):
+        """
+        预定会议
+        :return: (status, {'mid', 'join_url', 'host_id', ...})
+        """
+        raise NotImplementedError
+
+    def cancel(self, meeting):
+        """取消会议，返回状态码"""
+        raise NotImplementedError
+
+    def participants(self, meeting):
+        """
+        查询参会者
+        :return: (status, {'total_records', 'participants'})，失败时为平台返回的错误信息
+        """
+        raise NotImplementedError
+
+    def list_recordings(self, meeting):
+        """查询会议的可用录像，返回格式由平台决定，无录像时返回空值"""
+        raise NotImplementedError
+
+    def download_url(self, meeting, recording):
+        """获取list_recordings返回的录像的下载地址"""
+        raise NotImplementedError
+
+
+@register('zoom')
+class ZoomDriver(Driver):
+    def create(self, date, start, end, topic, host, record):
+        return zoom_apis.createMeeting(date, start, end, topic, host, record)
+
+    def cancel(self, meeting):
+        return zoom_apis.cancelMeeting(meeting.mid)
+
+    def participants(self, meeting):
+        return zoom_apis.getParticipants(meeting.mid)
+
+    def list_recordings(self, meeting):
+        """返回该会议最大的一条录像记录"""
+        return zoom_apis.getRecordings(meeting.mid, meeting.host_id)
+
+    def download_url(self, meeting, recording):
+        """zoom的下载地址会重定向至实际的文件地址"""
+        r = http_client.get(recording['download_url'], allow_redirects=False)
+        return r.headers.get('location')
+
+
+@register('welink')
+class WelinkDriver(Driver):
+    def create(self, date, start, end, topic, host, record):
+        return welink_apis.createMeeting(date, start, end, topic, host, record)
+
+    def cancel(self, meeting):
+        return welink_apis.cancelMeeting(meeting.mid, meeting.host_id)
+
+    def participants(self, meeting):
+        return welink_apis.getParticipants(meeting.mid, meeting.host_id)
+
+    def list_recordings(self, meeting):
+        """返回会议时段内的录像，按开始时间排序"""
+        start_time = ' '.join([meeting.date, meeting.start])
+        end_time = ' '.join([meeting.date, meeting.end])
+        return welink_apis.getAvailableRecordings(meeting.mid, meeting.host_id, start_time, end_time)
+
+    def download_url(self, meeting, recording):
+        """返回高清录像的下载信息[{'url', 'token', ...}]"""
+        status, res = welink_apis.getDetailDownloadUrl(recording['confUUID'], meeting.host_id)
+        if status != 200:
+            logger.error('meeting {}: fail to get download url, {}'.format(meeting.mid, res))
+            return []
+        return [url for url in res['recordUrls'][0]['urls'] if url['fileType'] == 'Hd']
+
+
+@register('tencent')
+class TencentDriver(Driver):
+    def create(self, date, start, end, topic, host, record):
+        return tencent_apis.createMeeting(date, start, end, topic, host, record)
+
+    def cancel(self, meeting):
+        return tencent_apis.cancelMeeting(meeting.mid, meeting.mmid, meeting.host_id)
+
+    def participants(self, meeting):
+        return tencent_apis.getParticipants(meeting.mmid, meeting.host_id)
+
+    def list_recordings(self, meeting):
+        """返回会议开始前后30分钟内最大的一条已转码录像{'record_file_id', 'record_size', 'userid'}"""
+        start_timestamp = int(datetime.datetime.strptime(' '.join([meeting.date, meeting.start]),
+                                                         '%Y-%m-%d %H:%M').timestamp())
+        match_record = {}
+        for record in tencent_apis.get_records():
+            if record.get('meeting_id') != meeting.mmid:
+                continue
+            if record.get('state') != 3:
+                continue
+            if abs(record.get('media_start_time') // 1000 - start_timestamp) > 1800:
+                continue
+            record_file = record.get('record_files')[0]
+            if record_file.get('record_size') < 1024 * 1024 * 10:
+                continue
+            if not match_record or record_file.get('record_size') > match_record.get('record_size'):
+                match_record = {
+                    'record_file_id': record_file.get('record_file_id'),
+                    'record_size': record_file.get('record_size'),
+                    'userid': record.get('userid')
+                }
+        return match_record
+
+    def download_url(self, meeting, recording):
+        return tencent_apis.get_video_download(recording['record_file_id'], recording['userid'])
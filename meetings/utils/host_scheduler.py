@@ -0,0 +1,139 @@
+import bisect
+import datetime
+import logging
+import random
+import pytz
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from meetings.models import Meeting, HostLock, HostReservation
+
+logger = logging.getLogger('log')
+
+# 同一host的两场会议之间至少间隔的时长
+BUFFER = datetime.timedelta(minutes=30)
+# 预留在创建会议失败且未释放时(如worker退出)的过期时长
+RESERVATION_TTL = datetime.timedelta(minutes=10)
+
+
+def get_timezone(timezone):
+    try:
+        return pytz.timezone(timezone or settings.TIME_ZONE)
+    except pytz.UnknownTimeZoneError:
+        return pytz.timezone(settings.TIME_ZONE)
+
+
+def to_interval(date, start, end, timezone=None):
+    """
+    将会议的日期、开始及结束时间转换为UTC时间区间；会议不支持跨天，结束时间不晚于开始时间时抛出ValueError
+    :return: (start_at, end_at)
+    """
+    tz = get_timezone(timezone)
+    start_at = tz.localize(datetime.datetime.strptime(' '.join([date, start]), '%Y-%m-%d %H:%M'))
+    end_at = tz.localize(datetime.datetime.strptime(' '.join([date, end]), '%Y-%m-%d %H:%M'))
+    if end_at <= start_at:
+        raise ValueError('end time {} is not later than start time {}'.format(end, start))
+    return start_at.astimezone(pytz.utc), end_at.astimezone(pytz.utc)
+
+
+class HostIndex:
+    """按host维护已预定时段的区间索引，按开始时间有序并记录前缀最大结束时间，查询耗时O(log n)"""
+
+    def __init__(self):
+        self._intervals = {}
+        self._starts = {}
+        self._max_ends = {}
+
+    def add(self, host_id, start_at, end_at):
+        intervals = self._intervals.setdefault(host_id, [])
+        bisect.insort(intervals, (start_at, end_at))
+        self._starts.pop(host_id, None)
+        self._max_ends.pop(host_id, None)
+
+    def _build(self, host_id):
+        if host_id not in self._starts:
+            intervals = self._intervals.get(host_id, [])
+            max_ends = []
+            for _, end_at in intervals:
+                max_ends.append(max(end_at, max_ends[-1]) if max_ends else end_at)
+            self._starts[host_id] = [start_at for start_at, _ in intervals]
+            self._max_ends[host_id] = max_ends
+        return self._starts[host_id], self._max_ends[host_id]
+
+    def is_free(self, host_id, start_at, end_at):
+        """[start_at, end_at)与该host已预定的时段均不重叠时返回True"""
+        starts, max_ends = self._build(host_id)
+        # 开始时间早于end_at的区间中，只要最大结束时间不晚于start_at即不冲突
+        index = bisect.bisect_left(starts, end_at)
+        return index == 0 or max_ends[index - 1] <= start_at
+
+    def free_hosts(self, host_ids, slots, buffer=BUFFER):
+        """
+        查询在所有时段(含前后缓冲)均空闲的host
+        :param host_ids: 候选host列表
+        :param slots: [(start_at, end_at), ...]，host须在每个时段均空闲
+        :param buffer: 前后缓冲时长
+        """
+        return [host_id for host_id in host_ids
+                if all(self.is_free(host_id, start_at - buffer, end_at + buffer) for start_at, end_at in slots)]
+
+
+def load_index(platform, slots):
+    """加载平台上与待查询时段相邻日期内的所有已预定会议，按会议的时区换算后日期可能相差一天"""
+    index = HostIndex()
+    if not slots:
+        return index
+    tz = get_timezone(None)
+    date_from = (min(start_at for start_at, _ in slots).astimezone(tz) - datetime.timedelta(days=1)).\
+        strftime('%Y-%m-%d')
+    date_to = (max(end_at for _, end_at in slots).astimezone(tz) + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+    meetings = Meeting.objects.filter(is_delete=0, mplatform=platform, date__gte=date_from, date__lte=date_to).\
+        values('host_id', 'date', 'start', 'end', 'timezone')
+    for meeting in meetings:
+        try:
+            start_at, end_at = to_interval(meeting['date'], meeting['start'], meeting['end'], meeting['timezone'])
+        except ValueError:
+            logger.warning('skip meeting with invalid time: {}'.format(meeting))
+            continue
+        index.add(meeting['host_id'], start_at, end_at)
+    expire_time = datetime.datetime.now() - RESERVATION_TTL
+    reservations = HostReservation.objects.filter(platform=platform, create_time__gt=expire_time).\
+        values('host_id', 'start_at', 'end_at')
+    for reservation in reservations:
+        index.add(reservation['host_id'], pytz.utc.localize(reservation['start_at']),
+                  pytz.utc.localize(reservation['end_at']))
+    return index
+
+
+def find_free_hosts(platform, host_ids, slots):
+    """返回在slots内均可用的host列表"""
+    return load_index(platform, slots).free_hosts(host_ids, slots)
+
+
+def reserve_host(platform, host_ids, slots):
+    """
+    在平台锁内选取空闲host并写入预留，避免并发创建会议时分配到同一host
+    :return: (host_id, reservation_ids)，无可用host时返回(None, [])
+    """
+    try:
+        HostLock.objects.get_or_create(platform=platform)
+    except IntegrityError:
+        pass
+    with transaction.atomic():
+        # 以更新平台锁行的方式加锁，MySQL中为行锁，SQLite等不支持SELECT FOR UPDATE的数据库中为写锁；
+        # 加锁须早于查询，否则SQLite中并发的事务会在写入预留时相互等待直至超时
+        HostLock.objects.filter(platform=platform).update(platform=platform)
+        available_host_ids = load_index(platform, slots).free_hosts(host_ids, slots)
+        logger.info('avilable_host_id:{}'.format(available_host_ids))
+        if not available_host_ids:
+            return None, []
+        host_id = random.choice(available_host_ids)
+        reservation_ids = [HostReservation.objects.create(platform=platform, host_id=host_id,
+                                                          start_at=start_at.replace(tzinfo=None),
+                                                          end_at=end_at.replace(tzinfo=None)).id
+                           for start_at, end_at in slots]
+    return host_id, reservation_ids
+
+
+def release_reservations(reservation_ids):
+    """会议落库或创建失败后释放预留"""
+    HostReservation.objects.filter(id__in=reservation_ids).delete()
@@ -0,0 +1,166 @@
+import atexit
+import bisect
+import logging
+import random
+import re
+import threading
+import time
+import requests
+from collections import defaultdict
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger('log')
+
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+RETRY_STATUS = (429, 502, 503, 504)
+# 延迟直方图的桶上界(秒)，最后一个桶记录超过上界的请求
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKET_LABELS = tuple('<={}s'.format(bucket) for bucket in LATENCY_BUCKETS) + ('>{}s'.format(LATENCY_BUCKETS[-1]),)
+STAT_KEY = 'http_client:latency:{}:{}'
+ENDPOINTS_KEY = 'http_client:endpoints'
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+# 尚未写入缓存的延迟计数，按(接口, 桶)索引
+_latency = defaultdict(int)
+_latency_lock = threading.Lock()
+_last_flush = time.time()
+
+
+def get_session(url):
+    """按scheme及host复用Session，同一host的请求共享连接池并保持长连接"""
+    parts = urlsplit(url)
+    key = '{}://{}'.format(parts.scheme, parts.netloc)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.HTTP_POOL_SIZE)
+            session.mount(key, adapter)
+            _sessions[key] = session
+        return session
+
+
+def normalize_endpoint(method, url):
+    """将路径中的id、邮箱等可变片段替换为占位符，作为延迟统计的接口名"""
+    parts = urlsplit(url)
+    segments = ['{id}' if re.search(r'\d|@', segment) or len(segment) >= 20 else segment
+                for segment in parts.path.split('/')]
+    return '{} {}{}'.format(method, parts.netloc, '/'.join(segments))
+
+
+def _stat_key(endpoint, label):
+    # memcached的key不能包含空格
+    return STAT_KEY.format(endpoint.replace(' ', '_'), label)
+
+
+def _incr(key, delta=1):
+    if not cache.add(key, delta, None):
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            cache.set(key, delta, None)
+
+
+def record_latency(endpoint, cost):
+    """在进程内累计延迟直方图，每隔HTTP_STATS_FLUSH_INTERVAL批量写入缓存，避免每次请求都访问缓存"""
+    global _last_flush
+    with _latency_lock:
+        _latency[(endpoint, BUCKET_LABELS[bisect.bisect_left(LATENCY_BUCKETS, cost)])] += 1
+        now = time.time()
+        if now - _last_flush < settings.HTTP_STATS_FLUSH_INTERVAL:
+            return
+        _last_flush = now
+    flush_latency()
+
+
+def flush_latency():
+    """将进程内累计的延迟计数写入缓存，进程退出时也会执行"""
+    with _latency_lock:
+        pending = dict(_latency)
+        _latency.clear()
+    if not pending:
+        return
+    try:
+        endpoints = cache.get(ENDPOINTS_KEY) or []
+        new_endpoints = {endpoint for endpoint, _ in pending} - set(endpoints)
+        if new_endpoints:
+            cache.set(ENDPOINTS_KEY, sorted(set(endpoints) | new_endpoints), None)
+        for (endpoint, label), count in pending.items():
+            _incr(_stat_key(endpoint, label), count)
+    except Exception as e:
+        logger.warning('fail to flush http latency stats: {}'.format(e))
+
+
+atexit.register(flush_latency)
+
+
+def get_stats():
+    """获取各接口的延迟直方图"""
+    stats = {}
+    for endpoint in cache.get(ENDPOINTS_KEY) or []:
+        stats[endpoint] = {label: cache.get(_stat_key(endpoint, label)) or 0 for label in BUCKET_LABELS}
+    return stats
+
+
+def _backoff(attempt):
+    """全抖动的指数退避"""
+    return random.uniform(0, min(settings.HTTP_RETRY_MAX_BACKOFF, settings.HTTP_RETRY_BACKOFF * 2 ** attempt))
+
+
+def _timeout(timeout, remaining):
+    """将连接及读取超时截断到剩余时间内"""
+    if isinstance(timeout, tuple):
+        return tuple(min(t, remaining) if t is not None else remaining for t in timeout)
+    return min(timeout, remaining) if timeout is not None else remaining
+
+
+def request(method, url, deadline=None, **kwargs):
+    """
+    发送请求，默认带连接及读取超时；幂等请求在连接失败、超时或网关错误时按抖动退避重试
+    :param deadline: 本次调用含重试的总时长上限(秒)，默认HTTP_DEADLINE，各次尝试的超时及退避均截断到剩余时间内
+    :return: requests.Response
+    """
+    method = method.upper()
+    timeout = kwargs.pop('timeout', (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT))
+    expire_time = time.time() + (settings.HTTP_DEADLINE if deadline is None else deadline)
+    retries = settings.HTTP_MAX_RETRIES if method in IDEMPOTENT_METHODS else 0
+    endpoint = normalize_endpoint(method, url)
+    session = get_session(url)
+    attempt = 0
+    while True:
+        t1 = time.time()
+        try:
+            response = session.request(method, url, timeout=_timeout(timeout, max(expire_time - t1, 0.1)),
+                                       **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            record_latency(endpoint, time.time() - t1)
+            delay = _backoff(attempt)
+            if attempt >= retries or time.time() + delay >= expire_time:
+                raise
+            logger.warning('{} failed: {}, retry {}'.format(endpoint, e, attempt + 1))
+        else:
+            record_latency(endpoint, time.time() - t1)
+            delay = _backoff(attempt)
+            if response.status_code not in RETRY_STATUS or attempt >= retries or \
+                    time.time() + delay >= expire_time:
+                return response
+            logger.warning('{} returned {}, retry {}'.format(endpoint, response.status_code, attempt + 1))
+            response.close()
+        time.sleep(delay)
+        attempt += 1
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request('DELETE', url, **kwargs)
@@ -1,9 +1,8 @@
 import logging
 import json
-import requests
 from django.conf import settings
 from meetings.models import Activity
-from meetings.utils.zoom_apis import getOauthToken
+from meetings.utils import zoom_apis
 
 
 logger = logging.getLogger('log')
@@ -45,12 +44,10 @@ def add_panelists(mid, new_schedules):
 
 
 def post(data, mid):
-    access_token = getOauthToken()
     url = 'https://api.zoom.us/v2/webinars/{}/panelists'.format(mid)
     headers = {
-        'Content-Type': 'application/json',
-        'Authorization': 'Bearer {}'.format(access_token)
+        'Content-Type': 'application/json'
     }
-    r = requests.post(url, headers=headers, data=json.dumps(data))
+    r = zoom_apis.request('POST', url, headers=headers, data=json.dumps(data))
     if r.status_code != 201:
         logger.error(r.json())
@@ -0,0 +1,87 @@
+import functools
+import html
+import mimetypes
+import os
+import re
+from base64 import b64encode
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from django.conf import settings
+
+TEMPLATE_DIR = os.path.join(settings.BASE_DIR, 'templates')
+IMAGE_DIR = os.path.join(TEMPLATE_DIR, 'images')
+PLACEHOLDER = re.compile(r'{{\s*(\w+)\s*}}')
+EXTENSIONS = {'text': 'txt', 'html': 'html'}
+
+
+class Template:
+    """邮件模板，加载时将{{name}}占位符拆分为片段，渲染时单次拼接，不对参数中的花括号做任何解释"""
+
+    def __init__(self, source, escape=None):
+        # split后偶数位为原文，奇数位为占位符名称
+        self._parts = PLACEHOLDER.split(source)
+        self._escape = escape or str
+
+    def render(self, context):
+        return ''.join(part if index % 2 == 0 else self._escape(str(context.get(part, '')))
+                       for index, part in enumerate(self._parts))
+
+
+@functools.lru_cache(maxsize=None)
+def get_template(name, kind='text'):
+    """按名称加载templates目录下的模板，每个进程只读取及解析一次"""
+    path = os.path.join(TEMPLATE_DIR, '{}.{}'.format(name, EXTENSIONS[kind]))
+    with open(path, 'r', encoding='utf-8') as fp:
+        source = fp.read()
+    return Template(source, html.escape if kind == 'html' else None)
+
+
+@functools.lru_cache(maxsize=None)
+def has_template(name, kind):
+    return os.path.exists(os.path.join(TEMPLATE_DIR, '{}.{}'.format(name, EXTENSIONS[kind])))
+
+
+def render_body(name, context, with_html=False):
+    """
+    渲染邮件正文
+    :param with_html: 存在html模板时同时附带html版本
+    :return: (正文文本, MIME part)
+    """
+    text = get_template(name).render(context)
+    if not (with_html and has_template(name, 'html')):
+        return text, MIMEText(text, 'plain', 'utf-8')
+    part = MIMEMultipart('alternative')
+    part.attach(MIMEText(text, 'plain', 'utf-8'))
+    part.attach(MIMEText(get_template(name, 'html').render(context), 'html', 'utf-8'))
+    return text, part
+
+
+@functools.lru_cache(maxsize=1)
+def _load_images():
+    """读取images目录下的图片并预先完成base64编码，返回{'images/<file>': (subtype, payload)}"""
+    images = {}
+    if not os.path.isdir(IMAGE_DIR):
+        return images
+    for file in sorted(os.listdir(IMAGE_DIR)):
+        mimetype, _ = mimetypes.guess_type(file)
+        if not mimetype or not mimetype.startswith('image/'):
+            continue
+        with open(os.path.join(IMAGE_DIR, file), 'rb') as f:
+            payload = b64encode(f.read()).decode('ascii')
+        images[os.path.join('images', file)] = (mimetype.split('/')[1], payload)
+    return images
+
+
+def image_parts(body):
+    """返回正文中引用的图片的MIME part"""
+    parts = []
+    for content_id, (subtype, payload) in _load_images().items():
+        if content_id not in body:
+            continue
+        part = MIMEBase('image', subtype)
+        part.set_payload(payload)
+        part['Content-Transfer-Encoding'] = 'base64'
+        part.add_header('Content-ID', '<{}>'.format(content_id))
+        parts.append(part)
+    return parts
@@ -0,0 +1,82 @@
+import datetime
+import logging
+import smtplib
+import time
+from django.conf import settings
+from meetings.models import MailOutbox
+
+logger = logging.getLogger('log')
+
+PENDING = 0
+SENDING = 1
+SENT = 2
+FAILED = 3
+# 连接中断、超时及4xx响应视为临时错误，稍后重试
+TRANSIENT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, smtplib.SMTPHeloError, OSError)
+
+
+def enqueue(msg, to_addrs):
+    """
+    将邮件写入发件箱，由send_outbox命令发送
+    :param msg: email.message.Message
+    :param to_addrs: 收件人列表
+    """
+    mail = MailOutbox.objects.create(from_addr=settings.GMAIL_USERNAME, to_addrs=','.join(to_addrs),
+                                     message=msg.as_string(), next_try_time=datetime.datetime.now())
+    logger.info('mail {} queued: {}'.format(mail.id, mail.to_addrs))
+    return mail
+
+
+def is_transient(error):
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        # 所有收件人均被拒绝，且均为4xx响应时稍后重试
+        return bool(error.recipients) and all(400 <= code < 500 for code, _ in error.recipients.values())
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+class SMTPConnection:
+    """持久化的SMTP连接，登录一次后在多封邮件间复用，空闲超时或断开后重新建立"""
+
+    def __init__(self):
+        self.server = None
+        self.last_used = 0
+
+    def open(self):
+        server = smtplib.SMTP(settings.SMTP_SERVER_HOST, settings.SMTP_SERVER_PORT, timeout=30)
+        server.ehlo()
+        if settings.SMTP_USE_TLS:
+            server.starttls()
+            server.ehlo()
+        if settings.SMTP_SERVER_USER:
+            server.login(settings.SMTP_SERVER_USER, settings.SMTP_SERVER_PASS)
+        self.server = server
+        logger.info('smtp connection opened')
+
+    def close(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            self.server.close()
+        self.server = None
+        logger.info('smtp connection closed')
+
+    def close_if_idle(self):
+        if self.server is not None and time.time() - self.last_used > settings.MAIL_IDLE_TIMEOUT:
+            self.close()
+
+    def send(self, from_addr, to_addrs, message):
+        """发送邮件，连接已被服务端断开时重连一次；返回被拒绝的收件人"""
+        if self.server is None:
+            self.open()
+        try:
+            refused = self.server.sendmail(from_addr, to_addrs, message.encode('utf-8'))
+        except smtplib.SMTPServerDisconnected:
+            self.server = None
+            self.open()
+            refused = self.server.sendmail(from_addr, to_addrs, message.encode('utf-8'))
+        self.last_used = time.time()
+        return refused
@@ -0,0 +1,68 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+from meetings.models import User
+from meetings.utils import wx_apis
+
+logger = logging.getLogger('log')
+
+# 进程内共享的有界线程池，限制同时向微信发送订阅消息的并发数
+_executor = ThreadPoolExecutor(max_workers=settings.NOTIFY_WORKERS)
+
+
+def get_receivers(user_ids):
+    """
+    一次查询获取用户的昵称及openid，按openid去重
+    :param user_ids: 用户id列表或values_list查询集，传入查询集时作为子查询
+    """
+    receivers = {}
+    for nickname, openid in User.objects.filter(id__in=user_ids).exclude(openid__isnull=True).\
+            exclude(openid='').values_list('nickname', 'openid'):
+        receivers[openid] = nickname
+    return [(nickname, openid) for openid, nickname in receivers.items()]
+
+
+def send_subscription(nickname, content):
+    """发送一条订阅消息，成功返回True"""
+    try:
+        r = wx_apis.send_subscription(content)
+    except Exception as e:
+        logger.error('fail to send subscription to {}: {}'.format(nickname, e))
+        return False
+    if r.status_code != 200:
+        logger.error('status code: {}'.format(r.status_code))
+        logger.error('content: {}'.format(r.text))
+        return False
+    if r.json().get('errcode') != 0:
+        logger.warning('Error Code: {}'.format(r.json().get('errcode')))
+        logger.warning('Error Msg: {}'.format(r.json().get('errmsg')))
+        logger.warning('receiver: {}'.format(nickname))
+        return False
+    logger.info('subscription message sent to {}.'.format(nickname))
+    return True
+
+
+def _send(nickname, content):
+    """
+    在线程池中发送订阅消息；令牌经数据库缓存获取，线程的数据库连接不随请求关闭，
+    发送前后关闭超时或已失效的连接，避免数据库重启或连接超过wait_timeout后一直发送失败
+    """
+    close_old_connections()
+    try:
+        return send_subscription(nickname, content)
+    finally:
+        close_old_connections()
+
+
+def dispatch(messages, wait=False):
+    """
+    并发发送订阅消息
+    :param messages: [(nickname, content), ...]
+    :param wait: 是否等待发送完成；为False时立即返回，由线程池在后台发送
+    :return: wait为True时返回每条消息是否发送成功
+    """
+    futures = [_executor.submit(_send, nickname, content) for nickname, content in messages]
+    if wait:
+        return [future.result() for future in futures]
+    return futures
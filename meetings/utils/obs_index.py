@@ -0,0 +1,117 @@
+import logging
+import threading
+from django.conf import settings
+from obs import ObsClient
+
+logger = logging.getLogger('log')
+
+_lock = threading.Lock()
+_obs_client = None
+_object_index = None
+
+
+def get_obs_client():
+    """获取录像存储桶的ObsClient，每个进程复用同一实例；缺少配置时返回None"""
+    global _obs_client
+    access_key_id = settings.DEFAULT_CONF.get('ACCESS_KEY_ID', '')
+    secret_access_key = settings.DEFAULT_CONF.get('SECRET_ACCESS_KEY', '')
+    endpoint = settings.DEFAULT_CONF.get('OBS_ENDPOINT', '')
+    bucketName = settings.DEFAULT_CONF.get('OBS_BUCKETNAME', '')
+    if not (access_key_id and secret_access_key and endpoint and bucketName):
+        logger.error('losing required arguments for ObsClient')
+        return None
+    with _lock:
+        if _obs_client is None:
+            _obs_client = ObsClient(access_key_id=access_key_id,
+                                    secret_access_key=secret_access_key,
+                                    server='https://{}'.format(endpoint))
+        return _obs_client
+
+
+def get_object_index():
+    """获取录像存储桶的对象索引，每个进程(即每次命令执行)共享一份"""
+    global _object_index
+    obs_client = get_obs_client()
+    if obs_client is None:
+        return None
+    with _lock:
+        if _object_index is None:
+            _object_index = ObjectIndex(obs_client, settings.DEFAULT_CONF.get('OBS_BUCKETNAME', ''))
+        return _object_index
+
+
+def _content_length(resp):
+    length = getattr(resp.body, 'contentLength', None) if resp.body else None
+    if length is None:
+        length = dict(resp.header or []).get('content-length')
+    return int(length) if length is not None else None
+
+
+class ObjectIndex:
+    """
+    存储桶对象索引，记录对象的key与大小
+    单个对象通过getObjectMetadata查询；需要遍历时按前缀列举，同一前缀在进程内只列举一次
+    """
+
+    def __init__(self, obs_client, bucket):
+        self.obs_client = obs_client
+        self.bucket = bucket
+        self._sizes = {}
+        self._prefixes = set()
+        self._lock = threading.Lock()
+
+    def _covered(self, key):
+        return any(key.startswith(prefix) for prefix in self._prefixes)
+
+    def load_prefix(self, prefix=''):
+        """按前缀分页列举对象并写入索引"""
+        with self._lock:
+            if prefix in self._prefixes:
+                return
+        sizes = {}
+        marker = None
+        while True:
+            resp = self.obs_client.listObjects(self.bucket, prefix=prefix, marker=marker, max_keys=1000)
+            if resp.status >= 300:
+                logger.error('fail to list objects with prefix {}: {} {}'.format(prefix, resp.errorCode,
+                                                                                 resp.errorMessage))
+                return
+            for content in resp.body.contents:
+                sizes[content['key']] = content['size']
+            if not resp.body.is_truncated:
+                break
+            marker = resp.body.next_marker
+        with self._lock:
+            self._sizes.update(sizes)
+            self._prefixes.add(prefix)
+        logger.info('{} objects indexed with prefix {}'.format(len(sizes), prefix))
+
+    def get_size(self, key):
+        """返回对象大小，对象不存在时返回None"""
+        with self._lock:
+            if key in self._sizes:
+                return self._sizes[key]
+            if self._covered(key):
+                return None
+        resp = self.obs_client.getObjectMetadata(self.bucket, key)
+        if resp.status == 404:
+            size = None
+        elif resp.status < 300:
+            size = _content_length(resp)
+        else:
+            raise RuntimeError('fail to get metadata of {}: {} {}'.format(key, resp.errorCode, resp.errorMessage))
+        with self._lock:
+            self._sizes[key] = size
+        return size
+
+    def put(self, key, size):
+        """上传对象后更新索引"""
+        with self._lock:
+            self._sizes[key] = size
+
+    def keys(self, prefix='', suffix=''):
+        """列举前缀下的对象key，必要时先列举该前缀"""
+        self.load_prefix(prefix)
+        with self._lock:
+            return sorted(key for key, size in self._sizes.items()
+                          if size is not None and key.startswith(prefix) and key.endswith(suffix))
@@ -0,0 +1,162 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+from django.conf import settings
+from obs import CompleteMultipartUploadRequest, CompletePart
+from meetings.utils import downloader, obs_index
+
+logger = logging.getLogger('log')
+
+
+class TransferError(downloader.DownloadError):
+    """转存失败，已上传的分段保留在清单中，下次转存时续传"""
+
+
+class MultipartSink:
+    """
+    OBS分段上传的写入端，分段按序号写入，每个分段上传后落盘清单以便中断后续传
+    清单按object_key存放，记录uploadId、文件大小、分段大小及已上传分段的etag与大小
+    """
+
+    def __init__(self, object_key, total_size, metadata=None, part_size=None):
+        index = obs_index.get_object_index()
+        if not index:
+            raise TransferError('losing required arguments for ObsClient')
+        self.obs_client = index.obs_client
+        self.bucket = index.bucket
+        self.object_key = object_key
+        self.total_size = total_size
+        self.metadata = metadata
+        self.part_size = part_size or settings.OBS_PART_SIZE
+        self.upload_id = None
+        self.parts = {}
+        self._lock = threading.Lock()
+        digest = hashlib.sha1(object_key.encode('utf-8')).hexdigest()
+        self.manifest_path = os.path.join(settings.TRANSFER_STATE_DIR, '{}.json'.format(digest))
+
+    @property
+    def part_count(self):
+        return max(1, (self.total_size + self.part_size - 1) // self.part_size)
+
+    def part_range(self, part_number):
+        """分段对应的字节区间[start, end]"""
+        start = (part_number - 1) * self.part_size
+        return start, min(start + self.part_size, self.total_size) - 1
+
+    def missing_parts(self):
+        with self._lock:
+            return [n for n in range(1, self.part_count + 1) if str(n) not in self.parts]
+
+    def open(self):
+        """续传清单中的分段上传，清单不存在或已失效时重新初始化"""
+        if self._resume():
+            logger.info('{}: resume multipart upload with {}/{} parts done'.format(
+                self.object_key, len(self.parts), self.part_count))
+            return
+        resp = self.obs_client.initiateMultipartUpload(self.bucket, self.object_key, metadata=self.metadata)
+        if resp.status >= 300:
+            raise TransferError('fail to initiate multipart upload of {}: {} {}'.format(
+                self.object_key, resp.errorCode, resp.errorMessage))
+        self.upload_id = resp.body.uploadId
+        self.parts = {}
+        self._save()
+
+    def _resume(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if manifest.get('object_key') != self.object_key or manifest.get('total_size') != self.total_size or \
+                manifest.get('part_size') != self.part_size:
+            logger.info('{}: manifest is outdated, start over'.format(self.object_key))
+            self._abort(manifest.get('upload_id'))
+            return False
+        # 确认分段上传任务仍存在，过期或已被清理时重新初始化
+        resp = self.obs_client.listParts(self.bucket, self.object_key, manifest['upload_id'])
+        if resp.status >= 300:
+            logger.info('{}: upload {} is gone, start over'.format(self.object_key, manifest['upload_id']))
+            return False
+        uploaded = {str(part.partNumber): part.etag.strip('"') for part in resp.body.parts}
+        self.upload_id = manifest['upload_id']
+        self.parts = {number: part for number, part in manifest['parts'].items()
+                      if uploaded.get(number) == part['etag']}
+        return True
+
+    def _save(self):
+        manifest = {
+            'object_key': self.object_key,
+            'upload_id': self.upload_id,
+            'total_size': self.total_size,
+            'part_size': self.part_size,
+            'parts': self.parts
+        }
+        os.makedirs(settings.TRANSFER_STATE_DIR, exist_ok=True)
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _abort(self, upload_id):
+        if upload_id:
+            self.obs_client.abortMultipartUpload(self.bucket, self.object_key, upload_id)
+
+    def write_part(self, part_number, data):
+        """上传一个分段，由OBS按Content-MD5校验内容，并核对返回的etag与分段大小"""
+        start, end = self.part_range(part_number)
+        if len(data) != end - start + 1:
+            raise TransferError('{}: part {} has {} bytes, expected {}'.format(
+                self.object_key, part_number, len(data), end - start + 1))
+        digest = hashlib.md5(data).digest()
+        resp = self.obs_client.uploadPart(self.bucket, self.object_key, part_number, self.upload_id,
+                                          object=data, md5=base64.b64encode(digest).decode('ascii'))
+        if resp.status >= 300:
+            raise TransferError('{}: fail to upload part {}: {} {}'.format(
+                self.object_key, part_number, resp.errorCode, resp.errorMessage))
+        etag = resp.body.etag.strip('"')
+        if etag != digest.hex():
+            raise TransferError('{}: checksum mismatch of part {}'.format(self.object_key, part_number))
+        with self._lock:
+            self.parts[str(part_number)] = {'etag': etag, 'size': len(data)}
+            self._save()
+
+    def complete(self):
+        """核对分段总大小后合并分段，成功后删除清单"""
+        with self._lock:
+            parts = sorted((int(number), part) for number, part in self.parts.items())
+        size = sum(part['size'] for _, part in parts)
+        if len(parts) != self.part_count or size != self.total_size:
+            raise TransferError('{}: {} bytes in {} parts uploaded, expected {} bytes in {} parts'.format(
+                self.object_key, size, len(parts), self.total_size, self.part_count))
+        request = CompleteMultipartUploadRequest(
+            parts=[CompletePart(partNum=number, etag=part['etag']) for number, part in parts])
+        resp = self.obs_client.completeMultipartUpload(self.bucket, self.object_key, self.upload_id, request)
+        if resp.status >= 300:
+            raise TransferError('{}: fail to complete multipart upload: {} {}'.format(
+                self.object_key, resp.errorCode, resp.errorMessage))
+        os.remove(self.manifest_path)
+        obs_index.get_object_index().put(self.object_key, self.total_size)
+        return self.total_size
+
+
+def transfer(url, object_key, total_size=None, headers=None, metadata=None):
+    """
+    将下载地址的文件按分段并发下载并上传至OBS，内存中最多缓存DOWNLOAD_WORKERS个分段
+    中断后再次调用时按清单续传，只下载尚未上传的分段
+    :param url: 录像下载地址
+    :param object_key: 文件在OBS上的位置
+    :param total_size: 文件大小，与下载地址返回的大小不一致时放弃转存
+    :param headers: 下载请求的额外请求头，如鉴权信息
+    :param metadata: 对象的metadata
+    :return: 上传的字节数
+    """
+    size, ranged = downloader.probe(url, headers)
+    if total_size is not None and size != total_size:
+        raise TransferError('{}: download url has {} bytes, expected {}'.format(object_key, size, total_size))
+    sink = MultipartSink(object_key, size, metadata)
+    sink.open()
+    downloader.download(url, sink, headers, total_size=size, ranged=ranged)
+    return sink.complete()
@@ -0,0 +1,133 @@
+import logging
+from django.conf import settings
+from django.db import transaction
+from meetings.models import Meeting, Video
+from meetings.send_email import sendmail
+from meetings.utils import drivers, host_scheduler
+from meetings.utils.response_cache import bump_version, MEETINGS
+
+logger = logging.getLogger('log')
+
+PENDING = 0
+RUNNING = 1
+SUCCEEDED = 2
+FAILED = 3
+JOB_STATUS = {PENDING: 'pending', RUNNING: 'running', SUCCEEDED: 'succeeded', FAILED: 'failed'}
+
+
+NO_HOST_MESSAGE = '暂无可用host,请前往官网查看预定会议'
+
+
+class ProvisionError(Exception):
+    """创建会议失败，code与message与同步接口的返回一致，key为同步接口返回message时使用的字段名"""
+
+    def __init__(self, code, message, key='message'):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.key = key
+
+    def to_dict(self):
+        return {'code': self.code, self.key: self.message}
+
+
+def has_free_host(params):
+    """
+    提交异步任务时检查该时段是否有空闲host，仅查询不预留，创建会议时仍以reserve_host的结果为准
+    :param params: 已校验的创建参数，字段见MeetingsView.post
+    """
+    platform = params['platform']
+    slot = host_scheduler.to_interval(params['date'], params['start'], params['end'])
+    return bool(host_scheduler.find_free_hosts(platform, list(settings.MEETING_HOSTS[platform].keys()), [slot]))
+
+
+def provision_meeting(params):
+    """
+    分配host、在第三方平台预定会议并落库，随后发送通知邮件
+    :param params: 已校验的创建参数，字段见MeetingsView.post
+    :return: Meeting的实例
+    """
+    platform = params['platform']
+    date = params['date']
+    start = params['start']
+    end = params['end']
+    topic = params['topic']
+    record = params['record']
+    host_dict = settings.MEETING_HOSTS[platform]
+    # 查询待创建的会议与现有的预定会议是否冲突
+    slot = host_scheduler.to_interval(date, start, end)
+    host_list = list(host_dict.keys())
+    logger.info('host_list:{}'.format(host_list))
+    # 在平台锁内随机选取空闲host并预留该时段，会议落库或创建失败后释放预留
+    host_id, reservation_ids = host_scheduler.reserve_host(platform, host_list, [slot])
+    if not host_id:
+        logger.warning('{}暂无可用host'.format(platform))
+        raise ProvisionError(1000, NO_HOST_MESSAGE)
+    host = host_dict[host_id]
+    logger.info('host_id:{}'.format(host_id))
+    logger.info('host:{}'.format(host))
+
+    try:
+        status, content = drivers.get_driver(platform).create(date, start, end, topic, host, record)
+        if status not in [200, 201]:
+            raise ProvisionError(400, 'Bad Request', key='msg')
+        # 数据库生成数据，开启录制时同时在Video表中创建一条数据
+        with transaction.atomic():
+            meeting = Meeting.objects.create(
+                mid=content['mid'],
+                topic=topic,
+                community=params['community'],
+                sponsor=params['sponsor'],
+                group_name=params['group_name'],
+                date=date,
+                start=start,
+                end=end,
+                etherpad=params['etherpad'],
+                emaillist=params['emaillist'],
+                timezone=content['timezone'] if 'timezone' in content else 'Asia/Shanghai',
+                agenda=params['agenda'],
+                host_id=content['host_id'],
+                mmid=content.get('mmid'),
+                join_url=content['join_url'],
+                start_url=content.get('start_url'),
+                user_id=params['user_id'],
+                group_id=params['group_id'],
+                mplatform=platform
+            )
+            if record == 'cloud':
+                Video.objects.create(
+                    mid=meeting.mid,
+                    topic=topic,
+                    community=params['community'],
+                    group_name=params['group_name'],
+                    agenda=params['agenda']
+                )
+    finally:
+        host_scheduler.release_reservations(reservation_ids)
+    mid = meeting.mid
+    logger.info('{} has created a {} meeting which mid is {}.'.format(params['sponsor'], platform, mid))
+    logger.info('meeting info: {},{}-{},{}'.format(date, start, end, topic))
+    if record == 'cloud':
+        logger.info('meeting {} was created with auto recording.'.format(mid))
+    bump_version(MEETINGS)
+
+    # 发送email
+    m = {
+        'mid': mid,
+        'topic': topic,
+        'date': date,
+        'start': start,
+        'end': end,
+        'join_url': meeting.join_url,
+        'sig_name': params['group_name'],
+        'emaillist': params['emaillist'],
+        'platform': platform,
+        'etherpad': params['etherpad'],
+        'agenda': params['agenda']
+    }
+    # 会议已创建成功，邮件入队失败不影响返回结果
+    try:
+        sendmail(m, record)
+    except Exception as e:
+        logger.error('fail to enqueue mail of meeting {}: {}'.format(mid, e))
+    return meeting
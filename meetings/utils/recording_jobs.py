@@ -0,0 +1,105 @@
+import datetime
+import json
+import logging
+from django.db import transaction
+from django.db.models import F
+from meetings.models import RecordingJob
+
+logger = logging.getLogger('log')
+
+LOOKUP = 0
+TRANSFER = 1
+COVER = 2
+DB = 3
+DONE = 4
+STAGES = {LOOKUP: 'lookup', TRANSFER: 'transfer', COVER: 'cover', DB: 'db', DONE: 'done'}
+
+PENDING = 0
+RUNNING = 1
+FAILED = 2
+STATUS = {PENDING: 'pending', RUNNING: 'running', FAILED: 'failed'}
+
+# 同一阶段失败达到该次数后不再自动重试，由recording_jobs命令列出待人工处理
+MAX_ATTEMPTS = 5
+# 处理中的任务超过该时长未更新，视为进程异常退出，计为一次失败后从当前阶段重试
+RUNNING_TIMEOUT = datetime.timedelta(hours=6)
+
+
+def ensure_jobs(meetings):
+    """为待处理的会议创建任务，已有任务的会议保持原有进度"""
+    existing = set(RecordingJob.objects.filter(meeting__in=meetings).values_list('meeting_id', flat=True))
+    now = datetime.datetime.now()
+    RecordingJob.objects.bulk_create([RecordingJob(meeting=meeting, stage_time=now) for meeting in meetings
+                                      if meeting.id not in existing], ignore_conflicts=True)
+
+
+def runnable_jobs(recent_meetings):
+    """
+    获取可执行的任务
+    查询录像阶段的任务仅在会议仍处于平台的录像保留期内(recent_meetings)时执行，之后的阶段不依赖平台录像，始终可续做
+    """
+    jobs = RecordingJob.objects.select_related('meeting').exclude(stage=DONE).\
+        filter(status__in=[PENDING, FAILED], attempts__lt=MAX_ATTEMPTS)
+    recent_ids = {meeting.id for meeting in recent_meetings}
+    return [job for job in jobs if job.stage != LOOKUP or job.meeting_id in recent_ids]
+
+
+def claim(job):
+    """将任务标记为处理中，多个进程并发时跳过已被领取的任务"""
+    with transaction.atomic():
+        locked = RecordingJob.objects.select_for_update(skip_locked=True).\
+            filter(id=job.id, status__in=[PENDING, FAILED]).first()
+        if not locked:
+            return False
+        RecordingJob.objects.filter(id=job.id).update(status=RUNNING, update_time=datetime.datetime.now())
+    job.status = RUNNING
+    return True
+
+
+def load_files(job):
+    return json.loads(job.files) if job.files else []
+
+
+def save(job, **fields):
+    """更新任务字段并刷新修改时间，阶段变化时重置失败次数"""
+    now = datetime.datetime.now()
+    if 'stage' in fields and fields['stage'] != job.stage:
+        fields.update(attempts=0, last_error=None, stage_time=now)
+    for name, value in fields.items():
+        setattr(job, name, value)
+    RecordingJob.objects.filter(id=job.id).update(update_time=now, **fields)
+
+
+def release(job):
+    """本次无需继续处理，保留当前阶段待下次执行"""
+    save(job, status=PENDING)
+
+
+def fail(job, error):
+    """记录当前阶段的失败，下次执行时从该阶段重试"""
+    now = datetime.datetime.now()
+    RecordingJob.objects.filter(id=job.id).update(status=FAILED, attempts=F('attempts') + 1,
+                                                  last_error=str(error)[:255], update_time=now)
+    logger.error('recording job of meeting {} failed at stage {}: {}'.format(job.meeting.mid, STAGES[job.stage],
+                                                                             error))
+
+
+def fail_stale_jobs():
+    expire_time = datetime.datetime.now() - RUNNING_TIMEOUT
+    count = RecordingJob.objects.filter(status=RUNNING, update_time__lt=expire_time).\
+        update(status=FAILED, attempts=F('attempts') + 1, last_error='任务超时')
+    if count:
+        logger.warning('{} stale recording jobs marked as failed'.format(count))
+
+
+def stuck_jobs(stuck_time):
+    """
+    获取需要关注的任务：失败次数已达上限、处理超时或查询到录像后在同一阶段停留过久
+    查询录像阶段的停留不计入，会议可能本就没有录像
+    :param stuck_time: 在同一阶段停留的时长上限
+    """
+    now = datetime.datetime.now()
+    jobs = RecordingJob.objects.select_related('meeting').exclude(stage=DONE).order_by('stage_time')
+    return [job for job in jobs if job.attempts >= MAX_ATTEMPTS or
+            (job.status == RUNNING and job.update_time < now - RUNNING_TIMEOUT) or
+            (job.stage != LOOKUP and job.stage_time and job.stage_time < now - stuck_time)]
@@ -0,0 +1,47 @@
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from django.conf import settings
+
+logger = logging.getLogger('log')
+
+
+def platform_limit(platform):
+    """平台同时处理的任务数上限，未配置的平台按1个处理，配置为0时同样按1个处理，避免该平台的任务永远无法派发"""
+    return max(1, settings.RECORDING_PLATFORM_LIMITS.get(platform, 1))
+
+
+def order_jobs(jobs):
+    """按录像大小从大到小排序，尚未查询到录像大小的任务排在最后，调用方需先执行查询录像阶段"""
+    return sorted(jobs, key=lambda job: job.total_size or 0, reverse=True)
+
+
+def run(jobs, func, workers=None):
+    """
+    在有界线程池中执行录像任务
+    由调度线程按顺序派发，跳过所属平台已达并发上限的任务，避免工作线程阻塞在平台限制上
+    :param jobs: RecordingJob的实例列表
+    :param func: 执行单个任务的函数
+    :param workers: 同时处理的任务数，默认RECORDING_WORKERS
+    """
+    workers = max(1, workers or settings.RECORDING_WORKERS)
+    pending = order_jobs(jobs)
+    running = {}
+    active = defaultdict(int)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for job in list(pending):
+                if len(running) >= workers:
+                    break
+                platform = job.meeting.mplatform
+                if active[platform] >= platform_limit(platform):
+                    continue
+                pending.remove(job)
+                active[platform] += 1
+                running[pool.submit(func, job)] = job
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                active[job.meeting.mplatform] -= 1
+                if future.exception():
+                    logger.error('meeting {}: {}'.format(job.meeting.mid, future.exception()))
@@ -0,0 +1,44 @@
+import csv
+import json
+from meetings.models import User, ActivitySign
+
+REGISTRANT_FIELDS = ('id', 'name', 'telephone', 'email', 'company', 'profession')
+CHUNK_SIZE = 500
+
+
+def iter_registrants(activity_id):
+    """
+    逐条生成活动报名者及签到状态，报名者与签到记录各查询一次
+    :param activity_id: 活动id
+    :return: generator of registrant dict
+    """
+    signed_user_ids = set(ActivitySign.objects.filter(activity_id=activity_id).values_list('user_id', flat=True))
+    users = User.objects.filter(activityregister__activity_id=activity_id).distinct().order_by('id').\
+        values(*REGISTRANT_FIELDS)
+    for user in users.iterator(chunk_size=CHUNK_SIZE):
+        user['sign'] = user['id'] in signed_user_ids
+        yield user
+
+
+class Echo:
+    """供csv.writer写入的伪缓冲区，直接返回写入的内容"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(activity_id):
+    """以CSV格式流式导出报名者"""
+    fields = REGISTRANT_FIELDS + ('sign',)
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for registrant in iter_registrants(activity_id):
+        yield writer.writerow([registrant[field] for field in fields])
+
+
+def stream_json(activity_id):
+    """以JSON数组格式流式导出报名者"""
+    yield '['
+    for index, registrant in enumerate(iter_registrants(activity_id)):
+        yield (',' if index else '') + json.dumps(registrant, ensure_ascii=False)
+    yield ']'
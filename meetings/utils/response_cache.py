@@ -0,0 +1,105 @@
+import datetime
+import functools
+import hashlib
+import json
+import logging
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.response import Response
+from meetings.utils import cache_backend
+from meetings.utils.stat_counter import StatCounter
+
+logger = logging.getLogger('log')
+
+MEETINGS = 'meetings'
+ACTIVITIES = 'activities'
+STAT_TYPES = ('hit', 'miss')
+VERSION_KEY = 'response_cache:version:{}'
+STAT_KEY = 'response_cache:stats:{}:{}'
+ENDPOINTS_KEY = 'response_cache:endpoints'
+
+
+def _new_version():
+    # 版本号以时间戳初始化，避免版本键被淘汰后重新计数命中旧数据
+    return int(time.time() * 1000)
+
+
+def get_version(dataset):
+    """获取数据集的当前版本号"""
+    key = VERSION_KEY.format(dataset)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(dataset):
+    """数据集发生写操作后递增版本号，使已缓存的响应失效"""
+    key = VERSION_KEY.format(dataset)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
+    logger.info('response cache of {} invalidated'.format(dataset))
+
+
+counter = StatCounter(ENDPOINTS_KEY, STAT_KEY, STAT_TYPES)
+# 响应数据缓存在进程内，命中时仅读取共享缓存中的版本号
+responses = LocMemCache('response_cache', {'OPTIONS': {'MAX_ENTRIES': settings.RESPONSE_CACHE_MAX_ENTRIES}})
+
+
+def get_stats():
+    """获取各接口的缓存命中/未命中次数"""
+    return counter.get_stats()
+
+
+def get_timeout():
+    """缓存后端仅在进程内有效时，其他进程的写操作无法使本进程的缓存失效，缩短缓存时长"""
+    if cache_backend.is_shared():
+        return settings.RESPONSE_CACHE_TIMEOUT
+    return min(settings.RESPONSE_CACHE_TIMEOUT, settings.RESPONSE_CACHE_LOCAL_TIMEOUT)
+
+
+def make_key(endpoint, dataset, request, kwargs):
+    """缓存键由接口、参数、用户、当日日期及数据集版本号组成"""
+    user = getattr(request, 'user', None)
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    params = {
+        'query': sorted(request.GET.lists()),
+        'kwargs': sorted(kwargs.items()),
+        'user': user_id,
+        'date': datetime.date.today().strftime('%Y-%m-%d')
+    }
+    digest = hashlib.md5(json.dumps(params, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return 'response_cache:{}:{}:{}'.format(endpoint, get_version(dataset), digest)
+
+
+def cached_response(endpoint, dataset):
+    """
+    缓存GET接口的响应数据
+    :param endpoint: 接口名称
+    :param dataset: 响应所依赖的数据集，写操作通过bump_version使其失效
+    """
+    def decorator(func):
+        if not cache_backend.is_shared():
+            logger.warning('response cache of {} expires in {}s as the cache backend is per process, configure a '
+                           'shared CACHE_BACKEND so that writes in other workers take effect at once'.format(
+                            endpoint, get_timeout()))
+
+        @functools.wraps(func)
+        def wrapper(view, request, *args, **kwargs):
+            key = make_key(endpoint, dataset, request, kwargs)
+            data = responses.get(key)
+            if data is not None:
+                counter.incr(endpoint, 'hit')
+                return Response(data)
+            counter.incr(endpoint, 'miss')
+            response = func(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                responses.set(key, response.data, get_timeout())
+            return response
+        return wrapper
+    return decorator
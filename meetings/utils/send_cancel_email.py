@@ -3,13 +3,11 @@ import icalendar
 import logging
 import pytz
 import re
-import smtplib
 import uuid
-from django.conf import settings
+from meetings.utils import mailer, mail_templates
 from email import encoders
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
 from meetings.models import Meeting
 
 logger = logging.getLogger('log')
@@ -25,7 +23,7 @@ def sendmail(mid):
     sponsor = meeting.sponsor
     topic = '[Cancel] ' + meeting.topic
     sig_name = meeting.group_name
-    platform = meeting.mplatform
+    platform = meeting.mplatform or ''
     platform = platform.replace('zoom', 'Zoom').replace('welink', 'WeLink')
     start_time = ' '.join([date, start])
     toaddrs = toaddrs.replace(' ', '').replace('，', ',').replace(';', ',').replace('；', ',')
@@ -45,13 +43,12 @@ def sendmail(mid):
     msg = MIMEMultipart()
 
     # 添加邮件主体
-    body_of_email = None
-    with open('templates/template_cancel_meeting.txt', 'r', encoding='utf-8') as fp:
-        body = fp.read()
-        body_of_email = body.replace('{{platform}}', platform). \
-            replace('{{start_time}}', start_time). \
-            replace('{{sig_name}}', sig_name)
-    content = MIMEText(body_of_email, 'plain', 'utf-8')
+    context = {
+        'platform': platform,
+        'start_time': start_time,
+        'sig_name': sig_name
+    }
+    _, content = mail_templates.render_body('template_cancel_meeting', context)
     msg.attach(content)
 
     # 取消日历
@@ -88,17 +85,7 @@ def sendmail(mid):
     msg['From'] = 'openEuler conference<public@openeuler.org>'
     msg['To'] = toaddrs_string
 
-    # 登录服务器发送邮件
-    try:
-        gmail_username = settings.GMAIL_USERNAME
-        server = smtplib.SMTP(settings.SMTP_SERVER_HOST, settings.SMTP_SERVER_PORT)
-        server.ehlo()
-        server.starttls()
-        server.login(settings.SMTP_SERVER_USER, settings.SMTP_SERVER_PASS)
-        server.sendmail(gmail_username, toaddrs_list, msg.as_string())
-        logger.info('email string: {}'.format(toaddrs))
-        logger.info('error addrs: {}'.format(error_addrs))
-        logger.info('email sent: {}'.format(toaddrs_string))
-        server.quit()
-    except smtplib.SMTPException as e:
-        logger.error(e)
+    # 写入发件箱，由send_outbox命令发送
+    mailer.enqueue(msg, toaddrs_list)
+    logger.info('email string: {}'.format(toaddrs))
+    logger.info('error addrs: {}'.format(error_addrs))
@@ -1,6 +1,5 @@
 import logging
-import smtplib
-from django.conf import settings
+from meetings.utils import mailer
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from .email_templates import feedback_email_template, reply_email_template
@@ -27,16 +26,6 @@ def run(feedback_type, feedback_email, feedback_content):
     reply_msg['From'] = 'openEuler MiniProgram<public@openeuler.org>'
     reply_msg['To'] = feedback_email
 
-    # 登录服务器发送邮件
-    try:
-        gmail_username = settings.GMAIL_USERNAME
-        server = smtplib.SMTP(settings.SMTP_SERVER_HOST, settings.SMTP_SERVER_PORT)
-        server.ehlo()
-        server.starttls()
-        server.login(settings.SMTP_SERVER_USER, settings.SMTP_SERVER_PASS)
-        server.sendmail(gmail_username, mailto.split(','), msg.as_string())
-        server.sendmail(gmail_username, feedback_email.split(','), reply_msg.as_string())
-        print('发送成功')
-        server.quit()
-    except smtplib.SMTPException as e:
-        logger.error(e)
+    # 写入发件箱，由send_outbox命令发送
+    mailer.enqueue(msg, mailto.split(','))
+    mailer.enqueue(reply_msg, feedback_email.split(','))
@@ -0,0 +1,77 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger('log')
+
+_counters = []
+
+
+class StatCounter:
+    """
+    命中/未命中等计数：在进程内累计，每隔STATS_FLUSH_INTERVAL批量写入缓存，进程退出时也会写入，
+    避免每次计数都读写共享缓存
+    """
+
+    def __init__(self, names_key, stat_key, stat_types):
+        """
+        :param names_key: 记录所有计数对象名称的缓存键
+        :param stat_key: 计数的缓存键，参数为名称及计数类型
+        :param stat_types: 计数类型
+        """
+        self.names_key = names_key
+        self.stat_key = stat_key
+        self.stat_types = stat_types
+        self._pending = defaultdict(int)
+        self._lock = threading.Lock()
+        self._last_flush = time.time()
+        _counters.append(self)
+
+    def incr(self, name, stat_type):
+        with self._lock:
+            self._pending[(name, stat_type)] += 1
+            now = time.time()
+            if now - self._last_flush < settings.STATS_FLUSH_INTERVAL:
+                return
+            self._last_flush = now
+        self.flush()
+
+    def flush(self):
+        """将进程内累计的计数写入缓存"""
+        with self._lock:
+            pending = dict(self._pending)
+            self._pending.clear()
+        if not pending:
+            return
+        try:
+            names = cache.get(self.names_key) or []
+            new_names = {name for name, _ in pending} - set(names)
+            if new_names:
+                cache.set(self.names_key, sorted(set(names) | new_names), None)
+            for (name, stat_type), count in pending.items():
+                key = self.stat_key.format(name, stat_type)
+                if not cache.add(key, count, None):
+                    try:
+                        cache.incr(key, count)
+                    except ValueError:
+                        cache.set(key, count, None)
+        except Exception as e:
+            logger.warning('fail to flush stats {}: {}'.format(self.names_key, e))
+
+    def get_stats(self):
+        """获取缓存中各名称的计数，不含各进程尚未写入的部分"""
+        stats = {}
+        for name in cache.get(self.names_key) or []:
+            stats[name] = {stat_type: cache.get(self.stat_key.format(name, stat_type)) or 0
+                           for stat_type in self.stat_types}
+        return stats
+
+
+@atexit.register
+def flush_all():
+    for counter in _counters:
+        counter.flush()
@@ -4,10 +4,9 @@ import hmac
 import json
 import logging
 import random
-import requests
 import time
 from django.conf import settings
-from meetings.models import Meeting
+from meetings.utils import http_client
 
 logger = logging.getLogger('log')
 
@@ -54,7 +53,7 @@ def get_records():
             'page_size': 20,
             'page': page
         }
-        r = requests.get(url, params=params, headers=headers)
+        r = http_client.get(url, params=params, headers=headers)
         if r.status_code != 200:
             logger.error(r.json())
             return []
@@ -71,7 +70,7 @@ def get_video_download(record_file_id, userid):
     uri = '/v1/addresses/{}?userid={}'.format(record_file_id, userid)
     url = get_url(uri)
     signature, headers = get_signature('GET', uri, "")
-    r = requests.get(url, headers=headers)
+    r = http_client.get(url, headers=headers)
     if r.status_code == 200:
         return r.json()['download_address']
     else:
@@ -110,7 +109,7 @@ def createMeeting(date, start, end, topic, host_id, record):
     url = get_url(uri)
     payload = json.dumps(payload)
     signature, headers = get_signature('POST', uri, payload)
-    r = requests.post(url, headers=headers, data=payload)
+    r = http_client.post(url, headers=headers, data=payload)
     resp_dict = {
         'host_id': host_id
     }
@@ -123,10 +122,7 @@ def createMeeting(date, start, end, topic, host_id, record):
     return r.status_code, resp_dict
 
 
-def cancelMeeting(mid):
-    meeting = Meeting.objects.get(mid=mid)
-    host_id = meeting.host_id
-    mmid = meeting.mmid
+def cancelMeeting(mid, mmid, host_id):
     payload = json.dumps({
         "userid": host_id,
         "instanceid": 1,
@@ -135,7 +131,7 @@ def cancelMeeting(mid):
     uri = '/v1/meetings/' + str(mmid) + '/cancel'
     url = get_url(uri)
     signature, headers = get_signature('POST', uri, payload)
-    r = requests.post(url, headers=headers, data=payload)
+    r = http_client.post(url, headers=headers, data=payload)
     if r.status_code != 200:
         logger.error('Fail to cancel meeting {}'.format(mid))
         logger.error(r.json())
@@ -144,12 +140,9 @@ def cancelMeeting(mid):
     return r.status_code
 
 
-def getParticipants(mid):
-    meeting = Meeting.objects.get(mid=mid)
-    mmid = meeting.mmid
-    host_id = meeting.host_id
+def getParticipants(mmid, host_id):
     uri = '/v1/meetings/{}/participants?userid={}'.format(mmid, host_id)
     url = get_url(uri)
     signature, headers = get_signature('GET', uri, "")
-    r = requests.get(url, headers=headers)
+    r = http_client.get(url, headers=headers)
     return r.status_code, r.json()
\ No newline at end of file
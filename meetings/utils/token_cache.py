@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from meetings.utils import cache_backend
+from meetings.utils.stat_counter import StatCounter
+
+logger = logging.getLogger('log')
+
+STAT_TYPES = ('hit', 'miss', 'refresh', 'error')
+TOKEN_KEY = 'token_cache:{}:{}'
+LOCK_KEY = 'token_cache:lock:{}:{}'
+STAT_KEY = 'token_cache:stats:{}:{}'
+NAMES_KEY = 'token_cache:names'
+# 跨进程刷新锁的超时时长及等待其他进程刷新时的轮询间隔
+LOCK_TIMEOUT = 10
+POLL_INTERVAL = 0.2
+
+
+counter = StatCounter(NAMES_KEY, STAT_KEY, STAT_TYPES)
+
+
+def get_stats():
+    """获取各令牌缓存的命中/未命中/刷新/失败次数"""
+    return counter.get_stats()
+
+
+class TokenCache:
+    """
+    令牌缓存：进程内与共享缓存两级存储，按令牌到期时间失效；
+    临近到期时在后台线程中刷新，未命中时同一令牌在所有进程中仅有一个请求拉取
+    """
+
+    def __init__(self, name, fetch, refresh_ahead=None):
+        """
+        :param name: 令牌名称
+        :param fetch: 拉取函数，参数为key，返回(token, expires_in)，失败时token为空
+        :param refresh_ahead: 到期前多少秒开始后台刷新
+        """
+        self.name = name
+        self.fetch = fetch
+        self.refresh_ahead = settings.TOKEN_REFRESH_AHEAD if refresh_ahead is None else refresh_ahead
+        self._local = {}
+        self._locks = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        if not cache_backend.is_shared():
+            logger.warning('token {} is cached per process, configure a shared CACHE_BACKEND so that workers '
+                           'do not fetch and invalidate each other\'s tokens'.format(name))
+
+    def get(self, key=''):
+        """获取令牌，失败时返回空字符串"""
+        now = time.time()
+        entry = self._local.get(key)
+        if not entry or entry[1] <= now:
+            entry = cache.get(TOKEN_KEY.format(self.name, key))
+            if entry:
+                self._local[key] = entry = tuple(entry)
+        if entry and entry[1] > now:
+            self._record('hit')
+            if entry[1] - now <= self.refresh_ahead:
+                self._refresh_in_background(key)
+            return entry[0]
+        self._record('miss')
+        return self._refresh(key, wait=True)
+
+    def invalidate(self, key='', token=None):
+        """
+        令牌被服务端判定失效时清除缓存
+        :param token: 被拒绝的令牌，缓存中的令牌已被其他进程更新时不再清除
+        """
+        local = self._local.get(key)
+        if token is None or (local and local[0] == token):
+            self._local.pop(key, None)
+        entry = cache.get(TOKEN_KEY.format(self.name, key))
+        if entry and (token is None or entry[0] == token):
+            cache.delete(TOKEN_KEY.format(self.name, key))
+
+    def _record(self, stat_type):
+        counter.incr(self.name, stat_type)
+
+    def _get_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _fresh_entry(self, key):
+        """返回共享缓存中未进入提前刷新窗口的令牌"""
+        entry = cache.get(TOKEN_KEY.format(self.name, key))
+        if entry and entry[1] - time.time() > self.refresh_ahead:
+            self._local[key] = entry = tuple(entry)
+            return entry
+        return None
+
+    def _refresh_in_background(self, key):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self._refresh(key, wait=False)
+            except Exception as e:
+                logger.error('fail to refresh token {} in background: {}'.format(self.name, e))
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _refresh(self, key, wait):
+        """
+        拉取新令牌
+        :param wait: 其他进程正在刷新时是否等待其结果，后台刷新时不等待
+        """
+        with self._get_lock(key):
+            entry = self._fresh_entry(key)
+            if entry:
+                return entry[0]
+            lock_key = LOCK_KEY.format(self.name, key)
+            locked = cache.add(lock_key, 1, LOCK_TIMEOUT)
+            if not locked:
+                if not wait:
+                    return ''
+                deadline = time.time() + LOCK_TIMEOUT
+                while time.time() < deadline:
+                    time.sleep(POLL_INTERVAL)
+                    entry = self._fresh_entry(key)
+                    if entry:
+                        return entry[0]
+                logger.warning('wait for token {} refresh timeout, fetch it directly'.format(self.name))
+            try:
+                token, expires_in = self.fetch(key)
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+            if not token:
+                self._record('error')
+                entry = self._local.get(key)
+                return entry[0] if entry and entry[1] > time.time() else ''
+            entry = (token, time.time() + expires_in)
+            cache.set(TOKEN_KEY.format(self.name, key), entry, expires_in)
+            self._local[key] = entry
+            self._record('refresh')
+            logger.info('token {} refreshed, expires in {}s'.format(self.name, expires_in))
+            return token
@@ -1,22 +1,20 @@
 import datetime
 import logging
 import json
-import os
-import requests
-import subprocess
 import time
 from django.conf import settings
-from meetings.models import Meeting
+from meetings.utils.token_cache import TokenCache
+from meetings.utils import http_client
 
 logger = logging.getLogger('log')
 
 
-def createProxyToken(host_id):
-    """获取代理鉴权token"""
+def fetchProxyToken(host_id):
+    """登录获取代理鉴权token及其有效期"""
     host_dict = settings.WELINK_HOSTS
     if host_id not in host_dict.keys():
         logger.error('host_id {} is invalid'.format(host_id))
-        return None
+        return None, 0
     account = host_dict[host_id]['account']
     pwd = host_dict[host_id]['pwd']
     url = 'https://api.meeting.huaweicloud.com/v1/usg/acs/auth/proxy'
@@ -30,23 +28,45 @@ def createProxyToken(host_id):
         'account': account,
         'pwd': pwd
     }
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
+    response = http_client.post(url, headers=headers, data=json.dumps(payload))
     if response.status_code != 200:
         logger.error('Fail to get proxy token, status_code: {}'.format(response.status_code))
-        return None
-    return response.json()['accessToken']
+        return None, 0
+    return response.json()['accessToken'], int(response.json().get('validPeriod') or settings.WELINK_TOKEN_TTL)
+
+
+token_cache = TokenCache('welink', fetchProxyToken)
+
+
+def createProxyToken(host_id):
+    """获取代理鉴权token，按host缓存，临近过期时后台刷新"""
+    return token_cache.get(host_id) or None
+
+
+def request(method, url, host_id, headers=None, **kwargs):
+    """
+    携带host的代理鉴权token发送请求，token被服务端拒绝(401)时清除缓存中的该token并重新获取，重试一次
+    """
+    token = createProxyToken(host_id)
+    headers = headers or {}
+    response = http_client.request(method, url, headers=dict(headers, **{'X-Access-Token': token}), **kwargs)
+    if response.status_code == 401:
+        logger.warning('welink token of {} rejected by {}, fetch a new one'.format(
+            host_id, http_client.normalize_endpoint(method, url)))
+        token_cache.invalidate(host_id, token=token)
+        token = createProxyToken(host_id)
+        response = http_client.request(method, url, headers=dict(headers, **{'X-Access-Token': token}), **kwargs)
+    return response
 
 
 def createMeeting(date, start, end, topic, host, record):
     """预定会议"""
-    access_token = createProxyToken(host)
     startTime = (datetime.datetime.strptime(date + start, '%Y-%m-%d%H:%M') - datetime.timedelta(hours=8)).strftime(
         '%Y-%m-%d %H:%M')
     length = int((datetime.datetime.strptime(end, '%H:%M') - datetime.datetime.strptime(start, '%H:%M')).seconds / 60)
     url = 'https://api.meeting.huaweicloud.com/v1/mmc/management/conferences'
     headers = {
-        'Content-Type': 'application/json',
-        'X-Access-Token': access_token
+        'Content-Type': 'application/json'
     }
     data = {
         'startTime': startTime,
@@ -63,7 +83,7 @@ def createMeeting(date, start, end, topic, host, record):
     if record == 'cloud':
         data['isAutoRecord'] = 1
         data['recordType'] = 2
-    response = requests.post(url, headers=headers, data=json.dumps(data))
+    response = request('POST', url, host, headers=headers, data=json.dumps(data))
     resp_dict = {}
     if response.status_code != 200:
         logger.error('Fail to create meeting, status_code is {}'.format(response.status_code))
@@ -77,16 +97,12 @@ def createMeeting(date, start, end, topic, host, record):
 
 def cancelMeeting(mid, host_id):
     """取消会议"""
-    access_token = createProxyToken(host_id)
     url = 'https://api.meeting.huaweicloud.com/v1/mmc/management/conferences'
-    headers = {
-        'X-Access-Token': access_token
-    }
     params = {
         'conferenceID': mid,
         'type': 1
     }
-    response = requests.delete(url, headers=headers, params=params)
+    response = request('DELETE', url, host_id, params=params)
     if response.status_code != 200:
         logger.error('Fail to cancel meeting {}'.format(mid))
         logger.error(response.json())
@@ -97,20 +113,16 @@ def cancelMeeting(mid, host_id):
 
 def listHisMeetings(host_id):
     """获取历史会议列表"""
-    access_token = createProxyToken(host_id)
     tn = int(time.time())
     endDate = tn * 1000
     startDate = (tn - 3600 * 24) * 1000
     url = 'https://api.meeting.huaweicloud.com/v1/mmc/management/conferences/history'
-    headers = {
-        'X-Access-Token': access_token
-    }
     params = {
         'startDate': startDate,
         'endDate': endDate,
         'limit': 500
     }
-    response = requests.get(url, headers=headers, params=params)
+    response = request('GET', url, host_id, params=params)
     if response.status_code != 200:
         logger.error('Fail to get history meetings list')
         logger.error(response.json())
@@ -118,14 +130,8 @@ def listHisMeetings(host_id):
     return response.json()
 
 
-def getParticipants(mid):
+def getParticipants(mid, host_id):
     """获取会议参会者"""
-    meeting = Meeting.objects.get(mid=mid)
-    host_id = meeting.host_id
-    access_token = createProxyToken(host_id)
-    headers = {
-        'X-Access-Token': access_token
-    }
     url = 'https://api.meeting.huaweicloud.com/v1/mmc/management/conferences/history/confAttendeeRecord'
     meetings_lst = listHisMeetings(host_id)
     meetings_data = meetings_lst.get('data')
@@ -141,7 +147,7 @@ def getParticipants(mid):
                 'confUUID': conf_uuid,
                 'limit': 500
             }
-            response = requests.get(url, headers=headers, params=params)
+            response = request('GET', url, host_id, params=params)
             if response.status_code == 200:
                 participants['total_records'] += response.json()['count']
                 for participant_info in response.json()['data']:
@@ -155,41 +161,47 @@ def getParticipants(mid):
 
 def listRecordings(host_id):
     """获取录像列表"""
-    access_token = createProxyToken(host_id)
     tn = int(time.time())
     endDate = tn * 1000
     startDate = (tn - 3600 * 24) * 1000
     url = 'https://api.meeting.huaweicloud.com/v1/mmc/management/record/files'
-    headers = {
-        'X-Access-Token': access_token
-    }
     params = {
         'startDate': startDate,
         'endDate': endDate,
         'limit': 100
     }
-    response = requests.get(url, headers=headers, params=params)
+    response = request('GET', url, host_id, params=params)
     return response.status_code, response.json()
 
 
+def getAvailableRecordings(mid, host_id, start_time, end_time):
+    """获取会议时段内的录像，按录像开始时间排序"""
+    status, recordings = listRecordings(host_id)
+    if status != 200:
+        logger.info('Fail to get welink recordings')
+        return []
+    if recordings['count'] == 0:
+        return []
+    available_recordings = []
+    for recording in recordings['data']:
+        if recording['confID'] != mid:
+            continue
+        startTime = (datetime.datetime.strptime(recording['startTime'], '%Y-%m-%d %H:%M') +
+                     datetime.timedelta(hours=8)).strftime('%Y-%m-%d %H:%M')
+        endTime = (datetime.datetime.strptime(startTime, '%Y-%m-%d %H:%M') +
+                   datetime.timedelta(seconds=recording['rcdTime'])).strftime('%Y-%m-%d %H:%M')
+        if endTime < start_time or startTime > end_time:
+            continue
+        available_recordings.append((startTime, recording))
+    available_recordings.sort(key=lambda x: x[0])
+    return [recording for _, recording in available_recordings]
+
+
 def getDetailDownloadUrl(confUUID, host_id):
     """获取录像下载地址"""
-    access_token = createProxyToken(host_id)
     url = 'https://api.meeting.huaweicloud.com/v1/mmc/management/record/downloadurls'
-    headers = {
-        'X-Access-Token': access_token
-    }
     params = {
         'confUUID': confUUID
     }
-    response = requests.get(url, headers=headers, params=params)
+    response = request('GET', url, host_id, params=params)
     return response.status_code, response.json()
-
-
-def downloadHWCloudRecording(token, target_filename, download_url):
-    """下载云录制的视频"""
-    if os.path.exists(target_filename):
-        os.remove(target_filename)
-    cmd = 'wget --header="Authorization: {}" -O {} {}'.format(token, target_filename, download_url)
-    subprocess.call(cmd.split())
-
@@ -1,14 +1,15 @@
 import json
 import logging
-import requests
 import sys
 from django.conf import settings
+from meetings.utils.token_cache import TokenCache
+from meetings.utils import http_client
 
 logger = logging.getLogger('log')
 
 
-def get_token():
-    """获取微信小程序token"""
+def fetch_token(key=''):
+    """拉取微信小程序token"""
     appid = settings.APP_CONF['appid']
     secret = settings.APP_CONF['secret']
     url = settings.DEFAULT_CONF.get('WX_AUTH_URL')
@@ -17,14 +18,44 @@ def get_token():
         'secret': secret,
         'grant_type': 'client_credential'
     }
-    r = requests.get(url, params=params)
-    if r.status_code != 200:
+    r = http_client.get(url, params=params)
+    if r.status_code != 200 or 'access_token' not in r.json():
         logger.error('fail to get wx access_token')
         logger.error('status_code: {}'.format(r.status_code))
         logger.error('content: {}'.format(r.json()))
-        return ''
-    access_token = r.json().get('access_token')
-    return access_token
+        return '', 0
+    return r.json()['access_token'], int(r.json().get('expires_in', 7200))
+
+
+token_cache = TokenCache('wx', fetch_token)
+# access_token无效或已过期时微信返回的错误码
+TOKEN_ERRCODES = (40001, 42001)
+
+
+def get_token():
+    """获取微信小程序token，各worker及管理命令共享缓存，临近过期时加锁刷新"""
+    return token_cache.get()
+
+
+def token_rejected(r):
+    """微信是否因access_token无效(40001)或已过期(42001)拒绝了请求"""
+    if not r.content.lstrip().startswith(b'{'):
+        return False
+    try:
+        return r.json().get('errcode') in TOKEN_ERRCODES
+    except ValueError:
+        return False
+
+
+def post_with_token(url, data):
+    """携带access_token发送POST请求，token被拒绝时清除缓存并重新获取后重试一次"""
+    access_token = get_token()
+    r = http_client.post(url, params={'access_token': access_token}, data=data)
+    if token_rejected(r):
+        logger.warning('wx access_token rejected: {}, fetch a new one'.format(r.json().get('errcode')))
+        token_cache.invalidate(token=access_token)
+        r = http_client.post(url, params={'access_token': get_token()}, data=data)
+    return r
 
 
 def get_openid(code):
@@ -36,32 +67,24 @@ def get_openid(code):
         'js_code': code,
         'grant_type': 'authorization_code'
     }
-    r = requests.get(url, params=params)
+    r = http_client.get(url, params=params)
     return r.json()
 
 
-def send_subscription(content, access_token):
+def send_subscription(content):
     """发送订阅消息"""
     url = settings.DEFAULT_CONF.get('WX_SEND_SUBSCRIPTION_URL')
-    params = {
-        'access_token': access_token
-    }
-    r = requests.get(url, params=params)
-    return r.json()
+    return post_with_token(url, json.dumps(content))
 
 
 def gene_code_img(activity_id):
     """生成二维码"""
-    access_token = get_token()
     url = settings.DEFAULT_CONF.get('WX_GENE_CODE_URL')
-    params = {
-        'access_token': access_token
-    }
     data = {
         'scene': activity_id,
         'page': 'package-events/events/event-detail'
     }
-    res = requests.post(url, params=params, data=json.dumps(data))
+    res = post_with_token(url, json.dumps(data))
     if res.status_code != 200:
         logger.error('{}, fail to get QR code'.format(res.status_code))
         sys.exit(1)
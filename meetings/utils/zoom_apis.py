@@ -2,9 +2,12 @@ import datetime
 import logging
 import json
 import random
-import requests
+import time
+from email.utils import parsedate_to_datetime
 from django.conf import settings
 from obs import ObsClient
+from meetings.utils.token_cache import TokenCache
+from meetings.utils import http_client
 
 logger = logging.getLogger('log')
 
@@ -17,10 +20,8 @@ def createMeeting(date, start, end, topic, host, record):
     duration = int((datetime.datetime.strptime(end_time, '%Y-%m-%dT%H:%M:%SZ') -
                     datetime.datetime.strptime(start_time, '%Y-%m-%dT%H:%M:%SZ')).seconds / 60)
     password = str(random.randint(100000, 999999))
-    token = getOauthToken()
     headers = {
-        "content-type": "application/json",
-        "authorization": "Bearer {}".format(token)
+        "content-type": "application/json"
     }
     payload = {
         'start_time': start_time,
@@ -35,7 +36,7 @@ def createMeeting(date, start, end, topic, host, record):
         }
     }
     url = "https://api.zoom.us/v2/users/{}/meetings".format(host)
-    response = requests.post(url, data=json.dumps(payload), headers=headers)
+    response = request('POST', url, data=json.dumps(payload), headers=headers)
     resp_dict = {}
     if response.status_code != 201:
         return response.status_code, resp_dict
@@ -48,20 +49,13 @@ def createMeeting(date, start, end, topic, host, record):
 
 def cancelMeeting(mid):
     url = "https://api.zoom.us/v2/meetings/{}".format(mid)
-    token = getOauthToken()
-    headers = {
-        "authorization": "Bearer {}".format(token)
-    }
-    response = requests.request("DELETE", url, headers=headers)
+    response = request("DELETE", url)
     return response.status_code
 
 
 def getParticipants(mid):
     url = "https://api.zoom.us/v2/past_meetings/{}/participants?page_size=300".format(mid)
-    token = getOauthToken()
-    headers = {
-        "authorization": "Bearer {}".format(token)}
-    r = requests.get(url, headers=headers)
+    r = request('GET', url)
     if r.status_code == 200:
         total_records = r.json()['total_records']
         participants = r.json()['participants']
@@ -71,7 +65,64 @@ def getParticipants(mid):
         return r.status_code, r.json()
 
 
-def getOauthToken():
+def getRecordings(mid, host_id):
+    """
+    查询host近7天的录像，返回该会议最大的一条录像记录
+    :return: the json-encoded content of a response or none
+    """
+    url = "https://api.zoom.us/v2/users/{}/recordings".format(host_id)
+    params = {
+        'from': (datetime.datetime.now() - datetime.timedelta(days=7)).strftime("%Y-%m-%d"),
+        'page_size': 50
+    }
+    response = request('GET', url, params=params)
+    if response.status_code != 200:
+        logger.error('get recordings: {} {}'.format(response.status_code, response.json()['message']))
+        return
+    records = [x for x in response.json()['meetings'] if x['id'] == int(mid)]
+    if not records:
+        logger.info('meeting {}: no recordings yet'.format(mid))
+        return
+    return max(records, key=lambda x: x['total_size'])
+
+
+def request(method, url, headers=None, **kwargs):
+    """
+    携带Zoom令牌发送请求，令牌被Zoom拒绝(401)时清除缓存中的该令牌并重新获取，重试一次
+    """
+    token = getOauthToken()
+    headers = headers or {}
+    response = http_client.request(method, url, headers=dict(headers, authorization="Bearer {}".format(token)),
+                                   **kwargs)
+    if response.status_code == 401:
+        logger.warning('zoom token rejected by {}, fetch a new one'.format(
+            http_client.normalize_endpoint(method, url)))
+        token_cache.invalidate(token=token)
+        token = getOauthToken()
+        response = http_client.request(method, url, headers=dict(headers, authorization="Bearer {}".format(token)),
+                                       **kwargs)
+    return response
+
+
+def token_lifetime(headers, expires_in):
+    """
+    令牌的剩余有效期，有效期自令牌写入OBS时(对象的Last-Modified)起算，而非读取时
+    :param headers: 对象元数据的响应头
+    :param expires_in: 令牌的有效期
+    """
+    last_modified = headers.get('last-modified')
+    if not last_modified:
+        return expires_in
+    try:
+        issued_at = parsedate_to_datetime(last_modified).timestamp()
+    except (TypeError, ValueError):
+        logger.warning('Invalid Last-Modified of zoom token: {}'.format(last_modified))
+        return expires_in
+    return max(0, int(issued_at + expires_in - time.time()))
+
+
+def fetchOauthToken(key=''):
+    """从OBS对象元数据中读取Zoom令牌，返回令牌及其剩余有效期"""
     access_key_id = settings.DEFAULT_CONF.get('ACCESS_KEY_ID_2')
     secret_access_key = settings.DEFAULT_CONF.get('SECRET_ACCESS_KEY_2')
     endpoint = settings.DEFAULT_CONF.get('OBS_ENDPOINT_2')
@@ -80,12 +131,24 @@ def getOauthToken():
     obs_client = ObsClient(access_key_id=access_key_id, secret_access_key=secret_access_key, server=endpoint)
     res = obs_client.getObjectMetadata(bucketName, object_key)
     token = ''
+    expires_in = settings.ZOOM_TOKEN_TTL
     if res.get('status') != 200:
         logger.error('Fail to get zoom token')
-        return token
-    for k, v in res.get('header'):
-        if k == 'access_token':
-            token = v
-            break
+        return token, expires_in
+    headers = {str(k).lower(): v for k, v in res.get('header')}
+    token = headers.get('access_token', '')
+    if str(headers.get('expires_in')).isdigit():
+        expires_in = int(headers['expires_in'])
+    expires_in = token_lifetime(headers, expires_in)
+    if token and not expires_in:
+        # 写入令牌的任务未按时更新，令牌仍返回给调用方，不进入缓存，下次调用时重新读取
+        logger.warning('Zoom token in OBS has expired')
     logger.info('Get zoom token successfully')
-    return token
+    return token, expires_in
+
+
+token_cache = TokenCache('zoom', fetchOauthToken)
+
+
+def getOauthToken():
+    return token_cache.get()
@@ -1,20 +1,18 @@
 import datetime
 import json
-import random
 import re
 import logging
-import time
 from django.conf import settings
 from django.db.models import Q
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework import status
 from rest_framework.filters import SearchFilter
 from rest_framework.generics import GenericAPIView
 from rest_framework.mixins import ListModelMixin, CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, \
     UpdateModelMixin
 from rest_framework_simplejwt import authentication
-from meetings.models import User, Group, Meeting, GroupUser, Collect, Video, Record, Activity, ActivityCollect, \
-    Feedback
+from meetings.models import User, Group, Meeting, GroupUser, Collect, Activity, ActivityCollect, \
+    Feedback, MeetingJob
 from meetings.permissions import MaintainerPermission, AdminPermission, ActivityAdminPermission, SponsorPermission, \
         QueryPermission
 from meetings.serializers import LoginSerializer, GroupsSerializer, MeetingSerializer, UsersSerializer, \
@@ -22,14 +20,15 @@ from meetings.serializers import LoginSerializer, GroupsSerializer, MeetingSeria
     MeetingListSerializer, GroupUserDelSerializer, UserInfoSerializer, SigsSerializer, MeetingsDataSerializer, \
     AllMeetingsSerializer, CollectSerializer, SponsorSerializer, SponsorInfoSerializer, ActivitySerializer, \
     ActivitiesSerializer, ActivityDraftUpdateSerializer, ActivityUpdateSerializer,  ActivityCollectSerializer, \
-    FeedbackSerializer, ActivityRetrieveSerializer
+    FeedbackSerializer, ActivityRetrieveSerializer, ActivityRegistrantsSerializer
 from rest_framework.response import Response
-from multiprocessing import Process
-from meetings.send_email import sendmail
 from rest_framework import permissions
-from meetings.utils import gene_wx_code, send_feedback, drivers, wx_apis
+from meetings.utils import gene_wx_code, send_feedback, drivers, wx_apis, calendar_data, registrants, provision, \
+    notify
+from meetings.utils.response_cache import cached_response, bump_version, MEETINGS, ACTIVITIES
 from rest_framework_simplejwt.tokens import RefreshToken
 from meetings.auth import CustomAuthentication
+from meetings.pagination import KeysetPagination
 
 logger = logging.getLogger('log')
 offline = 1
@@ -92,6 +91,8 @@ class UsersIncludeView(GenericAPIView, ListModelMixin):
     search_fields = ['nickname']
     authentication_classes = (authentication.JWTAuthentication,)
     permission_classes = (AdminPermission,)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('nickname', 'id')
 
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
@@ -114,6 +115,8 @@ class UsersExcludeView(GenericAPIView, ListModelMixin):
     search_fields = ['nickname']
     authentication_classes = (authentication.JWTAuthentication,)
     permission_classes = (AdminPermission,)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('nickname', 'id')
 
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
@@ -212,13 +215,25 @@ class GroupUserDelView(GenericAPIView, CreateModelMixin):
         return JsonResponse({'code': 204, 'msg': '删除成功', 'access': access})
 
 
-class MeetingsWeeklyView(GenericAPIView, ListModelMixin):
+class MeetingListMixin:
+    """为MeetingListSerializer批量预取当前用户的收藏及B站播放地址"""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        user = getattr(self.request, 'user', None)
+        return MeetingListSerializer.annotate_queryset(queryset, user)
+
+
+class MeetingsWeeklyView(MeetingListMixin, GenericAPIView, ListModelMixin):
     """查询前后一周的所有会议"""
     serializer_class = MeetingListSerializer
     queryset = Meeting.objects.filter(is_delete=0)
     filter_backends = [SearchFilter]
     search_fields = ['topic', 'group_name']
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-date', 'start', 'id')
 
+    @cached_response('meetings_weekly', MEETINGS)
     def get(self, request, *args, **kwargs):
         self.queryset = self.queryset.filter((Q(
             date__gte=str(datetime.datetime.now() - datetime.timedelta(days=7))[:10]) & Q(
@@ -226,28 +241,34 @@ class MeetingsWeeklyView(GenericAPIView, ListModelMixin):
         return self.list(request, *args, **kwargs)
 
 
-class MeetingsDailyView(GenericAPIView, ListModelMixin):
+class MeetingsDailyView(MeetingListMixin, GenericAPIView, ListModelMixin):
     """查询本日的所有会议"""
     serializer_class = MeetingListSerializer
     queryset = Meeting.objects.filter(is_delete=0)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('start', 'id')
 
+    @cached_response('meetings_daily', MEETINGS)
     def get(self, request, *args, **kwargs):
         self.queryset = self.queryset.filter(date=str(datetime.datetime.now())[:10]).order_by('start')
         return self.list(request, *args, **kwargs)
 
 
-class MeetingsRecentlyView(GenericAPIView, ListModelMixin):
+class MeetingsRecentlyView(MeetingListMixin, GenericAPIView, ListModelMixin):
     """查询最近的会议"""
     serializer_class = MeetingListSerializer
     queryset = Meeting.objects.filter(is_delete=0)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('date', 'start', 'id')
 
+    @cached_response('meetings_recently', MEETINGS)
     def get(self, request, *args, **kwargs):
         self.queryset = self.queryset.filter(date__gte=datetime.datetime.now().strftime('%Y-%m-%d')).\
             order_by('date', 'start')
         return self.list(request, *args, **kwargs)
 
 
-class MeetingView(GenericAPIView, RetrieveModelMixin):
+class MeetingView(MeetingListMixin, GenericAPIView, RetrieveModelMixin):
     """查询会议(id)"""
     serializer_class = MeetingListSerializer
     queryset = Meeting.objects.filter(is_delete=0)
@@ -266,21 +287,26 @@ class MeetingDelView(GenericAPIView, DestroyModelMixin):
     def delete(self, request, *args, **kwargs):
         access = refresh_access(self.request.user)
         mid = kwargs.get('mid')
-        if not Meeting.objects.filter(mid=mid):
+        meeting = Meeting.objects.filter(mid=mid).first()
+        if not meeting:
             resp = JsonResponse({'code': 404, 'msg': 'Not Found', 'access': access})
             resp.status_code = 404
             return resp
-        if not (Meeting.objects.filter(mid=mid, user_id=self.request.user.id) or User.objects.filter(
-                id=self.request.user.id, level=3)):
+        if not (meeting.user_id == self.request.user.id or User.objects.filter(id=self.request.user.id, level=3)):
             resp = JsonResponse({'code': 401, 'msg': 'Unauthorized', 'access': access})
             resp.status_code = 401
             return resp
 
-        drivers.cancelMeeting(mid)
+        driver = drivers.find_driver(meeting.mplatform)
+        if driver:
+            driver.cancel(meeting)
+        else:
+            # 平台为空或已不再支持的会议无法在平台上取消，仍删除本地记录
+            logger.warning('meeting {}: unknown platform {}, skip cancelling'.format(mid, meeting.mplatform))
 
         # 会议作软删除
-        meeting = Meeting.objects.get(mid=mid)
         Meeting.objects.filter(mid=mid).update(is_delete=1)
+        bump_version(MEETINGS)
         meeting_id = meeting.id
         mid = meeting.mid
         logger.info('{} has canceled the meeting which mid was {}'.format(request.user.gitee_name, mid))
@@ -289,33 +315,16 @@ class MeetingDelView(GenericAPIView, DestroyModelMixin):
         from meetings.utils.send_cancel_email import sendmail
         sendmail(mid)
 
-        # 发送会议取消通知
+        # 发送会议取消通知，由线程池在后台发送，不阻塞响应
         collections = Collect.objects.filter(meeting_id=meeting_id)
-        if collections:
-            access_token = wx_apis.get_token()
-            topic = meeting.topic
-            date = meeting.date
-            start_time = meeting.start
-            time = date + ' ' + start_time
-            for collection in collections:
-                user_id = collection.user_id
-                user = User.objects.get(id=user_id)
-                nickname = user.nickname
-                openid = user.openid
-                content = wx_apis.get_remove_template(openid, topic, time, mid)
-                r = wx_apis.send_subscription(content, access_token)
-                if r.status_code != 200:
-                    logger.error('status code: {}'.format(r.status_code))
-                    logger.error('content: {}'.format(r.json()))
-                else:
-                    if r.json()['errcode'] != 0:
-                        logger.warning('Error Code: {}'.format(r.json()['errcode']))
-                        logger.warning('Error Msg: {}'.format(r.json()['errmsg']))
-                        logger.warning('receiver: {}'.format(nickname))
-                    else:
-                        logger.info('meeting {} cancel message sent to {}.'.format(mid, nickname))
-                # 删除收藏
-                collection.delete()
+        receivers = notify.get_receivers(collections.values_list('user_id', flat=True))
+        if receivers:
+            time = meeting.date + ' ' + meeting.start
+            notify.dispatch([(nickname, wx_apis.get_remove_template(openid, meeting.topic, time, mid))
+                             for nickname, openid in receivers])
+            logger.info('meeting {} cancel message dispatched to {} receivers.'.format(mid, len(receivers)))
+        # 删除收藏
+        collections.delete()
         return JsonResponse({"code": 204, "message": "Delete successfully.", "access": access})
 
 
@@ -337,47 +346,14 @@ class UserInfoView(GenericAPIView, RetrieveModelMixin):
 class MeetingsDataView(GenericAPIView, ListModelMixin):
     """网页日历数据"""
     serializer_class = MeetingsDataSerializer
-    queryset = Meeting.objects.filter(is_delete=0).order_by('start')
+    queryset = Meeting.objects.filter(is_delete=0).order_by('date', 'start')
 
+    @cached_response('meetingsdata', MEETINGS)
     def get(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset()).filter(
             date__gte=(datetime.datetime.now() - datetime.timedelta(days=180)).strftime('%Y-%m-%d'),
-            date__lte=(datetime.datetime.now() + datetime.timedelta(days=30)).strftime('%Y-%m-%d')).values()
-        tableData = []
-        date_list = []
-        for query in queryset:
-            date_list.append(query.get('date'))
-        date_list = sorted(list(set(date_list)))
-        records = Record.objects.all().values()
-        record_dict = {}
-        for record in records:
-            if record['platform'] == 'bilibili' and record['url']:
-                record_dict[record['mid']] = record['url']
-        for date in date_list:
-            timeData = []
-            for meeting in queryset:
-                if meeting['date'] != date:
-                    continue
-                timeData.append({
-                    'id': meeting['id'],
-                    'group_name': meeting['group_name'],
-                    'startTime': meeting['start'],
-                    'endTime': meeting['end'],
-                    'duration_time': meeting['start'] + '-' + meeting['end'],
-                    'name': meeting['topic'],
-                    'creator': meeting['sponsor'],
-                    'detail': meeting['agenda'],
-                    'join_url': meeting['join_url'],
-                    'meeting_id': meeting['mid'],
-                    'etherpad': meeting['etherpad'],
-                    'platform': meeting['mplatform'],
-                    'video_url': record_dict.get(meeting['mid'], '')
-                })
-            tableData.append({
-                'date': date,
-                'timeData': timeData
-            })
-        return Response({'tableData': tableData})
+            date__lte=(datetime.datetime.now() + datetime.timedelta(days=30)).strftime('%Y-%m-%d'))
+        return Response({'tableData': calendar_data.build_meetings_table(queryset)})
 
 
 class SigMeetingsDataView(GenericAPIView, ListModelMixin):
@@ -385,46 +361,13 @@ class SigMeetingsDataView(GenericAPIView, ListModelMixin):
     serializer_class = MeetingsDataSerializer
     queryset = Meeting.objects.filter(is_delete=0).order_by('date', 'start')
 
+    @cached_response('sigmeetingsdata', MEETINGS)
     def get(self, request, *args, **kwargs):
         group_name = kwargs.get('gn')
         queryset = self.filter_queryset(self.get_queryset()).filter(group_name=group_name).filter((Q(
             date__gte=str(datetime.datetime.now() - datetime.timedelta(days=180))[:10]) & Q(
-            date__lte=str(datetime.datetime.now() + datetime.timedelta(days=30))[:10]))).values()
-        tableData = []
-        date_list = []
-        for query in queryset:
-            date_list.append(query.get('date'))
-        date_list = sorted(list(set(date_list)))
-        records = Record.objects.all().values()
-        record_dict = {}
-        for record in records:
-            if record['platform'] == 'bilibili' and record['url']:
-                record_dict[record['mid']] = record['url']
-        for date in date_list:
-            timeData = []
-            for meeting in queryset:
-                if meeting['date'] != date:
-                    continue
-                timeData.append({
-                    'id': meeting['id'],
-                    'group_name': meeting['group_name'],
-                    'startTime': meeting['start'],
-                    'endTime': meeting['end'],
-                    'duration_time': meeting['start'] + '-' + meeting['end'],
-                    'name': meeting['topic'],
-                    'creator': meeting['sponsor'],
-                    'detail': meeting['agenda'],
-                    'join_url': meeting['join_url'],
-                    'meeting_id': meeting['mid'],
-                    'etherpad': meeting['etherpad'],
-                    'platform': meeting['mplatform'],
-                    'video_url': record_dict.get(meeting['mid'], '')
-                })
-            tableData.append({
-                'date': date,
-                'timeData': timeData
-            })
-        return Response({'tableData': tableData})
+            date__lte=str(datetime.datetime.now() + datetime.timedelta(days=30))[:10])))
+        return Response({'tableData': calendar_data.build_meetings_table(queryset)})
 
 
 class MeetingsView(GenericAPIView, CreateModelMixin):
@@ -435,145 +378,87 @@ class MeetingsView(GenericAPIView, CreateModelMixin):
     permission_classes = (MaintainerPermission,)
 
     def post(self, request, *args, **kwargs):
-        t1 = time.time()
         access = refresh_access(self.request.user)
         # 获取data
         data = self.request.data
         try:
             platform = data['platform'] if 'platform' in data else 'zoom'
             platform = platform.lower()
-            host_dict = settings.MEETING_HOSTS[platform]
-            date = data['date']
-            start = data['start']
-            end = data['end']
-            topic = data['topic']
-            sponsor = data['sponsor']
-            sig_name = data['group_name']
-            community = data['community'] if 'community' in data else 'openeuler'
-            emaillist = data['emaillist'] if 'emaillist' in data else ''
-            summary = data['agenda'] if 'agenda' in data else ''
-            user_id = request.user.id
-            group_id = data['group_id']
-            record = data['record'] if 'record' in data else ''
-            etherpad = data['etherpad']
+            if platform not in settings.MEETING_HOSTS:
+                raise KeyError(platform)
+            params = {
+                'platform': platform,
+                'date': data['date'],
+                'start': data['start'],
+                'end': data['end'],
+                'topic': data['topic'],
+                'sponsor': data['sponsor'],
+                'group_name': data['group_name'],
+                'community': data['community'] if 'community' in data else 'openeuler',
+                'emaillist': data['emaillist'] if 'emaillist' in data else '',
+                'agenda': data['agenda'] if 'agenda' in data else '',
+                'user_id': request.user.id,
+                'group_id': data['group_id'],
+                'record': data['record'] if 'record' in data else '',
+                'etherpad': data['etherpad']
+            }
         except KeyError:
             return JsonResponse({'code': 400, 'msg': 'Bad Request', 'access': access})
-        start_time = ' '.join([date, start])
+        start_time = ' '.join([params['date'], params['start']])
         if start_time < datetime.datetime.now().strftime('%Y-%m-%d %H:%M'):
             logger.warning('The start time should not be earlier than the current time.')
             return JsonResponse({'code': 1005, 'message': '请输入正确的开始时间', 'access': access})
-        if start >= end:
+        if params['start'] >= params['end']:
             logger.warning('The end time must be greater than the start time.')
             return JsonResponse({'code': 1001, 'message': '请输入正确的结束时间', 'access': access})
-        start_search = datetime.datetime.strftime(
-            (datetime.datetime.strptime(start, '%H:%M') - datetime.timedelta(minutes=30)),
-            '%H:%M')
-        end_search = datetime.datetime.strftime(
-            (datetime.datetime.strptime(end, '%H:%M') + datetime.timedelta(minutes=30)),
-            '%H:%M')
-        # 查询待创建的会议与现有的预定会议是否冲突
-        unavailable_host_id = []
-        available_host_id = []
-        meetings = Meeting.objects.filter(is_delete=0, date=date, end__gt=start_search, start__lt=end_search,
-                                          mplatform=platform).values()
-        try:
-            for meeting in meetings:
-                host_id = meeting['host_id']
-                unavailable_host_id.append(host_id)
-            logger.info('unavilable_host_id:{}'.format(unavailable_host_id))
-        except KeyError:
-            pass
-        host_list = list(host_dict.keys())
-        logger.info('host_list:{}'.format(host_list))
-        for host_id in host_list:
-            if host_id not in unavailable_host_id:
-                available_host_id.append(host_id)
-        logger.info('avilable_host_id:{}'.format(available_host_id))
-        if len(available_host_id) == 0:
-            logger.warning('{}暂无可用host'.format(platform))
-            return JsonResponse({'code': 1000, 'message': '暂无可用host,请前往官网查看预定会议', 'access': access})
-        # 从available_host_id中随机生成一个host_id,并在host_dict中取出
-        host_id = random.choice(available_host_id)
-        host = host_dict[host_id]
-        logger.info('host_id:{}'.format(host_id))
-        logger.info('host:{}'.format(host))
-
-        status, content = drivers.createMeeting(platform, date, start, end, topic, host, record)
-        if status not in [200, 201]:
-            return JsonResponse({'code': 400, 'msg': 'Bad Request', 'access': access})
-        mid = content['mid']
-        start_url = content.get('start_url')
-        join_url = content['join_url']
-        host_id = content['host_id']
-        timezone = content['timezone'] if 'timezone' in content else 'Asia/Shanghai'
-
-        # 数据库生成数据
-        Meeting.objects.create(
-            mid=mid,
-            topic=data['topic'],
-            community=community,
-            sponsor=data['sponsor'],
-            group_name=data['group_name'],
-            date=date,
-            start=start,
-            end=end,
-            etherpad=data['etherpad'],
-            emaillist=emaillist,
-            timezone=timezone,
-            agenda=data['agenda'] if 'agenda' in data else '',
-            host_id=host_id,
-            join_url=join_url,
-            start_url=start_url,
-            user_id=user_id,
-            group_id=group_id,
-            mplatform=platform
-        )
-        logger.info('{} has created a {} meeting which mid is {}.'.format(sponsor, platform, mid))
-        logger.info('meeting info: {},{}-{},{}'.format(date, start, end, topic))
-
-        # 发送email
-        m = {
-            'mid': mid,
-            'topic': topic,
-            'date': date,
-            'start': start,
-            'end': end,
-            'join_url': join_url,
-            'sig_name': sig_name,
-            'emaillist': emaillist,
-            'platform': platform,
-            'etherpad': etherpad,
-            'agenda': summary
-        }
-        p1 = Process(target=sendmail, args=(m, record))
-        p1.start()
-
-        # 如果开启录制功能，则在Video表中创建一条数据
-        if record == 'cloud':
-            Video.objects.create(
-                mid=mid,
-                topic=data['topic'],
-                community=community,
-                group_name=data['group_name'],
-                agenda=data['agenda'] if 'agenda' in data else ''
-            )
-            logger.info('meeting {} was created with auto recording.'.format(mid))
 
+        # 异步创建：仅记录任务并返回任务id，由provision_meetings命令创建会议，通过meetingjob/<id>/查询结果
+        if str(data.get('async', '')).lower() in ('1', 'true'):
+            # 提交时即检查是否有空闲host，避免无法创建的任务进入队列
+            if not provision.has_free_host(params):
+                logger.warning('{}暂无可用host'.format(params['platform']))
+                return JsonResponse({'code': 1000, 'message': provision.NO_HOST_MESSAGE, 'access': access})
+            job = MeetingJob.objects.create(user_id=request.user.id, params=json.dumps(params))
+            logger.info('{} has submitted meeting job {}'.format(params['sponsor'], job.id))
+            return JsonResponse({'code': 202, 'message': '创建中', 'job_id': job.id, 'access': access})
+
+        try:
+            meeting = provision.provision_meeting(params)
+        except provision.ProvisionError as e:
+            return JsonResponse(dict(e.to_dict(), access=access))
         # 返回请求数据
-        resp = {'code': 201, 'message': '创建成功', 'access': access}
-        meeting = Meeting.objects.get(mid=mid)
-        resp['id'] = meeting.id
-        t3 = time.time()
-        print('total waste: {}'.format(t3 - t1))
+        return JsonResponse({'code': 201, 'message': '创建成功', 'id': meeting.id, 'access': access})
+
+
+class MeetingJobView(GenericAPIView):
+    """查询异步创建会议任务的状态"""
+    queryset = MeetingJob.objects.all()
+    authentication_classes = (CustomAuthentication,)
+    permission_classes = (MaintainerPermission,)
+
+    def get(self, request, *args, **kwargs):
+        job = MeetingJob.objects.filter(id=kwargs.get('pk'), user_id=request.user.id).first()
+        if not job:
+            resp = JsonResponse({'code': 404, 'msg': 'Not Found'})
+            resp.status_code = 404
+            return resp
+        resp = {'code': 200, 'job_id': job.id, 'status': provision.JOB_STATUS[job.status]}
+        if job.status == provision.SUCCEEDED:
+            resp['id'] = job.meeting_id
+        elif job.status == provision.FAILED:
+            resp['error_code'] = job.code
+            resp['message'] = job.message
         return JsonResponse(resp)
 
 
-class MyMeetingsView(GenericAPIView, ListModelMixin):
+class MyMeetingsView(MeetingListMixin, GenericAPIView, ListModelMixin):
     """查询我创建的所有会议"""
     serializer_class = MeetingListSerializer
     queryset = Meeting.objects.all().filter(is_delete=0)
     permission_classes = (permissions.IsAuthenticated,)
     authentication_classes = (authentication.JWTAuthentication,)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-date', 'start', 'id')
 
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
@@ -593,6 +478,8 @@ class AllMeetingsView(GenericAPIView, ListModelMixin):
     filter_backends = [SearchFilter]
     search_fields = ['is_delete', 'group_name', 'sponsor', 'date', 'start', 'end']
     permission_classes = (QueryPermission,)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('id',)
 
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
@@ -613,6 +500,7 @@ class CollectView(GenericAPIView, ListModelMixin, CreateModelMixin):
             return JsonResponse({'code': 400, 'msg': 'meeting不能为空', 'access': access})
         if not Collect.objects.filter(meeting_id=meeting_id, user_id=user_id):
             Collect.objects.create(meeting_id=meeting_id, user_id=user_id)
+            bump_version(MEETINGS)
         collection_id = Collect.objects.get(meeting_id=meeting_id, user_id=user_id).id
         resp = {'code': 201, 'msg': 'collect successfully', 'collection_id': collection_id, 'access': access}
         return JsonResponse(resp)
@@ -635,6 +523,7 @@ class CollectDelView(GenericAPIView, DestroyModelMixin):
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         self.perform_destroy(instance)
+        bump_version(MEETINGS)
         access = refresh_access(self.request.user)
         response = Response()
         response.data = {'access': access}
@@ -646,12 +535,14 @@ class CollectDelView(GenericAPIView, DestroyModelMixin):
         return queryset
 
 
-class MyCollectionsView(GenericAPIView, ListModelMixin):
+class MyCollectionsView(MeetingListMixin, GenericAPIView, ListModelMixin):
     """我收藏的会议(列表)"""
     serializer_class = MeetingListSerializer
     queryset = Meeting.objects.all()
     permission_classes = (permissions.IsAuthenticated,)
     authentication_classes = (authentication.JWTAuthentication,)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-date', 'start', 'id')
 
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
@@ -669,7 +560,17 @@ class ParticipantsView(GenericAPIView, RetrieveModelMixin):
 
     def get(self, request, *args, **kwargs):
         mid = kwargs.get('mid')
-        status, res = drivers.getParticipants(mid)
+        meeting = Meeting.objects.filter(mid=mid).first()
+        if not meeting:
+            resp = JsonResponse({'code': 404, 'msg': 'Not Found'})
+            resp.status_code = 404
+            return resp
+        driver = drivers.find_driver(meeting.mplatform)
+        if not driver:
+            resp = JsonResponse({'code': 400, 'msg': 'Unsupported platform'})
+            resp.status_code = 400
+            return resp
+        status, res = driver.participants(meeting)
         if status == 200:
             return JsonResponse(res)
         else:
@@ -686,6 +587,8 @@ class SponsorsView(GenericAPIView, ListModelMixin):
     search_fields = ['nickname']
     authentication_classes = (authentication.JWTAuthentication,)
     permission_classes = (ActivityAdminPermission,)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('id',)
 
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
@@ -699,6 +602,8 @@ class NonSponsorView(GenericAPIView, ListModelMixin):
     search_fields = ['nickname']
     authentication_classes = (authentication.JWTAuthentication,)
     permission_classes = (ActivityAdminPermission,)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('id',)
 
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
@@ -759,12 +664,29 @@ class SponsorInfoView(GenericAPIView, UpdateModelMixin):
         return response
 
 
-class DraftsView(GenericAPIView, ListModelMixin):
+class ActivityCollectionMixin:
+    """一次性加载当前用户的活动收藏，供ActivitiesSerializer查询collection_id"""
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        user = getattr(self.request, 'user', None)
+        collections = {}
+        if user is not None and user.is_authenticated:
+            for collection_id, activity_id in ActivityCollect.objects.filter(user_id=user.pk).order_by('-id').\
+                    values_list('id', 'activity_id'):
+                collections[activity_id] = collection_id
+        context['activity_collections'] = collections
+        return context
+
+
+class DraftsView(ActivityCollectionMixin, GenericAPIView, ListModelMixin):
     """审核列表"""
     serializer_class = ActivitiesSerializer
     queryset = Activity.objects.filter(is_delete=0, status=2)
     authentication_classes = (authentication.JWTAuthentication,)
     permission_classes = (ActivityAdminPermission,)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('id',)
 
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
@@ -844,12 +766,14 @@ class ActivityView(GenericAPIView, CreateModelMixin):
         return JsonResponse({'code': 201, 'msg': '活动申请发布成功！', 'access': access})
 
 
-class ActivitiesView(GenericAPIView, ListModelMixin):
+class ActivitiesView(ActivityCollectionMixin, GenericAPIView, ListModelMixin):
     """活动列表"""
     serializer_class = ActivitiesSerializer
     queryset = Activity.objects.filter(is_delete=0, status__gt=2).order_by('-date', 'id')
     filter_backends = [SearchFilter]
     search_fields = ['title', 'enterprise']
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-date', 'id')
 
     def get(self, request, *args, **kwargs):
         activity_status = self.request.GET.get('activity')
@@ -883,12 +807,14 @@ class ActivitiesView(GenericAPIView, ListModelMixin):
         return self.list(request, *args, **kwargs)
 
 
-class RecentActivitiesView(GenericAPIView, ListModelMixin):
+class RecentActivitiesView(ActivityCollectionMixin, GenericAPIView, ListModelMixin):
     """最近的活动列表"""
     serializer_class = ActivitiesSerializer
     queryset = Activity.objects.filter(is_delete=0)
     filter_backends = [SearchFilter]
     search_fields = ['enterprise']
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-date', 'id')
 
     def get(self, request, *args, **kwargs):
         self.queryset = self.queryset.filter(status__gt=2, date__gt=datetime.datetime.now().strftime('%Y-%m-%d')).\
@@ -896,12 +822,14 @@ class RecentActivitiesView(GenericAPIView, ListModelMixin):
         return self.list(request, *args, **kwargs)
 
 
-class SponsorActivitiesView(GenericAPIView, ListModelMixin):
+class SponsorActivitiesView(ActivityCollectionMixin, GenericAPIView, ListModelMixin):
     """活动发起人的活动列表"""
     serializer_class = ActivitiesSerializer
     queryset = Activity.objects.all()
     authentication_classes = (authentication.JWTAuthentication,)
     permission_classes = (SponsorPermission,)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('id',)
 
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
@@ -911,7 +839,7 @@ class SponsorActivitiesView(GenericAPIView, ListModelMixin):
         return queryset
 
 
-class ActivityRetrieveView(GenericAPIView, RetrieveModelMixin):
+class ActivityRetrieveView(ActivityCollectionMixin, GenericAPIView, RetrieveModelMixin):
     """查询单个活动"""
     serializer_class = ActivityRetrieveSerializer
     queryset = Activity.objects.filter(is_delete=0, status__gt=2)
@@ -936,6 +864,7 @@ class ActivityUpdateView(GenericAPIView, UpdateModelMixin):
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        bump_version(ACTIVITIES)
 
         if getattr(instance, '_prefetched_objects_cache', None):
             instance._prefetched_objects_cache = {}
@@ -968,7 +897,9 @@ class ActivityPublishView(GenericAPIView, UpdateModelMixin):
             logger.info('活动id: {}'.format(activity_id))
             img_url = gene_wx_code.run(activity_id)
             logger.info('生成活动页面二维码: {}'.format(img_url))
-            Activity.objects.filter(id=activity_id, status=2).update(status=3, wx_code=img_url)
+            Activity.objects.filter(id=activity_id, status=2).update(status=3, wx_code=img_url,
+                                                                     update_time=datetime.datetime.now())
+            bump_version(ACTIVITIES)
             logger.info('活动通过审核')
             return JsonResponse({'code': 201, 'msg': '活动通过审核，已发布', 'access': access})
         else:
@@ -985,7 +916,7 @@ class ActivityRejectView(GenericAPIView, UpdateModelMixin):
         access = refresh_access(self.request.user)
         activity_id = self.kwargs.get('pk')
         if activity_id in self.queryset.values_list('id', flat=True):
-            Activity.objects.filter(id=activity_id, status=2).update(status=1)
+            Activity.objects.filter(id=activity_id, status=2).update(status=1, update_time=datetime.datetime.now())
             return JsonResponse({'code': 201, 'msg': '活动申请已驳回', 'access': access})
         else:
             return JsonResponse({'code': 404, 'msg': '无此数据', 'access': access})
@@ -1000,7 +931,8 @@ class ActivityDelView(GenericAPIView, UpdateModelMixin):
     def put(self, request, *args, **kwargs):
         access = refresh_access(self.request.user)
         activity_id = self.kwargs.get('pk')
-        Activity.objects.filter(id=activity_id).update(is_delete=1)
+        Activity.objects.filter(id=activity_id).update(is_delete=1, update_time=datetime.datetime.now())
+        bump_version(ACTIVITIES)
         return JsonResponse({'code': 204, 'msg': '成功删除活动', 'access': access})
 
 
@@ -1065,12 +997,14 @@ class ActivityDraftView(GenericAPIView, CreateModelMixin):
         return JsonResponse({'code': 201, 'msg': '活动草案创建成功！', 'access': access})
 
 
-class ActivitiesDraftView(GenericAPIView, ListModelMixin):
+class ActivitiesDraftView(ActivityCollectionMixin, GenericAPIView, ListModelMixin):
     """活动草案列表"""
     serializer_class = ActivitiesSerializer
     queryset = Activity.objects.all()
     authentication_classes = (authentication.JWTAuthentication,)
     permission_classes = (SponsorPermission,)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-date', 'id')
 
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
@@ -1141,7 +1075,8 @@ class DraftUpdateView(GenericAPIView, UpdateModelMixin):
                 latitude=latitude,
                 schedules=json.dumps(data['schedules']),
                 poster=poster,
-                register_url=register_url
+                register_url=register_url,
+                update_time=datetime.datetime.now()
             )
         if activity_type == online:
             start = data['start']
@@ -1155,7 +1090,8 @@ class DraftUpdateView(GenericAPIView, UpdateModelMixin):
                 synopsis=synopsis,
                 schedules=json.dumps(data['schedules']),
                 poster=poster,
-                register_url=register_url
+                register_url=register_url,
+                update_time=datetime.datetime.now()
             )
         return JsonResponse({'code': 201, 'msg': '修改并保存活动草案', 'access': access})
 
@@ -1193,7 +1129,8 @@ class DraftPublishView(GenericAPIView, UpdateModelMixin):
                 latitude=latitude,
                 schedules=json.dumps(data['schedules']),
                 poster=poster,
-                status=2
+                status=2,
+                update_time=datetime.datetime.now()
             )
         if activity_type == online:
             start = data['start']
@@ -1207,17 +1144,20 @@ class DraftPublishView(GenericAPIView, UpdateModelMixin):
                 synopsis=synopsis,
                 schedules=json.dumps(data['schedules']),
                 poster=poster,
-                status=2
+                status=2,
+                update_time=datetime.datetime.now()
             )
         return JsonResponse({'code': 201, 'msg': '申请发布活动', 'access': access})
 
 
-class SponsorActivitiesPublishingView(GenericAPIView, ListModelMixin):
+class SponsorActivitiesPublishingView(ActivityCollectionMixin, GenericAPIView, ListModelMixin):
     """发布中的活动"""
     serializer_class = ActivitiesSerializer
     queryset = Activity.objects.all()
     authentication_classes = (authentication.JWTAuthentication,)
     permission_classes = (SponsorPermission,)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-date', 'id')
 
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
@@ -1266,12 +1206,14 @@ class ActivityCollectDelView(GenericAPIView, DestroyModelMixin):
         return queryset
 
 
-class MyActivityCollectionsView(GenericAPIView, ListModelMixin):
+class MyActivityCollectionsView(ActivityCollectionMixin, GenericAPIView, ListModelMixin):
     """我收藏的活动(列表)"""
     serializer_class = ActivitiesSerializer
     queryset = Activity.objects.all()
     permission_classes = (permissions.IsAuthenticated,)
     authentication_classes = (authentication.JWTAuthentication,)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-date', 'id')
 
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
@@ -1283,6 +1225,33 @@ class MyActivityCollectionsView(GenericAPIView, ListModelMixin):
         return queryset
 
 
+class ActivityRegistrantsView(GenericAPIView, RetrieveModelMixin):
+    """活动报名者列表，export=csv/json时流式导出"""
+    serializer_class = ActivityRegistrantsSerializer
+    queryset = Activity.objects.filter(is_delete=0)
+    authentication_classes = (authentication.JWTAuthentication,)
+    permission_classes = (SponsorPermission,)
+
+    def get(self, request, *args, **kwargs):
+        export = self.request.GET.get('export')
+        if not export:
+            return self.retrieve(request, *args, **kwargs)
+        activity = self.get_object()
+        if export == 'csv':
+            response = StreamingHttpResponse(registrants.stream_csv(activity.id), content_type='text/csv')
+            response['Content-Disposition'] = 'attachment; filename="registrants_{}.csv"'.format(activity.id)
+            return response
+        if export == 'json':
+            return StreamingHttpResponse(registrants.stream_json(activity.id), content_type='application/json')
+        return JsonResponse({'code': 400, 'msg': 'export should be csv or json'})
+
+    def get_queryset(self):
+        queryset = Activity.objects.filter(is_delete=0, user_id=self.request.user.id)
+        if self.request.user.activity_level == 3:
+            queryset = Activity.objects.filter(is_delete=0)
+        return queryset
+
+
 class FeedbackView(GenericAPIView, CreateModelMixin):
     """意见反馈"""
     serializer_class = FeedbackSerializer
@@ -1402,41 +1371,13 @@ class ActivitiesDataView(GenericAPIView, ListModelMixin):
     """活动日历数据"""
     queryset = Activity.objects.filter(is_delete=0, status__in=[3, 4, 5])
 
+    @cached_response('activitiesdata', ACTIVITIES)
     def get(self, request, *args, **kwargs):
         self.queryset = self.queryset.filter(
             date__gte=(datetime.datetime.now() - datetime.timedelta(days=180)).strftime('%Y-%m-%d'),
             date__lte=(datetime.datetime.now() + datetime.timedelta(days=180)).strftime('%Y-%m-%d'))
-        queryset = self.filter_queryset(self.get_queryset()).values()
-        tableData = [] 
-        date_list = [] 
-        for query in queryset:
-            date_list.append(query.get('date'))
-        date_list = sorted(list(set(date_list)))
-        for date in date_list:
-            tableData.append(
-                {    
-                    'start_date': date,
-                    'timeData': [{
-                        'id': activity.id,
-                        'title': activity.title,
-                        'start_date': activity.date,
-                        'end_date': activity.date,
-                        'activity_type': activity.activity_type,
-                        'address': activity.address,
-                        'detail_address': activity.detail_address,
-                        'longitude': activity.longitude,
-                        'latitude': activity.latitude,
-                        'synopsis': activity.synopsis,
-                        'sign_url': activity.sign_url,
-                        'replay_url': activity.replay_url,
-                        'register_url': activity.register_url,
-                        'poster': activity.poster,
-                        'wx_code': activity.wx_code,
-                        'schedules': json.loads(activity.schedules)
-                    } for activity in Activity.objects.filter(is_delete=0, date=date)]
-                }    
-            )    
-        return Response({'tableData': tableData})
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response({'tableData': calendar_data.build_activities_table(queryset)})
 
 
 class AgreePrivacyPolicyView(GenericAPIView, UpdateModelMixin):